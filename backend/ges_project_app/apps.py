@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GesProjectAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ges_project_app'
+
+    def ready(self):
+        from ges_project_app import signals  # noqa: F401
@@ -1,79 +1,80 @@
 from collections import Counter, defaultdict
+from django.db.models import Sum
 from ges_project_app.models import Student, Project, Voeux, ProjectAssignment, Team
-from ges_project_app.attribution import attribution, gale_shapley_attribution
-from rest_framework.response import Response
+from ges_project_app.attribution.moteurs import SATISFACTION, AlgorithmeInconnu
+from ges_project_app.attribution.satisfaction import lire_satisfaction, methode_de
 
-def analyser_affectations(level, algorithm):
-    all_students = Student.objects.filter(level=level)
-    all_projects = Project.objects.filter(level=level)
-    all_voeux = Voeux.objects.filter(student__level=level, project__level=level)
-    affectations = ProjectAssignment.objects.filter(project__level=level)
 
-    assigned_students = set(a.student for a in affectations)
-    unassigned_students = set(all_students) - assigned_students
+def analyser_affectations(level, algorithm):
+    """
+    Analyse des affectations d'un niveau en un nombre fixe de requêtes
+    (indépendant du nombre d'étudiants) : chaque table n'est lue qu'une fois,
+    avec uniquement les colonnes utiles.
+    """
+    if algorithm not in SATISFACTION:
+        raise AlgorithmeInconnu(f"Algorithme inconnu : {algorithm}")
 
-    # Préparer les vœux
-    voeux_dict = defaultdict(list)
-    for v in all_voeux:
-        voeux_dict[v.student.id].append(v.project.id)
+    all_students = list(
+        Student.objects.filter(level=level).order_by("id")
+        .values_list("id", "user__username", "user__first_name", "user__last_name")
+    )
+    all_projects = list(
+        Project.objects.filter(level=level).order_by("id").values_list("id", "title", "supervisor__username")
+    )
+    all_voeux = list(
+        Voeux.objects.filter(student__level=level, project__level=level)
+        .values_list("student_id", "project_id", "rank", "note_preference")
+    )
+    affectations = list(ProjectAssignment.objects.filter(project__level=level).values_list("student_id", "project_id"))
 
-    # Équipes et capacités
+    # Capacité de chaque projet : somme des places de ses équipes
     equipes_capacite = {
-        equipe.project_id: 0 for equipe in Team.objects.filter(project__level=level)
+        ligne["project_id"]: ligne["capacite"]
+        for ligne in Team.objects.filter(project__level=level).values("project_id").annotate(capacite=Sum("max_students"))
     }
-    for equipe in Team.objects.filter(project__level=level):
-        equipes_capacite[equipe.project_id] += equipe.max_students
+
+    assigned_students = {student_id for student_id, _ in affectations}
+    unassigned_students = [s for s in all_students if s[0] not in assigned_students]
+
+    # Préparer les vœux
+    voeux_dict = defaultdict(list)
+    for student_id, project_id, _, _ in all_voeux:
+        voeux_dict[student_id].append(project_id)
 
     # Préparer compteur général
-    demande_par_projet = Counter(v.project_id for v in all_voeux)
+    demande_par_projet = Counter(project_id for _, project_id, _, _ in all_voeux)
 
     # Analyse des non affectés
     no_wish = []
     no_available_place = []
 
     for student in unassigned_students:
-        student_voeux = voeux_dict.get(student.id, [])
+        student_voeux = voeux_dict.get(student[0], [])
         if not student_voeux:
             no_wish.append(student)
-        else:
-            tous_pleins = all(
-                demande_par_projet[p] > equipes_capacite.get(p, 0)
-                for p in student_voeux
-            )
-            if tous_pleins:
-                no_available_place.append(student)
-
-    # Calcul du score de satisfaction selon l'algo choisi
-    if algorithm == "algo1":
-        satisfaction_score = gale_shapley_attribution.calculer_satisfaction(level=level)
-    elif algorithm == "algo2":
-        satisfaction_score = attribution.calculer_satisfaction(level=level)
-    else:
-        return Response(
-            {"error": f"Algorithme inconnu : {algorithm}"},
-            status=status.HTTP_400_BAD_REQUEST
-        )
+        elif all(demande_par_projet[p] > equipes_capacite.get(p, 0) for p in student_voeux):
+            no_available_place.append(student)
+
+    # Score de satisfaction selon l'algo choisi, lu dans l'agrégat tenu à jour à l'écriture
+    satisfaction_score = lire_satisfaction(level, methode_de(SATISFACTION[algorithm]))
 
     # -----------------------
     # Suggestions (basées uniquement sur les non affectés ayant fait des vœux)
     # -----------------------
 
-    # Étudiants non affectés ayant fait des vœux
-    non_affectes_ayant_fait_voeux = [
-        s for s in unassigned_students if s.id in voeux_dict
-    ]
-
     # Recalculer la demande par projet pour ces étudiants uniquement
     demande_filtrée = Counter()
-    for s in non_affectes_ayant_fait_voeux:
-        for pid in voeux_dict[s.id]:
+    for student in unassigned_students:
+        for pid in voeux_dict.get(student[0], []):
             demande_filtrée[pid] += 1
 
+    titres = {project_id: title for project_id, title, _ in all_projects}
+
     # Projets saturés selon ces étudiants
     projets_satures = [
         {
             "project_id": pid,
-            "project_title": Project.objects.get(id=pid).title,
+            "project_title": titres.get(pid),
             "demandes": demande_filtrée[pid],
             "capacite": equipes_capacite.get(pid, 0)
         }
@@ -84,24 +85,22 @@ def analyser_affectations(level, algorithm):
     # Projets non demandés par ces étudiants
     projets_non_demandes = [
         {
-            "project_id": project.id,
-            "project_title": project.title,
-            "supervisor": project.supervisor.username
+            "project_id": project_id,
+            "project_title": title,
+            "supervisor": supervisor
         }
-        for project in all_projects
-        if demande_filtrée.get(project.id, 0) == 0
+        for project_id, title, supervisor in all_projects
+        if demande_filtrée.get(project_id, 0) == 0
     ]
 
+    def etudiant_data(student):
+        student_id, username, first_name, last_name = student
+        return {"id": student_id, "nom": username, "full_name": f"{first_name} {last_name}".strip()}
+
     return {
         "non_affectes": {
-            "aucun_voeu": [
-                {"id": s.id, "nom": s.user.username, "full_name": s.user.get_full_name()}
-                for s in no_wish
-            ],
-            "projets_satures": [
-                {"id": s.id, "nom": s.user.username, "full_name": s.user.get_full_name()}
-                for s in no_available_place
-            ],
+            "aucun_voeu": [etudiant_data(s) for s in no_wish],
+            "projets_satures": [etudiant_data(s) for s in no_available_place],
             "autres": len(unassigned_students) - len(no_wish) - len(no_available_place)
         },
         "suggestions": {
@@ -109,9 +108,9 @@ def analyser_affectations(level, algorithm):
             "revoir_projets": projets_non_demandes
         },
         "stats": {
-            "total_students": all_students.count(),
+            "total_students": len(all_students),
             "assigned": len(assigned_students),
             "unassigned": len(unassigned_students),
             "satisfaction_score": round(satisfaction_score, 2)
         }
-    }
\ No newline at end of file
+    }
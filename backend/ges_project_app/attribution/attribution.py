@@ -1,135 +1,172 @@
-import random
 from collections import defaultdict
 from django.db import transaction
-from ges_project_app.models import ProjectAssignment, Student, Project, Voeux, Team, Deadline
+from ges_project_app.models import ProjectAssignment, Voeux, NOTE_PREFERENCE_MIN, NOTE_PREFERENCE_MAX
+from ges_project_app import parametres_niveau
+from ges_project_app.attribution.persistance import enregistrer_affectations
+from ges_project_app.attribution import probleme
 
 
 def calculer_score(rank, note_preference, max_choice = 5, alpha=0.6, beta=0.4):
-    if not (0 <= note_preference <= 20):
-        raise ValueError("La note doit être entre 0 et 20.")
+    if not (NOTE_PREFERENCE_MIN <= note_preference <= NOTE_PREFERENCE_MAX):
+        raise ValueError(f"La note doit être entre {NOTE_PREFERENCE_MIN} et {NOTE_PREFERENCE_MAX}.")
     if not (1 <= rank <= max_choice):
         raise ValueError(f"Le rang doit être entre 1 et {max_choice}.")
     return alpha * (max_choice + 1 - rank) + beta * note_preference
 
-def affecter_projets(level, force_assign=False):
-    with transaction.atomic():
-        ProjectAssignment.objects.filter(project__level=level).delete()
-        
-        try:
-            param = Deadline.objects.get(level=level)
-            max_choice = param.max_choice
-        except Deadline.DoesNotExist:
-            max_choice = 5
-
-        scores = defaultdict(list)
-        preferences = Voeux.objects.filter(project__level=level, student__level=level)
-        etudiants_ayant_fait_un_voeu = set()
-
-        for pref in preferences:
-            score = calculer_score(pref.rank, pref.note_preference, max_choice=max_choice)
-            scores[pref.project].append((score, pref.student))
-            etudiants_ayant_fait_un_voeu.add(pref.student)
-
-        for projet in scores:
-            scores[projet].sort(key=lambda x: x[0], reverse=True)
-
-        equipes_disponibles = {
-            equipe: equipe.max_students for equipe in Team.objects.filter(project__level=level)
-        }
-
-        affectations = {}
 
-        for projet in Project.objects.filter(priority=True, level=level):
-            if projet not in scores or not scores[projet]:
+def score_maximal(max_choice=5):
+    """Score d'un étudiant ayant obtenu son premier vœu avec la note maximale (dépend de max_choice)."""
+    return calculer_score(1, NOTE_PREFERENCE_MAX, max_choice=max_choice)
+
+def charger_donnees(level):
+    """Problème d'affectation du niveau (voir `probleme.MatchingProblem`), calculable hors de l'ORM."""
+    return probleme.charger(level)
+
+
+def calculer_affectations(donnees, force_assign=False, seed=None):
+    """
+    Calcule les affectations à partir de `charger_donnees`, sans accès à la base.
+    L'algorithme est déterministe : `seed` est accepté pour garder la même
+    signature que les autres moteurs. Retourne {student_id: project_id}.
+    """
+    # Candidats de chaque projet, triés par score décroissant ; étudiants,
+    # projets et équipes sont désignés par leurs indices dans le problème
+    scores = defaultdict(list)
+    voeux_par_etudiant = donnees.voeux_par_etudiant(calculer_score)
+
+    for etudiant, voeux in enumerate(voeux_par_etudiant):
+        for projet_id, _, score in voeux:
+            scores[projet_id].append((score, etudiant))
+
+    for candidats in scores.values():
+        candidats.sort(key=lambda x: x[0], reverse=True)
+
+    # Index précalculés : places restantes par équipe et équipes de chaque projet
+    equipes_disponibles = {}
+    equipes_par_projet = defaultdict(list)
+    for equipe, enregistrement in enumerate(donnees.equipes):
+        equipes_disponibles[equipe] = enregistrement.capacite
+        equipes_par_projet[enregistrement.projet].append(equipe)
+
+    # Position du prochain candidat à traiter dans chaque liste triée
+    curseur = defaultdict(int)
+    affectations = {}
+
+    for projet_id in donnees.prioritaires.tolist():
+        if not scores.get(projet_id) or not equipes_par_projet.get(projet_id):
+            continue
+
+        _, etudiant = scores[projet_id][0]
+        equipe_choisie = equipes_par_projet[projet_id][0]
+        affectations[etudiant] = equipe_choisie
+        equipes_disponibles[equipe_choisie] -= 1
+        curseur[projet_id] = 1
+
+    # Chaque équipe, dans l'ordre, prend les meilleurs candidats restants du projet
+    for projet_id, candidats in scores.items():
+        i = curseur[projet_id]
+        for equipe in equipes_par_projet.get(projet_id, []):
+            places = equipes_disponibles[equipe]
+            if i >= len(candidats):
+                break
+            if places <= 0:
                 continue
 
-            equipes_projet = [e for e in equipes_disponibles if e.project == projet]
-            if equipes_projet:
-                _, etudiant = scores[projet].pop(0)
-                equipe_choisie = equipes_projet[0]
-                affectations[etudiant] = equipe_choisie
-                equipes_disponibles[equipe_choisie] -= 1
+            retenus = candidats[i:i + places]
+            for _, etudiant in retenus:
+                affectations[etudiant] = equipe
+            equipes_disponibles[equipe] -= len(retenus)
+            i += len(retenus)
+
+    # Seuls les étudiants ayant fait un vœu font partie du problème
+    etudiants_non_affectes = set(range(len(voeux_par_etudiant))) - set(affectations.keys())
+
+    # Rattrapage à partir des structures déjà en mémoire (aucune requête par étudiant).
+    # Toutes les équipes chargées sont du niveau, et les places ne font que diminuer :
+    # la première équipe non pleine se retrouve avec un simple curseur.
+    ordre_equipes = list(equipes_disponibles)
+    premiere_libre = 0
+
+    for etudiant in etudiants_non_affectes:
+        if force_assign:
+            while premiere_libre < len(ordre_equipes) and equipes_disponibles[ordre_equipes[premiere_libre]] <= 0:
+                premiere_libre += 1
+            if premiere_libre < len(ordre_equipes):
+                equipe_disponible = ordre_equipes[premiere_libre]
+                affectations[etudiant] = equipe_disponible
+                equipes_disponibles[equipe_disponible] -= 1
+        else:
+            for projet_id, _, _ in voeux_par_etudiant[etudiant]:  # Déjà triés par rang
+                equipe_dispo = next(
+                    (e for e in equipes_par_projet.get(projet_id, []) if equipes_disponibles[e] > 0),
+                    None
+                )
+                if equipe_dispo is not None:
+                    affectations[etudiant] = equipe_dispo
+                    equipes_disponibles[equipe_dispo] -= 1
+                    break
+
+    return donnees.en_base(affectations)
 
-        for projet, etudiants_scores in scores.items():
-            equipes_projet = [e for e in equipes_disponibles if e.project == projet]
-            if not equipes_projet:
-                continue
 
-            while etudiants_scores:
-                equipe_courante = next((e for e in equipes_projet if equipes_disponibles[e] > 0), None)
-                if not equipe_courante:
-                    break
+def restreindre_donnees(donnees, etudiants, places, projets_prioritaires):
+    """Sous-problème de la réaffectation incrémentale (voir `MatchingProblem.restreindre`)."""
+    return donnees.restreindre(etudiants, places, projets_prioritaires)
+
+
+def affecter_projets(level, force_assign=False, seed=None, progression=None):
+    """`progression` : comme pour gale_shapley_attribution.affectation_projet."""
+    donnees = charger_donnees(level)
+    if progression:
+        progression("donnees")
+    affectations = calculer_affectations(donnees, force_assign=force_assign, seed=seed)
+    if progression:
+        progression("calcul")
 
-                meilleurs_scores = etudiants_scores[:equipes_disponibles[equipe_courante]]
-                dernier_score = meilleurs_scores[-1][0] if meilleurs_scores else None
-                candidats = [et for sc, et in meilleurs_scores if sc == dernier_score]
-
-                etudiant_choisi = random.choice(candidats) if len(candidats) > 1 else candidats[0]
-
-                if etudiant_choisi in etudiants_ayant_fait_un_voeu:
-                    affectations[etudiant_choisi] = equipe_courante
-                    equipes_disponibles[equipe_courante] -= 1
-
-                etudiants_scores = [(s, e) for s, e in etudiants_scores if e != etudiant_choisi]
-
-        etudiants_non_affectes = set(Student.objects.filter(level=level)) - set(affectations.keys())
-        etudiants_non_affectes = etudiants_non_affectes.intersection(etudiants_ayant_fait_un_voeu)
-
-        for etudiant in etudiants_non_affectes:
-            if force_assign:
-                equipe_disponible = next((e for e, cap in equipes_disponibles.items() if cap > 0), None)
-                if equipe_disponible and equipe_disponible.project.level == etudiant.level:
-                    affectations[etudiant] = equipe_disponible
-                    equipes_disponibles[equipe_disponible] -= 1
-            else:
-                voeux_etudiant = Voeux.objects.filter(student=etudiant, project__level=level).order_by('rank')
-                for voeu in voeux_etudiant:
-                    equipe_dispo = next(
-                        (e for e, cap in equipes_disponibles.items() if e.project == voeu.project and cap > 0),
-                        None
-                    )
-                    if equipe_dispo:
-                        affectations[etudiant] = equipe_dispo
-                        equipes_disponibles[equipe_dispo] -= 1
-                        break
-
-        for etudiant, equipe in affectations.items():
-            ProjectAssignment.objects.create(student=etudiant, project=equipe.project, status='pending')
+    with transaction.atomic():
+        persistance = enregistrer_affectations(level, affectations)
 
         return {
             "message": f"Affectation terminée pour le niveau {level} avec {len(affectations)} étudiants attribués.",
             "assignments_count": len(affectations),
-            "unassigned_count": len(etudiants_non_affectes - set(affectations.keys()))
+            "unassigned_count": len(donnees.etudiant_ids) - len(affectations),
+            "seed": seed,
+            "persistance": persistance,
+            "probleme": donnees.statistiques,
         }
 
 
-def calculer_satisfaction(level):
-    affectations = ProjectAssignment.objects.filter(project__level=level)
-    try:
-        param = Deadline.objects.get(level=level)
-        max_choice = param.max_choice
-    except Deadline.DoesNotExist:
-        max_choice = 5
-            
-    if not affectations.exists():
-        return 0
-
-    voeux = Voeux.objects.filter(student__level=level, project__level=level)
-    pref_dict = {(v.student_id, v.project_id): v for v in voeux}
+def calculer_satisfaction_donnees(affectations, voeux, max_choice=5):
+    """
+    Satisfaction (%) à partir de couples (student_id, project_id) et des vœux
+    (student_id, project_id, rank, note_preference) déjà chargés.
+    """
+    pref_dict = {(student_id, project_id): (rank, note) for student_id, project_id, rank, note in voeux}
 
     total_score = 0
     max_possible_score = 0
 
-    for affectation in affectations:
-        etudiant = affectation.student
-        projet = affectation.project
-        if (etudiant.id, projet.id) in pref_dict:
-            pref = pref_dict[(etudiant.id, projet.id)]
-            score = calculer_score(pref.rank, pref.note_preference, max_choice=max_choice)
+    for cle in affectations:
+        if cle in pref_dict:
+            rank, note = pref_dict[cle]
+            score = calculer_score(rank, note, max_choice=max_choice)
         else:
             score = 0
 
         total_score += score
-        max_possible_score += calculer_score(1, 20)
+        max_possible_score += score_maximal(max_choice)
+
+    return (total_score / max_possible_score) * 100 if max_possible_score > 0 else 0
+
+
+def calculer_satisfaction(level):
+    max_choice = parametres_niveau.max_choice(level)
+
+    affectations = list(ProjectAssignment.objects.filter(project__level=level).values_list("student_id", "project_id"))
+    if not affectations:
+        return 0
 
-    return (total_score / max_possible_score) * 100 if max_possible_score > 0 else 0
\ No newline at end of file
+    voeux = Voeux.objects.filter(student__level=level, project__level=level).values_list(
+        "student_id", "project_id", "rank", "note_preference"
+    )
+    return calculer_satisfaction_donnees(affectations, voeux, max_choice=max_choice)
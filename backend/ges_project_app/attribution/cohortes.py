@@ -0,0 +1,126 @@
+import math
+import numpy as np
+from datetime import timedelta
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from ges_project_app.models import User, Student, Project, Team, Voeux, Deadline
+
+TAILLE_LOT = 1000
+
+
+def popularites_zipf(n_projets, exposant, rng):
+    """
+    Probabilité qu'un projet soit demandé, selon une loi de Zipf : le projet de rang
+    de popularité k pèse 1 / k^exposant (exposant 0 : tous les projets se valent).
+    Les rangs sont mélangés pour que la popularité ne suive pas l'ordre des identifiants.
+    """
+    poids = 1.0 / np.arange(1, n_projets + 1) ** exposant
+    rng.shuffle(poids)
+    return poids / poids.sum()
+
+
+def tirer_voeux(n_etudiants, popularites, n_voeux, rng, taille_lot=TAILLE_LOT):
+    """
+    Listes de vœux (indices de projets, du rang 1 au rang `n_voeux`), tirées sans remise
+    selon `popularites`. Astuce de Gumbel : les `n_voeux` plus grandes clés
+    log(p) + bruit de Gumbel forment un tirage pondéré sans remise, calculé par blocs
+    d'étudiants sans boucle Python par étudiant.
+    """
+    n_voeux = min(n_voeux, len(popularites))
+    log_p = np.log(popularites)
+    blocs = []
+    for debut in range(0, n_etudiants, taille_lot):
+        cles = log_p + rng.gumbel(size=(min(taille_lot, n_etudiants - debut), len(popularites)))
+        choisis = np.argpartition(-cles, n_voeux - 1, axis=1)[:, :n_voeux]
+        ordre = np.argsort(-np.take_along_axis(cles, choisis, axis=1), axis=1)
+        blocs.append(np.take_along_axis(choisis, ordre, axis=1))
+    return np.concatenate(blocs) if blocs else np.zeros((0, n_voeux), dtype=np.int64)
+
+
+def prefixe_code(prefixe):
+    """
+    Début des codes de projet d'une cohorte : Project.code (10 caractères) ne laisse
+    que deux caractères au préfixe, après lesquels viennent le niveau et le numéro.
+    """
+    return prefixe[:2].upper()
+
+
+def codes_en_conflit(prefixe, levels):
+    """
+    Projets d'une autre origine dont le code peut être repris par une cohorte de `prefixe`
+    sur `levels` (deux préfixes de mêmes premières lettres) : Project.code est unique.
+    """
+    debuts = Q()
+    for level in levels:
+        debuts |= Q(code__startswith=f"{prefixe_code(prefixe)}{level}")
+    return Project.objects.filter(debuts).exclude(supervisor__username__startswith=f"{prefixe}-")
+
+
+def generer_cohorte(level, n_etudiants, n_projets, equipes_par_projet=2, n_voeux=5, zipf=1.0,
+                    seed=0, ratio_places=1.1, prefixe="syn", mot_de_passe_hache=None, taille_lot=TAILLE_LOT):
+    """
+    Crée une cohorte synthétique d'un niveau par insertions en masse (bulk_create par lots) :
+    un superviseur, `n_projets` projets de `equipes_par_projet` équipes, `n_etudiants`
+    étudiants et leurs vœux, et la date limite du niveau si elle n'existe pas.
+    Les places couvrent `ratio_places` fois le nombre d'étudiants. Tous les comptes
+    partagent `mot_de_passe_hache`, haché une seule fois par l'appelant (par défaut :
+    mot de passe inutilisable) : le hachage coûte bien plus cher que l'insertion.
+
+    Renvoie le nombre d'objets créés par modèle.
+    """
+    rng = np.random.default_rng(seed)
+    mot_de_passe = mot_de_passe_hache or make_password(None)
+    capacite = max(1, math.ceil(n_etudiants * ratio_places / max(1, n_projets * equipes_par_projet)))
+
+    with transaction.atomic():
+        Deadline.objects.get_or_create(
+            type="voeux", level=level,
+            defaults={"limite_date": timezone.now().date() + timedelta(days=30), "max_choice": n_voeux},
+        )
+        superviseur = User.objects.create(username=f"{prefixe}-sup-{level}", password=mot_de_passe, role="supervisor")
+
+        projets = Project.objects.bulk_create([
+            Project(code=f"{prefixe_code(prefixe)}{level}{i:05d}", title=f"Projet {i}", description="",
+                    number_groups=equipes_par_projet, supervisor=superviseur, level=level)
+            for i in range(n_projets)
+        ], batch_size=taille_lot)
+        equipes = Team.objects.bulk_create([
+            Team(name=f"{projet.code}-{j + 1}", min_students=1, max_students=capacite, project=projet)
+            for projet in projets for j in range(equipes_par_projet)
+        ], batch_size=taille_lot)
+
+        users = User.objects.bulk_create([
+            User(username=f"{prefixe}-{level}-{i}", password=mot_de_passe, first_name="Étudiant",
+                 last_name=str(i), role="student")
+            for i in range(n_etudiants)
+        ], batch_size=taille_lot)
+        etudiants = Student.objects.bulk_create(
+            [Student(user_id=user.id, level=level) for user in users], batch_size=taille_lot
+        )
+
+        voeux = tirer_voeux(n_etudiants, popularites_zipf(n_projets, zipf, rng), n_voeux, rng, taille_lot)
+        notes = rng.integers(1, 11, size=voeux.shape)
+        # Identifiants plutôt qu'instances : moins de travail par ligne pour les gros volumes
+        projet_ids = np.array([projet.id for projet in projets])[voeux].tolist()
+        etudiant_ids = [etudiant.id for etudiant in etudiants]
+        notes = notes.tolist()
+        nb_voeux = 0
+        for debut in range(0, n_etudiants, taille_lot):
+            fin = debut + taille_lot
+            lot = [
+                Voeux(student_id=etudiant_id, project_id=project_id, rank=rang, note_preference=note)
+                for etudiant_id, choix, notes_etudiant in zip(etudiant_ids[debut:fin], projet_ids[debut:fin], notes[debut:fin])
+                for rang, (project_id, note) in enumerate(zip(choix, notes_etudiant), start=1)
+            ]
+            Voeux.objects.bulk_create(lot, batch_size=taille_lot)
+            nb_voeux += len(lot)
+
+    return {
+        "etudiants": len(etudiants),
+        "projets": len(projets),
+        "equipes": len(equipes),
+        "voeux": nb_voeux,
+        "capacite_equipe": capacite,
+    }
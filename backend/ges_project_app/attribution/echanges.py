@@ -0,0 +1,416 @@
+import time
+from collections import Counter, defaultdict
+import numpy as np
+from scipy.optimize import Bounds, LinearConstraint, milp
+from scipy.sparse import csr_matrix
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import Count
+from django.utils import timezone
+from ges_project_app.models import ChangeRequest, Project, ProjectAssignment, StudentsTeams, Team
+from ges_project_app.attribution.persistance import TAILLE_LOT_PAR_DEFAUT
+from ges_project_app.attribution.satisfaction import reconstruire_ou_invalider, suspendre_suivi
+
+
+def composantes_fortement_connexes(graphe):
+    """
+    Tarjan itératif (pas de récursion, donc pas de limite de profondeur) en O(V + E).
+    `graphe` : {noeud: [voisins]}. Renvoie {noeud: numéro de sa composante}.
+    """
+    index, bas, composante = {}, {}, {}
+    pile, sur_pile = [], set()
+    compteur = composantes = 0
+
+    for racine in graphe:
+        if racine in index:
+            continue
+        # Pile d'appels explicite : (noeud, itérateur sur ses voisins)
+        appels = [(racine, iter(graphe.get(racine, ())))]
+        index[racine] = bas[racine] = compteur
+        compteur += 1
+        pile.append(racine)
+        sur_pile.add(racine)
+
+        while appels:
+            noeud, voisins = appels[-1]
+            for voisin in voisins:
+                if voisin not in index:
+                    index[voisin] = bas[voisin] = compteur
+                    compteur += 1
+                    pile.append(voisin)
+                    sur_pile.add(voisin)
+                    appels.append((voisin, iter(graphe.get(voisin, ()))))
+                    break
+                if voisin in sur_pile:
+                    bas[noeud] = min(bas[noeud], index[voisin])
+            else:
+                # Tous les voisins traités : retour au parent
+                appels.pop()
+                if appels:
+                    parent = appels[-1][0]
+                    bas[parent] = min(bas[parent], bas[noeud])
+                if bas[noeud] == index[noeud]:
+                    while True:
+                        membre = pile.pop()
+                        sur_pile.discard(membre)
+                        composante[membre] = composantes
+                        if membre == noeud:
+                            break
+                    composantes += 1
+    return composante
+
+
+def detecter_cycles(demandes):
+    """
+    Cycles d'échange disjoints parmi des demandes de changement.
+    `demandes` : [(request_id, student_id, origine, destination)], où origine et
+    destination sont des équipes (ou des projets) ; chaque demande est un arc.
+
+    Seuls les arcs internes à une composante fortement connexe peuvent appartenir
+    à un cycle : les autres sont écartés. Les cycles sont ensuite extraits par un
+    parcours qui consomme chaque arc une seule fois : dès que le chemin revient sur
+    un de ses noeuds, le cycle formé est retenu et retiré.
+    Un étudiant figure dans un seul cycle, même s'il a plusieurs demandes : un arc
+    dont l'étudiant est déjà sur le chemin n'est pas consommé mais mis de côté, et
+    repris quand son noeud n'a plus d'autre arc, une fois l'étudiant sorti du chemin
+    (O(V + E) sauf pour les composantes parcourues une seconde fois, voir plus bas).
+
+    Renvoie la liste des cycles, chacun étant la liste ordonnée des request_id.
+    """
+    graphe = defaultdict(list)
+    for _, _, origine, destination in demandes:
+        graphe[origine].append(destination)
+    composante = composantes_fortement_connexes(graphe)
+
+    sortants = defaultdict(list)
+    for demande in demandes:
+        _, _, origine, destination = demande
+        if origine != destination and composante[origine] == composante.get(destination):
+            sortants[origine].append(demande)
+
+    etudiants_servis = set()
+    composantes_reportees = set()  # Composantes où un arc a été mis de côté
+    cycles = []
+
+    def arc_suivant(noeud, etudiants_chemin):
+        arcs = sortants[noeud]
+        while prochain[noeud] < len(arcs):
+            demande = arcs[prochain[noeud]]
+            prochain[noeud] += 1
+            if demande[1] in etudiants_servis:
+                continue
+            if demande[1] in etudiants_chemin:
+                reportes[noeud].append(demande)
+                composantes_reportees.add(composante[noeud])
+                continue
+            return demande
+        if reportes[noeud]:
+            reportes[noeud] = [demande for demande in reportes[noeud] if demande[1] not in etudiants_servis]
+            for i, demande in enumerate(reportes[noeud]):
+                if demande[1] not in etudiants_chemin:
+                    return reportes[noeud].pop(i)
+        return None
+
+    def parcourir(departs, par_depart):
+        nonlocal prochain, reportes
+        for depart in departs:
+            if par_depart:
+                prochain, reportes = defaultdict(int), defaultdict(list)
+            # Chemin courant : noeuds, arcs entre eux, position de chaque noeud, étudiants des arcs
+            noeuds, arcs, position, etudiants_chemin = [depart], [], {depart: 0}, set()
+            while noeuds:
+                demande = arc_suivant(noeuds[-1], etudiants_chemin)
+                if demande is None:
+                    # Impasse : on remonte d'un cran
+                    del position[noeuds.pop()]
+                    if arcs:
+                        etudiants_chemin.discard(arcs.pop()[1])
+                    continue
+
+                destination = demande[3]
+                if destination not in position:
+                    position[destination] = len(noeuds)
+                    noeuds.append(destination)
+                    arcs.append(demande)
+                    etudiants_chemin.add(demande[1])
+                    continue
+
+                # Retour sur le chemin : les arcs depuis `destination` forment un cycle
+                debut = position[destination]
+                cycle = arcs[debut:] + [demande]
+                cycles.append([request_id for request_id, _, _, _ in cycle])
+                etudiants_servis.update(student_id for _, student_id, _, _ in cycle)
+                etudiants_chemin.difference_update(student_id for _, student_id, _, _ in cycle)
+                for noeud in noeuds[debut + 1:]:
+                    del position[noeud]
+                del noeuds[debut + 1:]
+                del arcs[debut:]
+
+    # Premier arc non encore parcouru de chaque noeud, et arcs mis de côté (étudiant sur le chemin)
+    prochain, reportes = defaultdict(int), defaultdict(list)
+    parcourir(list(sortants), par_depart=False)
+
+    # Un arc consommé dans une impasse due à un étudiant sur le chemin peut manquer à un
+    # cycle : les composantes où un arc a été mis de côté sont parcourues à nouveau, tous
+    # leurs arcs redevenant disponibles à chaque départ. Cela n'arrive que pour un
+    # étudiant ayant des demandes depuis plusieurs noeuds.
+    if composantes_reportees:
+        parcourir([noeud for noeud in sortants if composante[noeud] in composantes_reportees], par_depart=True)
+    return cycles
+
+
+def solder(demandes, equipes):
+    """
+    Ensemble maximal de demandes satisfaites simultanément (« clearing » d'un marché
+    d'échanges, comme pour les dons croisés de reins).
+    `demandes` : [(request_id, student_id, equipe_actuelle, equipe_souhaitee)],
+    `equipes` : {team_id: (taille, min_students, max_students)}.
+
+    Chaque demande retenue déplace un étudiant ; une équipe peut gagner au plus ses
+    places libres et perdre au plus ce qui la garde à son minimum, et un étudiant
+    ne bouge qu'une fois. Les solutions sont donc des cycles d'échange et des chaînes
+    partant d'équipes ayant des places libres. Programme linéaire en nombres entiers
+    résolu par HiGHS : hors contraintes « un seul déplacement par étudiant », c'est
+    un problème de flot, dont la relaxation continue est déjà entière.
+    Renvoie la liste des request_id retenus.
+    """
+    demandes = [d for d in demandes if d[2] != d[3] and d[2] in equipes and d[3] in equipes]
+    if not demandes:
+        return []
+
+    # Une ligne par équipe : entrées - sorties dans [-(taille - min), max - taille]
+    rang_equipe = {team_id: i for i, team_id in enumerate(equipes)}
+    n_demandes = len(demandes)
+    colonnes = np.arange(n_demandes)
+    lignes = [np.array([rang_equipe[d[3]] for d in demandes]), np.array([rang_equipe[d[2]] for d in demandes])]
+    valeurs = [np.ones(n_demandes), -np.ones(n_demandes)]
+    tailles = np.array([equipes[t] for t in equipes], dtype=float).reshape(-1, 3)
+    bas = -np.maximum(tailles[:, 0] - tailles[:, 1], 0)
+    haut = np.maximum(tailles[:, 2] - tailles[:, 0], 0)
+
+    # Une ligne par étudiant ayant plusieurs demandes : au plus une satisfaite
+    par_etudiant = defaultdict(list)
+    for j, (_, student_id, _, _) in enumerate(demandes):
+        par_etudiant[student_id].append(j)
+    multiples = [js for js in par_etudiant.values() if len(js) > 1]
+    ligne = len(equipes)
+    for js in multiples:
+        lignes.append(np.full(len(js), ligne))
+        valeurs.append(np.ones(len(js)))
+        ligne += 1
+    colonnes = np.concatenate([colonnes, colonnes] + [np.array(js) for js in multiples])
+
+    contraintes = LinearConstraint(
+        csr_matrix((np.concatenate(valeurs), (np.concatenate(lignes), colonnes)), shape=(ligne, n_demandes)),
+        np.concatenate([bas, np.zeros(len(multiples))]),
+        np.concatenate([haut, np.ones(len(multiples))]),
+    )
+    resultat = milp(
+        c=-np.ones(n_demandes), constraints=contraintes,
+        integrality=np.ones(n_demandes), bounds=Bounds(0, 1),
+    )
+    if resultat.x is None:
+        raise RuntimeError(f"Échec du solveur : {resultat.message}")
+    return [demandes[j][0] for j in np.flatnonzero(resultat.x > 0.5)]
+
+
+class ConflitEchange(Exception):
+    """Demandes déjà traitées ou ne formant plus un échange valide (réponse HTTP 409)."""
+
+
+def _approuver(request_ids, admin, batch_size):
+    """
+    Passe les demandes encore en attente à « approved » (mise à jour conditionnelle,
+    par lots) et renvoie leur nombre : si une autre session en a déjà traité une,
+    le compte est inférieur au nombre demandé.
+    """
+    maintenant = timezone.now()
+    return sum(
+        ChangeRequest.objects.filter(id__in=request_ids[i:i + batch_size], status="pending").update(
+            status="approved", processed_by=admin, processed_at=maintenant
+        )
+        for i in range(0, len(request_ids), batch_size)
+    )
+
+
+def _changer_projets(changements, batch_size):
+    """
+    Reporte les changements de projet {student_id: (ancien, nouveau)} sur les
+    affectations, par lots, puis recalcule la satisfaction des niveaux touchés.
+    """
+    if not changements:
+        return
+    affectations = defaultdict(dict)
+    for affectation in ProjectAssignment.objects.filter(student_id__in=changements).only("id", "student_id", "project_id"):
+        affectations[affectation.student_id][affectation.project_id] = affectation
+
+    a_modifier, a_supprimer = [], []
+    for student_id, (ancien, nouveau) in changements.items():
+        affectation = affectations[student_id].get(ancien)
+        if affectation is None:
+            continue
+        if nouveau in affectations[student_id]:
+            a_supprimer.append(affectation.id)  # Déjà affecté au nouveau projet : l'ancienne ligne disparaît
+        else:
+            affectation.project_id = nouveau
+            a_modifier.append(affectation)
+
+    with suspendre_suivi():
+        ProjectAssignment.objects.bulk_update(a_modifier, ["project"], batch_size=batch_size)
+        for i in range(0, len(a_supprimer), batch_size):
+            ProjectAssignment.objects.filter(id__in=a_supprimer[i:i + batch_size]).delete()
+
+    # Les écritures en masse ne passent pas par les signaux : agrégats recalculés une fois par niveau
+    projets = {projet for couple in changements.values() for projet in couple}
+    for level in set(Project.objects.filter(id__in=projets).values_list("level", flat=True)):
+        reconstruire_ou_invalider(level)
+
+
+def solder_marche(admin, batch_size=None):
+    """
+    Satisfait en une transaction l'ensemble maximal de demandes de changement
+    d'équipe en attente (voir `solder`) : équipes et projets des étudiants mis à
+    jour par lots, demandes approuvées en masse. Les demandes dont l'étudiant n'est
+    plus dans l'équipe de départ sont ignorées.
+    """
+    batch_size = batch_size or getattr(settings, "ASSIGNMENT_BATCH_SIZE", TAILLE_LOT_PAR_DEFAUT)
+    with transaction.atomic():
+        en_attente = list(
+            ChangeRequest.objects.filter(status="pending", current_team__isnull=False, desired_team__isnull=False)
+            .select_for_update(of=("self",))
+            .values_list("id", "student_id", "current_team_id", "desired_team_id")
+        )
+        etudiants = {student_id for _, student_id, _, _ in en_attente}
+        appartenances = {
+            (student_id, team_id): membre_id
+            for membre_id, student_id, team_id in StudentsTeams.objects.filter(student_id__in=etudiants)
+            .values_list("id", "student_id", "team_id")
+        }
+        demandes = [d for d in en_attente if (d[1], d[2]) in appartenances]
+
+        equipes_concernees = {t for d in demandes for t in d[2:]}
+        equipes, projet_equipe = {}, {}
+        for team_id, project_id, taille, minimum, maximum in (
+            Team.objects.filter(id__in=equipes_concernees).annotate(taille=Count("members"))
+            .values_list("id", "project_id", "taille", "min_students", "max_students")
+        ):
+            equipes[team_id] = (taille, minimum, maximum)
+            projet_equipe[team_id] = project_id
+
+        debut = time.perf_counter()
+        retenues = solder(demandes, equipes)
+        duree = time.perf_counter() - debut
+
+        # Application : demandes approuvées, appartenances aux équipes, puis affectations aux projets
+        if _approuver(retenues, admin, batch_size) != len(retenues):
+            raise ConflitEchange("Des demandes ont été traitées pendant le calcul.")
+        par_id = {d[0]: d for d in demandes}
+        mouvements = [par_id[request_id] for request_id in retenues]
+        StudentsTeams.objects.bulk_update(
+            [StudentsTeams(id=appartenances[(student_id, actuelle)], team_id=souhaitee)
+             for _, student_id, actuelle, souhaitee in mouvements],
+            ["team"], batch_size=batch_size,
+        )
+        changements_projet = {
+            student_id: (projet_equipe[actuelle], projet_equipe[souhaitee])
+            for _, student_id, actuelle, souhaitee in mouvements
+            if projet_equipe[actuelle] != projet_equipe[souhaitee]
+        }
+        _changer_projets(changements_projet, batch_size)
+
+    return {
+        "requests_considered": len(demandes),
+        "requests_satisfied": len(retenues),
+        "project_changes": len(changements_projet),
+        "solve_time": round(duree, 4),
+    }
+
+
+def approuver_cycle(request_ids, admin, batch_size=None):
+    """
+    Approuve en une transaction un échange (un ou plusieurs cycles) de demandes en attente.
+    Les demandes sont lues et verrouillées en une requête (select_for_update), puis
+    vérifiées : toutes en attente, un étudiant par demande, toutes d'équipe à équipe
+    (ou toutes de projet à projet), chaque équipe reçoit autant d'étudiants qu'elle en
+    cède, et chaque étudiant est toujours dans son équipe (ou son projet) de départ.
+    Le passage à « approved » est conditionnel : si une autre session a approuvé une de
+    ces demandes entre-temps, rien n'est appliqué. Lève ConflitEchange sinon.
+    """
+    batch_size = batch_size or getattr(settings, "ASSIGNMENT_BATCH_SIZE", TAILLE_LOT_PAR_DEFAUT)
+    try:
+        with transaction.atomic():
+            return _approuver_cycle(list(dict.fromkeys(request_ids)), admin, batch_size)
+    except OperationalError as e:
+        # SQLite ne verrouille pas de lignes : une écriture concurrente fait échouer la transaction
+        if "locked" not in str(e):
+            raise
+        raise ConflitEchange("Une autre validation modifie ces demandes ; réessayez.") from e
+
+
+def _approuver_cycle(request_ids, admin, batch_size):
+    demandes = {
+        d[0]: d for d in ChangeRequest.objects.filter(id__in=request_ids).select_for_update(of=("self",)).values_list(
+            "id", "student_id", "status", "current_team_id", "desired_team_id",
+            "current_team__project_id", "desired_team__project_id", "current_project_id", "desired_project_id",
+        )
+    }
+    introuvables = [r for r in request_ids if r not in demandes]
+    if introuvables:
+        raise ConflitEchange(f"Demande(s) introuvable(s) : {introuvables}.")
+    traitees = [r for r, d in demandes.items() if d[2] != "pending"]
+    if traitees:
+        raise ConflitEchange(f"Demande(s) déjà traitée(s) : {traitees}.")
+
+    etudiants = [d[1] for d in demandes.values()]
+    if len(set(etudiants)) != len(etudiants):
+        raise ConflitEchange("Un étudiant apparaît dans plusieurs demandes de l'échange.")
+    # Même classement que detect_cycles : d'équipe à équipe si les deux sont connues, sinon de projet à projet
+    entre_equipes = [d[3] is not None and d[4] is not None for d in demandes.values()]
+    par_equipe = all(entre_equipes)
+    par_projet = not any(entre_equipes) and all(d[7] is not None and d[8] is not None for d in demandes.values())
+    if not (par_equipe or par_projet):
+        raise ConflitEchange("Un échange porte soit sur des équipes, soit sur des projets.")
+
+    # Échange valide : chaque noeud reçoit autant d'étudiants qu'il en cède (union de cycles)
+    origine, destination = (3, 4) if par_equipe else (7, 8)
+    solde = Counter()
+    for d in demandes.values():
+        solde[d[destination]] += 1
+        solde[d[origine]] -= 1
+    if any(solde.values()):
+        raise ConflitEchange("Les demandes ne forment pas un cycle d'échange.")
+
+    if par_equipe:
+        appartenances = {
+            (student_id, team_id): membre_id
+            for membre_id, student_id, team_id in StudentsTeams.objects.filter(student_id__in=etudiants)
+            .values_list("id", "student_id", "team_id")
+        }
+        absents = [r for r, d in demandes.items() if (d[1], d[3]) not in appartenances]
+    else:
+        affectes = set(ProjectAssignment.objects.filter(student_id__in=etudiants).values_list("student_id", "project_id"))
+        absents = [r for r, d in demandes.items() if (d[1], d[7]) not in affectes]
+    if absents:
+        raise ConflitEchange(f"Demande(s) dont l'étudiant a changé d'équipe ou de projet : {absents}.")
+
+    # Réservation des demandes, puis application en masse
+    if _approuver(request_ids, admin, batch_size) != len(request_ids):
+        raise ConflitEchange("Une autre validation a traité ces demandes entre-temps.")
+
+    if par_equipe:
+        StudentsTeams.objects.bulk_update(
+            [StudentsTeams(id=appartenances[(d[1], d[3])], team_id=d[4]) for d in demandes.values()],
+            ["team"], batch_size=batch_size,
+        )
+        changements = {d[1]: (d[5], d[6]) for d in demandes.values() if d[5] != d[6]}
+    else:
+        changements = {d[1]: (d[7], d[8]) for d in demandes.values()}
+        # L'étudiant quitte les équipes de son ancien projet
+        StudentsTeams.objects.filter(id__in=[
+            membre_id for membre_id, student_id, project_id in
+            StudentsTeams.objects.filter(student_id__in=changements).values_list("id", "student_id", "team__project_id")
+            if project_id == changements[student_id][0]
+        ]).delete()
+    _changer_projets(changements, batch_size)
+
+    return {"requests_approved": len(request_ids), "project_changes": len(changements)}
@@ -0,0 +1,111 @@
+import heapq
+
+
+def calculer_quotas(nb_etudiants, equipes):
+    """
+    Nombre d'étudiants à ajouter à chaque équipe d'un projet.
+    `equipes` : [(team_id, min_students, max_students, taille_actuelle)].
+
+    1. Minimums : on complète d'abord les équipes sous leur minimum. Si les étudiants
+       ne suffisent pas, on commence par les plus petits manques, pour qu'un maximum
+       d'équipes atteigne son minimum.
+    2. Équilibrage : chaque étudiant restant rejoint l'équipe la plus petite ayant
+       encore de la place (tas min sur la taille courante, mis à jour à chaque ajout).
+
+    Renvoie ({team_id: quota}, nombre d'étudiants sans place).
+    """
+    quotas = {team_id: 0 for team_id, *_ in equipes}
+    tailles = {team_id: taille for team_id, _, _, taille in equipes}
+    restants = nb_etudiants
+
+    manques = sorted(
+        (min(minimum, maximum) - taille, team_id)
+        for team_id, minimum, maximum, taille in equipes if taille < min(minimum, maximum)
+    )
+    for manque, team_id in manques:
+        if restants < manque:
+            break
+        quotas[team_id] += manque
+        tailles[team_id] += manque
+        restants -= manque
+
+    tas = [(tailles[team_id], team_id, maximum) for team_id, _, maximum, _ in equipes if tailles[team_id] < maximum]
+    heapq.heapify(tas)
+    while restants and tas:
+        taille, team_id, maximum = heapq.heappop(tas)
+        quotas[team_id] += 1
+        restants -= 1
+        if taille + 1 < maximum:
+            heapq.heappush(tas, (taille + 1, team_id, maximum))
+
+    return quotas, restants
+
+
+def ordonner_par_similarite(etudiants, voeux_par_etudiant):
+    """
+    Place côte à côte les étudiants dont les listes de vœux se ressemblent :
+    tri sur la liste ordonnée des projets demandés, donc les étudiants partageant
+    les mêmes premiers choix se suivent et rejoignent la même équipe.
+    """
+    return sorted(etudiants, key=lambda etudiant: (tuple(voeux_par_etudiant.get(etudiant, ())), etudiant))
+
+
+def repartir_projet(etudiants, equipes, voeux_par_etudiant=None):
+    """
+    Répartit les étudiants d'un projet dans ses équipes en respectant min/max.
+    Avec `voeux_par_etudiant` ({student_id: [project_id par rang]}), les étudiants
+    aux vœux proches sont regroupés dans les mêmes équipes.
+
+    Renvoie ({student_id: team_id}, étudiants sans place, rapport de faisabilité ou None).
+    """
+    quotas, sans_place = calculer_quotas(len(etudiants), equipes)
+    if voeux_par_etudiant is not None:
+        etudiants = ordonner_par_similarite(etudiants, voeux_par_etudiant)
+
+    # Les quotas sont remplis dans l'ordre des étudiants : des blocs contigus par équipe
+    placements = {}
+    file_etudiants = iter(etudiants)
+    for team_id, _, _, _ in equipes:
+        for _ in range(quotas[team_id]):
+            placements[next(file_etudiants)] = team_id
+    non_places = list(file_etudiants)
+
+    sous_minimum = [
+        {"team_id": team_id, "taille": taille + quotas[team_id], "min_students": minimum}
+        for team_id, minimum, _, taille in equipes
+        if taille + quotas[team_id] < minimum
+    ]
+    rapport = None
+    if sous_minimum or sans_place:
+        rapport = {
+            "equipes_sous_minimum": sous_minimum,
+            "etudiants_manquants": sum(e["min_students"] - e["taille"] for e in sous_minimum),
+            "etudiants_sans_place": sans_place,
+        }
+    return placements, non_places, rapport
+
+
+def repartir(etudiants_par_projet, equipes_par_projet, voeux_par_etudiant=None):
+    """
+    Répartition de tous les projets.
+    `etudiants_par_projet` : {project_id: [student_id]} (étudiants à placer),
+    `equipes_par_projet` : {project_id: [(team_id, min_students, max_students, taille_actuelle)]}.
+
+    Renvoie ({(student_id, project_id): team_id}, {project_id: [student_id sans place]},
+    {project_id: rapport de faisabilité} pour les projets où les contraintes ne sont pas tenues).
+    Les placements sont indexés par couple : un étudiant affecté (en attente) à deux
+    projets reçoit une équipe dans chacun.
+    """
+    placements, non_places, faisabilite = {}, {}, {}
+    for project_id, etudiants in etudiants_par_projet.items():
+        equipes = equipes_par_projet.get(project_id, [])
+        if not equipes:
+            non_places[project_id] = list(etudiants)
+            continue
+        places, restants, rapport = repartir_projet(etudiants, equipes, voeux_par_etudiant)
+        placements.update(((student_id, project_id), team_id) for student_id, team_id in places.items())
+        if restants:
+            non_places[project_id] = restants
+        if rapport:
+            faisabilite[project_id] = rapport
+    return placements, non_places, faisabilite
@@ -0,0 +1,119 @@
+import time
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+from django.db import transaction
+from ges_project_app.attribution import gale_shapley_vectorise, satisfaction
+from ges_project_app.attribution.persistance import enregistrer_affectations
+
+# Mêmes données que le moteur vectorisé : matrice des scores (étudiant × projet) et équipes
+charger_donnees = gale_shapley_vectorise.charger_donnees
+
+
+def construire_graphe(donnees):
+    """
+    Graphe biparti étudiants × places : chaque équipe offre `max_students` places,
+    et chaque étudiant est relié aux places des projets qu'il a demandés, plus à une
+    place fictive « non affecté ». Le flot de coût minimal (capacités = places,
+    coût = -score) devient ainsi un couplage de poids minimal.
+
+    Les places de la première équipe d'un projet prioritaire reçoivent un bonus
+    supérieur à tout gain de score possible : elles sont remplies au maximum avant
+    toute autre considération (borne inférieure), comme la phase prioritaire des
+    autres moteurs.
+
+    Retourne (matrice creuse des coûts, équipe de chaque place réelle).
+    """
+    scores = donnees["scores"]
+    n_etudiants, n_projets = scores.shape
+    capacites = donnees["capacites"]
+    equipe_projet = donnees["equipe_projet"]
+
+    # Places réelles, regroupées par projet : [debut[p], debut[p] + places[p])
+    equipes = np.flatnonzero(capacites > 0)
+    equipes = equipes[np.argsort(equipe_projet[equipes], kind="stable")]
+    place_equipe = np.repeat(equipes, capacites[equipes])
+    places_par_projet = np.bincount(equipe_projet[place_equipe], minlength=n_projets)
+    debut = np.concatenate(([0], np.cumsum(places_par_projet)[:-1]))
+    n_places = len(place_equipe)
+
+    # Une arête par (vœu, place du projet demandé)
+    etudiants, projets = np.nonzero(np.isfinite(scores))
+    score_voeu = scores[etudiants, projets].astype(np.int64)
+    n_aretes = places_par_projet[projets]
+    lignes = np.repeat(etudiants, n_aretes)
+    decalage = np.arange(n_aretes.sum()) - np.repeat(np.cumsum(n_aretes) - n_aretes, n_aretes)
+    colonnes = np.repeat(debut[projets], n_aretes) + decalage
+    gains = np.repeat(score_voeu, n_aretes)
+
+    # Borne inférieure des projets prioritaires : bonus sur les places de leur première équipe
+    score_max = int(score_voeu.max(initial=0))
+    bonus = n_etudiants * score_max + 1
+    premieres_equipes = [
+        np.flatnonzero(equipe_projet == p)[0]
+        for p in donnees["projets_prioritaires"] if np.any(equipe_projet == p)
+    ]
+    gains = gains + bonus * np.isin(place_equipe[colonnes], premieres_equipes)
+
+    # Coûts strictement positifs (une valeur nulle serait une arête absente) :
+    # une place réelle coûte `constante - gain`, la place fictive `constante`.
+    constante = int(gains.max(initial=0)) + 1
+    lignes = np.concatenate((lignes, np.arange(n_etudiants)))
+    colonnes = np.concatenate((colonnes, n_places + np.arange(n_etudiants)))
+    couts = np.concatenate((constante - gains, np.full(n_etudiants, constante)))
+
+    graphe = csr_matrix((couts.astype(np.float64), (lignes, colonnes)), shape=(n_etudiants, n_places + n_etudiants))
+    return graphe, place_equipe
+
+
+def resoudre(donnees):
+    """Retourne l'indice d'équipe de chaque étudiant (-1 si non affecté)."""
+    n_etudiants = donnees["scores"].shape[0]
+    if n_etudiants == 0:
+        return np.zeros(0, dtype=np.int64)
+    graphe, place_equipe = construire_graphe(donnees)
+    lignes, colonnes = min_weight_full_bipartite_matching(graphe)
+
+    equipe = np.full(n_etudiants, -1, dtype=np.int64)
+    reelles = colonnes < len(place_equipe)
+    equipe[lignes[reelles]] = place_equipe[colonnes[reelles]]
+    return equipe
+
+
+def calculer_affectations(donnees, seed=None):
+    """
+    Calcule les affectations à partir de `charger_donnees`, sans accès à la base. Retourne {student_id: project_id}.
+    L'optimum est déterministe : `seed` n'est accepté que pour l'interface commune des moteurs.
+    """
+    equipe = resoudre(donnees)
+    affectes = np.flatnonzero(equipe >= 0)
+    projets_affectes = donnees["equipe_projet"][equipe[affectes]]
+    return {
+        int(donnees["etudiant_ids"][e]): int(donnees["projet_ids"][p])
+        for e, p in zip(affectes, projets_affectes)
+    }
+
+
+def affectation_optimale(level, seed=None, progression=None):
+    """`progression` : comme pour gale_shapley_attribution.affectation_projet."""
+    donnees = charger_donnees(level)
+    if progression:
+        progression("donnees")
+    debut = time.perf_counter()
+    affectations = calculer_affectations(donnees, seed=seed)
+    temps_resolution = time.perf_counter() - debut
+    if progression:
+        progression("calcul")
+
+    with transaction.atomic():
+        persistance = enregistrer_affectations(level, affectations)
+        satisfaction_pourcentage = satisfaction.lire_satisfaction(level, "gale_shapley")
+
+        return {
+            "message": f"Affectation optimale (niveau {level}) terminée : {len(affectations)} étudiants affectés.",
+            "assignments_count": len(affectations),
+            "satisfaction (%)": round(satisfaction_pourcentage, 2),
+            "solve_time": round(temps_resolution, 4),
+            "seed": seed,
+            "persistance": persistance
+        }
@@ -1,180 +1,192 @@
+import heapq
+import itertools
 import random
 from collections import defaultdict
 from django.db import transaction
-from ges_project_app.models import Student, Project, Team, Voeux, ProjectAssignment, Deadline
+from ges_project_app.models import Voeux, ProjectAssignment, NOTE_PREFERENCE_MAX
+from ges_project_app import parametres_niveau
+from ges_project_app.attribution.persistance import enregistrer_affectations
+from ges_project_app.attribution import probleme, satisfaction
 
 def calculer_score(rank, note, max_choice=5):
     
     return (max_choice - rank + 1) + note
 
 
-def affectation_projet(level):
+def score_maximal(max_choice=5):
+    """Score d'un étudiant ayant obtenu son premier vœu avec la note maximale."""
+    return calculer_score(1, NOTE_PREFERENCE_MAX, max_choice=max_choice)
+
+
+def gale_shapley(voeux_par_etudiant, equipes_par_projet, capacites, rng=random):
+    """
+    Boucle de Gale-Shapley (adaptée) sur des données simples.
+
+    - `voeux_par_etudiant` : {etudiant: [(projet, rang, score), ...]} trié par rang
+    - `equipes_par_projet` : {projet: [equipe, ...]}
+    - `capacites` : {equipe: places restantes}
+
+    Chaque équipe est un tas-min borné (score le plus faible au sommet) : une
+    proposition coûte O(log n) au lieu d'un tri complet de l'équipe. Les vœux
+    sont parcourus avec un curseur et l'appartenance à une équipe est un
+    dictionnaire, donc en O(1). Retourne {etudiant: equipe}.
+    """
+    equipes = {equipe: [] for equipe in capacites}
+    equipe_de = {}
+    curseur = dict.fromkeys(voeux_par_etudiant, 0)
+    etudiants_libres = list(voeux_par_etudiant)
+    ordre = itertools.count()
+
+    while etudiants_libres:
+        etudiant = etudiants_libres.pop()
+        voeux = voeux_par_etudiant[etudiant]
+        i = curseur[etudiant]
+        if i >= len(voeux):
+            continue  # Plus aucun vœu à proposer
+
+        curseur[etudiant] = i + 1
+        projet, _, score = voeux[i]
+
+        equipes_possibles = [e for e in equipes_par_projet.get(projet, ()) if capacites[e] > 0]
+        if not equipes_possibles:
+            etudiants_libres.append(etudiant)
+            continue
+
+        equipe = rng.choice(equipes_possibles)
+        tas = equipes[equipe]
+        # À score égal, le dernier arrivé est le premier évincé
+        entree = (score, -next(ordre), etudiant)
+
+        if len(tas) < capacites[equipe]:
+            heapq.heappush(tas, entree)
+            equipe_de[etudiant] = equipe
+        elif score > tas[0][0]:
+            _, _, evince = heapq.heapreplace(tas, entree)
+            del equipe_de[evince]
+            equipe_de[etudiant] = equipe
+            etudiants_libres.append(evince)
+        else:
+            etudiants_libres.append(etudiant)
+
+    return equipe_de
+
+
+def charger_donnees(level):
+    """Problème d'affectation du niveau (voir `probleme.MatchingProblem`), calculable hors de l'ORM."""
+    return probleme.charger(level)
+
+
+def calculer_affectations(donnees, seed=None):
+    """Calcule les affectations à partir de `charger_donnees`, sans accès à la base. Retourne {student_id: project_id}."""
+    rng = random.Random(seed)
+    # Étudiants, projets et équipes désignés par leurs indices dans le problème
+    voeux_par_etudiant = dict(enumerate(donnees.voeux_par_etudiant(calculer_score)))
+    capacites = {i: equipe.capacite for i, equipe in enumerate(donnees.equipes)}
+
+    # 3. Regrouper les équipes par projet
+    equipes_par_projet = defaultdict(list)
+    for i, equipe in enumerate(donnees.equipes):
+        equipes_par_projet[equipe.projet].append(i)
+
+    # 4. Liste des étudiants à affecter
+    affectations = {}
+
+    # -- Traitement des projets prioritaires --
+    for projet in donnees.prioritaires.tolist():
+        equipes_projet = equipes_par_projet.get(projet, [])
+        if not equipes_projet:
+            continue  # Aucun groupe disponible pour ce projet
+
+        equipe = equipes_projet[0]  # Choix simple : première équipe du projet
+
+        # Trouver les étudiants qui ont mis ce projet dans leurs vœux
+        candidats = [
+            (etudiant, score)
+            for etudiant, voeux in voeux_par_etudiant.items()
+            for p, _, score in voeux
+            if p == projet
+        ]
+
+        # Affecter les meilleurs candidats à l'équipe du projet prioritaire
+        candidats.sort(key=lambda x: x[1], reverse=True)
+        for etudiant, _ in candidats[:capacites[equipe]]:
+            affectations[etudiant] = equipe
+            voeux_par_etudiant.pop(etudiant)  # Retirer l'étudiant de la liste des libres
+
+        # Mettre à jour la capacité restante
+        capacites[equipe] -= min(len(candidats), capacites[equipe])
+
+    # 5. Algorithme de Gale-Shapley (adapté) sur les étudiants restants
+    affectations.update(gale_shapley(voeux_par_etudiant, equipes_par_projet, capacites, rng=rng))
+
+    return donnees.en_base(affectations)
+
+
+def restreindre_donnees(donnees, etudiants, places, projets_prioritaires):
+    """Sous-problème de la réaffectation incrémentale (voir `MatchingProblem.restreindre`)."""
+    return donnees.restreindre(etudiants, places, projets_prioritaires)
+
+
+def affectation_projet(level, seed=None, progression=None):
+    """
+    `progression(etape)`, optionnelle, est appelée après le chargement ("donnees") et
+    le calcul ("calcul") : seule l'écriture est faite en transaction, l'avancement
+    reste donc visible des autres connexions.
+    """
+    donnees = charger_donnees(level)
+    if progression:
+        progression("donnees")
+    affectations = calculer_affectations(donnees, seed=seed)
+    if progression:
+        progression("calcul")
+
     with transaction.atomic():
-        # Supprimer uniquement les affectations du niveau concerné
-        ProjectAssignment.objects.filter(
-            student__level=level,
-            project__level=level
-        ).delete()
-        
-        try:
-            param = Deadline.objects.get(level=level)
-            max_choice = param.max_choice
-        except Deadline.DoesNotExist:
-            max_choice = 5
-
-        # 1. Préparer les préférences des étudiants du niveau donné
-        voeux = Voeux.objects.select_related("student", "project").filter(
-            student__level=level,
-            project__level=level
-        )
-        voeux_par_etudiant = defaultdict(list)
-
-        total_projects = Project.objects.filter(level=level).count()
-
-        for v in voeux:
-            score = calculer_score(v.rank, v.note_preference, max_choice=max_choice)
-            voeux_par_etudiant[v.student].append((v.project, v.rank, score))
-
-        for student in voeux_par_etudiant:
-            voeux_par_etudiant[student].sort(key=lambda x: x[1])  # Tri des vœux
-
-        # 2. Préparer les équipes et capacités pour le niveau
-        equipes_disponibles = {
-            equipe: [] for equipe in Team.objects.select_related("project").filter(project__level=level)
-        }
-        capacites = {equipe: equipe.max_students for equipe in equipes_disponibles}
-
-        # 3. Regrouper les équipes par projet
-        equipes_par_projet = defaultdict(list)
-        for equipe in equipes_disponibles:
-            equipes_par_projet[equipe.project].append(equipe)
-
-        # 4. Liste des étudiants à affecter
-        affectations = {}
-
-        # -- Traitement des projets prioritaires --
-        projets_prioritaires = Project.objects.filter(level=level, priority=True)
-
-        for projet in projets_prioritaires:
-            equipes = equipes_par_projet.get(projet, [])
-            if not equipes:
-                continue  # Aucun groupe disponible pour ce projet
-
-            equipe = equipes[0]  # Choix simple : première équipe du projet
-            capacite_restante = capacites.get(equipe, 0)
-
-            # Trouver les étudiants qui ont mis ce projet dans leurs vœux
-            candidats = []
-            for etudiant, voeux in voeux_par_etudiant.items():
-                for p, _, score in voeux:
-                    if p == projet:
-                        candidats.append((etudiant, score))
-                        break
-
-            # Trier les candidats par score décroissant
-            candidats = sorted(candidats, key=lambda x: x[1], reverse=True)
-
-            # Affecter les meilleurs candidats à l'équipe du projet prioritaire
-            for etudiant, score in candidats:
-                if capacite_restante <= 0:
-                    break
-                if etudiant in affectations:
-                    continue  # Déjà affecté
-
-                equipes_disponibles[equipe].append((etudiant, score))
-                affectations[etudiant] = equipe
-                capacite_restante -= 1
-
-                # Retirer l'étudiant de la liste des libres
-                voeux_par_etudiant.pop(etudiant, None)
-
-            # Mettre à jour la capacité restante
-            capacites[equipe] = capacite_restante
-
-        # Rafraîchir la liste des étudiants à affecter après priorité
-        etudiants_libres = set(voeux_par_etudiant.keys())
-
-        # 5. Algorithme de Gale-Shapley (adapté)
-        while etudiants_libres:
-            etudiant = etudiants_libres.pop()
-
-            if not voeux_par_etudiant[etudiant]:
-                continue
-
-            projet, _, score = voeux_par_etudiant[etudiant].pop(0)
-
-            # Récupérer les équipes du projet qui ont de la place
-            equipes_possibles = [
-                e for e in equipes_par_projet[projet]
-                if capacites[e] > 0 or etudiant in [s for s, _ in equipes_disponibles[e]]
-            ]
-
-            if not equipes_possibles:
-                continue
-
-            equipe = random.choice(equipes_possibles)
-            equipes_disponibles[equipe].append((etudiant, score))
-            equipes_disponibles[equipe].sort(key=lambda x: x[1], reverse=True)
-
-            if len(equipes_disponibles[equipe]) > capacites[equipe]:
-                removed_student, _ = equipes_disponibles[equipe].pop()
-                if removed_student != etudiant:
-                    etudiants_libres.add(removed_student)
-                    etudiants_libres.add(etudiant)
-                else:
-                    etudiants_libres.add(etudiant)
-            else:
-                affectations[etudiant] = equipe
-
-        # 6. Sauvegarde en base
-        for equipe, etudiants_scores in equipes_disponibles.items():
-            for etudiant, _ in etudiants_scores:
-                ProjectAssignment.objects.create(
-                    student=etudiant,
-                    project=equipe.project,
-                    status='pending'
-                )
-
-        satisfaction_pourcentage = calculer_satisfaction(level)
+        # 6. Sauvegarde en base (uniquement la différence avec l'existant)
+        persistance = enregistrer_affectations(level, affectations)
+
+        satisfaction_pourcentage = satisfaction.lire_satisfaction(level, "gale_shapley")
 
         return {
             "message": f"Affectation (niveau {level}) terminée : {len(affectations)} étudiants affectés.",
             "assignments_count": len(affectations),
-            "satisfaction (%)": round(satisfaction_pourcentage, 2)
+            "satisfaction (%)": round(satisfaction_pourcentage, 2),
+            "seed": seed,
+            "persistance": persistance,
+            "probleme": donnees.statistiques,
         }
         
         
-def calculer_satisfaction(level):
-    affectations = ProjectAssignment.objects.filter(project__level=level)
-    try:
-        param = Deadline.objects.get(level=level)
-        max_choice = param.max_choice
-    except Deadline.DoesNotExist:
-        max_choice = 5
-        
-    if not affectations.exists():
-        return 0 
-    
-    voeux = Voeux.objects.filter(student__level=level, project__level=level)
-    pref_dict = {(v.student_id, v.project_id): v for v in voeux}
-    
+def calculer_satisfaction_donnees(affectations, voeux, max_choice=5):
+    """
+    Satisfaction (%) à partir de couples (student_id, project_id) et des vœux
+    (student_id, project_id, rank, note_preference) déjà chargés.
+    """
+    pref_dict = {(student_id, project_id): (rank, note) for student_id, project_id, rank, note in voeux}
+
     total_score = 0
     max_possible_score = 0
-    n_etudiants = affectations.count()
-    total_projects = Project.objects.filter(level=level).count()
 
-    for affectation in affectations:
-        etudiant = affectation.student
-        projet = affectation.project
-
-        if (etudiant.id, projet.id) in pref_dict:
-            pref = pref_dict[(etudiant.id, projet.id)]
-            score = calculer_score(pref.rank, pref.note_preference, max_choice=max_choice)
+    for cle in affectations:
+        if cle in pref_dict:
+            rank, note = pref_dict[cle]
+            score = calculer_score(rank, note, max_choice=max_choice)
         else:
             score = 0  # Projet non choisi
 
         total_score += score
-        max_possible_score += calculer_score(1, 20, max_choice=max_choice)
+        max_possible_score += score_maximal(max_choice)
+
+    return (total_score / max_possible_score) * 100 if max_possible_score > 0 else 0
+
+
+def calculer_satisfaction(level):
+    max_choice = parametres_niveau.max_choice(level)
+
+    affectations = list(ProjectAssignment.objects.filter(project__level=level).values_list("student_id", "project_id"))
+    if not affectations:
+        return 0
 
-    score_satisfaction = (total_score / max_possible_score) * 100 if max_possible_score > 0 else 0
-    return score_satisfaction
+    voeux = Voeux.objects.filter(student__level=level, project__level=level).values_list(
+        "student_id", "project_id", "rank", "note_preference"
+    )
+    return calculer_satisfaction_donnees(affectations, voeux, max_choice=max_choice)
@@ -0,0 +1,163 @@
+import numpy as np
+from django.db import transaction
+from ges_project_app.models import Project, Team, Voeux
+from ges_project_app.attribution.gale_shapley_attribution import calculer_score
+from ges_project_app import parametres_niveau
+from ges_project_app.attribution.persistance import enregistrer_affectations
+from ges_project_app.attribution import satisfaction
+
+
+def charger_donnees(level):
+    """
+    Charge les vœux et les équipes d'un niveau une seule fois, sous forme de
+    tableaux NumPy indexés par des entiers (étudiant × projet).
+    """
+    max_choice = parametres_niveau.max_choice(level)
+
+    voeux = np.array(
+        Voeux.objects.filter(student__level=level, project__level=level)
+        .values_list("student_id", "project_id", "rank", "note_preference"),
+        dtype=np.int64,
+    ).reshape(-1, 4)
+    projets = np.array(
+        Project.objects.filter(level=level).order_by("id").values_list("id", "priority"),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    equipes = np.array(
+        Team.objects.filter(project__level=level).order_by("id").values_list("id", "project_id", "max_students"),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+
+    etudiant_ids, idx_etudiant = np.unique(voeux[:, 0], return_inverse=True)
+    projet_ids = projets[:, 0]
+    idx_projet = np.searchsorted(projet_ids, voeux[:, 1])
+    n_etudiants, n_projets = len(etudiant_ids), len(projet_ids)
+
+    # Matrices rang / score : 0 et -inf signifient « pas de vœu »
+    rangs = np.zeros((n_etudiants, n_projets), dtype=np.int32)
+    rangs[idx_etudiant, idx_projet] = voeux[:, 2]
+    scores = np.full((n_etudiants, n_projets), -np.inf)
+    scores[idx_etudiant, idx_projet] = calculer_score(voeux[:, 2], voeux[:, 3], max_choice=max_choice)
+
+    # Liste de préférences de chaque étudiant (indices de projets triés par rang, -1 en fin de liste)
+    n_voeux = np.bincount(idx_etudiant, minlength=n_etudiants)
+    ordre = np.lexsort((voeux[:, 2], idx_etudiant))
+    debut = np.concatenate(([0], np.cumsum(n_voeux)[:-1]))
+    position = np.arange(len(ordre)) - debut[idx_etudiant[ordre]]
+    preferences = np.full((n_etudiants, max(n_voeux.max(initial=0), 1)), -1, dtype=np.int64)
+    preferences[idx_etudiant[ordre], position] = idx_projet[ordre]
+
+    return {
+        "etudiant_ids": etudiant_ids,
+        "projet_ids": projet_ids,
+        "projets_prioritaires": np.flatnonzero(projets[:, 1]),
+        "equipe_ids": equipes[:, 0],
+        "equipe_projet": np.searchsorted(projet_ids, equipes[:, 1]),
+        "capacites": equipes[:, 2].copy(),
+        "rangs": rangs,
+        "scores": scores,
+        "preferences": preferences,
+        "n_voeux": n_voeux,
+    }
+
+
+def _classer(candidats, projets, scores, bruit):
+    """Trie les candidats par projet puis par score décroissant et retourne leur position dans chaque projet."""
+    ordre = np.lexsort((bruit[candidats], -scores[candidats, projets], projets))
+    candidats, projets = candidats[ordre], projets[ordre]
+    debut = np.searchsorted(projets, projets, side="left")
+    return candidats, projets, np.arange(len(candidats)) - debut
+
+
+def resoudre(donnees, rng=None):
+    """
+    Algorithme de Gale-Shapley par tours : à chaque tour, tous les étudiants libres
+    proposent en même temps leur vœu suivant, puis chaque projet garde ses meilleurs
+    candidats dans la limite de sa capacité. Retourne l'indice d'équipe de chaque étudiant (-1 si aucun).
+    """
+    rng = rng or np.random.default_rng()
+    scores, preferences, n_voeux = donnees["scores"], donnees["preferences"], donnees["n_voeux"]
+    equipe_projet = donnees["equipe_projet"]
+    capacites_equipes = donnees["capacites"].copy()
+    n_etudiants, n_projets = scores.shape
+
+    bruit = rng.random(n_etudiants)  # départage aléatoire des égalités de score
+    equipe_fixee = np.full(n_etudiants, -1, dtype=np.int64)
+
+    # -- Projets prioritaires : la première équipe prend les meilleurs candidats --
+    for p in donnees["projets_prioritaires"]:
+        equipes_p = np.flatnonzero(equipe_projet == p)
+        if equipes_p.size == 0:
+            continue
+        equipe = equipes_p[0]
+        candidats = np.flatnonzero(np.isfinite(scores[:, p]) & (equipe_fixee < 0))
+        candidats = candidats[np.lexsort((bruit[candidats], -scores[candidats, p]))]
+        retenus = candidats[:capacites_equipes[equipe]]
+        equipe_fixee[retenus] = equipe
+        capacites_equipes[equipe] -= len(retenus)
+
+    capacites_projets = np.bincount(equipe_projet, weights=capacites_equipes, minlength=n_projets).astype(np.int64)
+
+    # -- Acceptation différée par tours --
+    projet_retenu = np.full(n_etudiants, -1, dtype=np.int64)
+    curseur = np.zeros(n_etudiants, dtype=np.int64)
+    curseur[equipe_fixee >= 0] = n_voeux[equipe_fixee >= 0]  # déjà affectés, ne proposent plus
+
+    while True:
+        libres = np.flatnonzero((projet_retenu < 0) & (curseur < n_voeux))
+        if libres.size == 0:
+            break
+        projet_retenu[libres] = preferences[libres, curseur[libres]]
+        curseur[libres] += 1
+
+        # Seuls les projets ayant reçu une proposition sont réévalués
+        concernes = np.zeros(n_projets, dtype=bool)
+        concernes[projet_retenu[libres]] = True
+        candidats = np.flatnonzero((projet_retenu >= 0) & concernes[np.maximum(projet_retenu, 0)])
+        candidats, projets, position = _classer(candidats, projet_retenu[candidats], scores, bruit)
+        projet_retenu[candidats[position >= capacites_projets[projets]]] = -1
+
+    # -- Répartition des étudiants retenus dans les équipes de chaque projet --
+    equipe_finale = equipe_fixee.copy()
+    retenus = np.flatnonzero(projet_retenu >= 0)
+    retenus, projets, position = _classer(retenus, projet_retenu[retenus], scores, bruit)
+    for p in np.unique(projets):
+        equipes_p = np.flatnonzero((equipe_projet == p) & (capacites_equipes > 0))
+        bornes = np.cumsum(capacites_equipes[equipes_p])
+        equipe_finale[retenus[projets == p]] = equipes_p[np.searchsorted(bornes, position[projets == p], side="right")]
+
+    return equipe_finale
+
+
+def calculer_affectations(donnees, seed=None):
+    """Calcule les affectations à partir de `charger_donnees`, sans accès à la base. Retourne {student_id: project_id}."""
+    equipe_finale = resoudre(donnees, rng=np.random.default_rng(seed))
+    affectes = np.flatnonzero(equipe_finale >= 0)
+    projets_affectes = donnees["equipe_projet"][equipe_finale[affectes]]
+    return {
+        int(donnees["etudiant_ids"][e]): int(donnees["projet_ids"][p])
+        for e, p in zip(affectes, projets_affectes)
+    }
+
+
+def affectation_projet_vectorisee(level, seed=None, progression=None):
+    """`progression` : comme pour gale_shapley_attribution.affectation_projet."""
+    donnees = charger_donnees(level)
+    if progression:
+        progression("donnees")
+    affectations = calculer_affectations(donnees, seed=seed)
+    if progression:
+        progression("calcul")
+
+    with transaction.atomic():
+        persistance = enregistrer_affectations(level, affectations)
+
+        satisfaction_pourcentage = satisfaction.lire_satisfaction(level, "gale_shapley")
+
+        return {
+            "message": f"Affectation vectorisée (niveau {level}) terminée : {len(affectations)} étudiants affectés.",
+            "assignments_count": len(affectations),
+            "satisfaction (%)": round(satisfaction_pourcentage, 2),
+            "seed": seed,
+            "persistance": persistance
+        }
@@ -0,0 +1,120 @@
+import random
+import time
+from django.utils import timezone
+from ges_project_app.models import AssignmentRun
+from ges_project_app.attribution import attribution, gale_shapley_attribution, gale_shapley_vectorise, flot_cout_min, reaffectation
+
+# Moteurs d'affectation disponibles, sélectionnés par le paramètre `algorithm`
+ALGORITHMES = {
+    "algo1": gale_shapley_attribution.affectation_projet,
+    "algo2": attribution.affecter_projets,
+    "algo3": gale_shapley_vectorise.affectation_projet_vectorisee,
+    "algo4": flot_cout_min.affectation_optimale,
+}
+
+# Modules des moteurs, découpés en `charger_donnees(level)` (ORM) et
+# `calculer_affectations(donnees, seed)` (données simples, sans base) ;
+# algo1 et algo2 partagent le même `probleme.MatchingProblem`
+MOTEURS = {
+    "algo1": gale_shapley_attribution,
+    "algo2": attribution,
+    "algo3": gale_shapley_vectorise,
+    "algo4": flot_cout_min,
+}
+
+# Module dont le score (et donc la satisfaction) correspond à chaque moteur
+SATISFACTION = {
+    "algo1": gale_shapley_attribution,
+    "algo2": attribution,
+    "algo3": gale_shapley_attribution,
+    "algo4": gale_shapley_attribution,
+}
+
+
+# Graines acceptées : celles de numpy.random.default_rng comme de random.Random, stockables en BigIntegerField
+GRAINE_MAX = 2 ** 32
+
+
+class AlgorithmeInconnu(ValueError):
+    pass
+
+
+def nouvelle_graine():
+    return random.SystemRandom().randrange(GRAINE_MAX)
+
+
+def creer_execution(level, algorithm, seed=None, incremental=False):
+    """Vérifie l'algorithme, fixe la graine et enregistre l'exécution en file d'attente."""
+    if algorithm not in ALGORITHMES:
+        raise AlgorithmeInconnu(f"Algorithme inconnu : {algorithm}")
+    # La réaffectation incrémentale a besoin de `restreindre_donnees` (sous-problème sur les places restantes)
+    if incremental and not hasattr(MOTEURS[algorithm], "restreindre_donnees"):
+        raise AlgorithmeInconnu(f"Mode incrémental indisponible pour {algorithm}")
+    if seed is None:
+        seed = nouvelle_graine()
+    return AssignmentRun.objects.create(level=level, algorithm=algorithm, seed=seed, incremental=incremental)
+
+
+def _avancer(run, **champs):
+    for champ, valeur in champs.items():
+        setattr(run, champ, valeur)
+    AssignmentRun.objects.filter(id=run.id).update(**champs)
+
+
+# Avancement (%) d'une exécution après chaque étape signalée par le moteur ;
+# 100 une fois les affectations écrites
+AVANCEMENT = {
+    "demarrage": 10,
+    "donnees": 40,
+    "calcul": 70,
+}
+
+
+def executer(run):
+    """
+    Exécute le moteur d'une exécution enregistrée et met à jour son état,
+    son avancement, ses durées et son résultat au fil de l'eau. Les moteurs
+    n'ouvrent leur transaction que pour l'écriture : chaque étape (données
+    chargées, affectations calculées, écriture faite) est visible pendant le calcul.
+    """
+    _avancer(run, status='running', progress=AVANCEMENT["demarrage"], started_at=timezone.now())
+    debut = time.perf_counter()
+
+    def progression(etape):
+        _avancer(run, progress=AVANCEMENT[etape])
+
+    try:
+        if run.incremental:
+            result = reaffectation.reaffecter(
+                run.level, MOTEURS[run.algorithm], SATISFACTION[run.algorithm],
+                seed=run.seed, progression=progression,
+            )
+        else:
+            result = ALGORITHMES[run.algorithm](level=run.level, seed=run.seed, progression=progression)
+    except Exception as e:
+        _avancer(run, status='failed', error=str(e), finished_at=timezone.now())
+        raise
+
+    fin = timezone.now()
+    result["run_id"] = run.id
+    _avancer(
+        run,
+        status='done',
+        progress=100,
+        details=result,
+        finished_at=fin,
+        timings={
+            "attente": round((run.started_at - run.created_at).total_seconds(), 4),
+            "calcul": round(time.perf_counter() - debut, 4),
+            "total": round((fin - run.created_at).total_seconds(), 4),
+        },
+    )
+    return result
+
+
+def lancer_affectation(level, algorithm, seed=None, incremental=False):
+    """
+    Exécute le moteur choisi de façon synchrone avec une graine explicite et
+    enregistre l'exécution (graine comprise) pour pouvoir la rejouer à l'identique.
+    """
+    return executer(creer_execution(level, algorithm, seed=seed, incremental=incremental))
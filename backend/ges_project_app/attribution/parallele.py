@@ -0,0 +1,84 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from ges_project_app.models import AssignmentRun, LEVEL_CHOICES
+from ges_project_app.attribution.moteurs import MOTEURS, SATISFACTION, AlgorithmeInconnu, nouvelle_graine
+from ges_project_app.attribution.satisfaction import lire_satisfaction, methode_de
+from ges_project_app.attribution.persistance import enregistrer_affectations
+
+
+def _calculer_niveau(algorithm, donnees, seed):
+    """Exécuté dans un processus du pool : uniquement des données simples, aucun accès à l'ORM."""
+    debut = time.perf_counter()
+    affectations = MOTEURS[algorithm].calculer_affectations(donnees, seed=seed)
+    return affectations, time.perf_counter() - debut
+
+
+def affecter_tous_niveaux(algorithm, seed=None, levels=None, max_workers=None):
+    """
+    Lance l'affectation de tous les niveaux en parallèle.
+
+    Les données de chaque niveau sont chargées ici, calculées dans un
+    ProcessPoolExecutor (un problème indépendant par niveau), puis tous les
+    résultats sont écrits dans une seule transaction.
+    """
+    if algorithm not in MOTEURS:
+        raise AlgorithmeInconnu(f"Algorithme inconnu : {algorithm}")
+    if seed is None:
+        seed = nouvelle_graine()
+    levels = levels or [code for code, _ in LEVEL_CHOICES]
+    moteur = MOTEURS[algorithm]
+    debut_total = time.perf_counter()
+    demarrage = timezone.now()
+
+    # 1. Chargement (ORM) dans le processus courant
+    timings = {level: {} for level in levels}
+    donnees = {}
+    for level in levels:
+        debut = time.perf_counter()
+        donnees[level] = moteur.charger_donnees(level)
+        timings[level]["chargement"] = time.perf_counter() - debut
+
+    # 2. Calcul en parallèle, un niveau par processus.
+    # `django.setup` en initialiseur rend les modules des moteurs importables
+    # quel que soit le mode de démarrage des processus (fork ou spawn).
+    max_workers = max_workers or getattr(settings, "ASSIGNMENT_PROCESS_WORKERS", None) or len(levels)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=django.setup) as pool:
+        futures = {level: pool.submit(_calculer_niveau, algorithm, donnees[level], seed) for level in levels}
+        affectations = {}
+        for level, future in futures.items():
+            affectations[level], timings[level]["calcul"] = future.result()
+
+    # 3. Écriture de tous les niveaux dans une seule transaction
+    details = {}
+    with transaction.atomic():
+        for level in levels:
+            debut = time.perf_counter()
+            persistance = enregistrer_affectations(level, affectations[level])
+            satisfaction_pourcentage = lire_satisfaction(level, methode_de(SATISFACTION[algorithm]))
+            timings[level]["ecriture"] = time.perf_counter() - debut
+            timings[level]["total"] = sum(timings[level].values())
+            timings[level] = {phase: round(duree, 4) for phase, duree in timings[level].items()}
+
+            details[level] = {
+                "assignments_count": len(affectations[level]),
+                "satisfaction (%)": round(satisfaction_pourcentage, 2),
+                "persistance": persistance,
+                "timings": timings[level],
+            }
+            run = AssignmentRun.objects.create(
+                level=level, algorithm=algorithm, seed=seed, status='done', progress=100,
+                details=details[level], timings=timings[level],
+                started_at=demarrage, finished_at=timezone.now(),
+            )
+            details[level]["run_id"] = run.id
+
+    return {
+        "message": f"Affectation terminée pour {len(levels)} niveaux.",
+        "seed": seed,
+        "levels": details,
+        "total_time": round(time.perf_counter() - debut_total, 4),
+    }
@@ -0,0 +1,86 @@
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from ges_project_app.models import ProjectAssignment
+
+TAILLE_LOT_PAR_DEFAUT = 500
+
+
+def _chrono(timings, phase, debut):
+    timings[phase] = round(time.perf_counter() - debut, 4)
+    return time.perf_counter()
+
+
+def enregistrer_affectations(level, affectations, batch_size=None, reinitialiser_statut=True):
+    """
+    Enregistre le résultat d'une affectation ({student_id: project_id}) pour un niveau.
+
+    Au lieu de tout supprimer puis de recréer une ligne par étudiant, on calcule la
+    différence avec les affectations existantes et on applique uniquement les
+    suppressions, mises à jour et créations nécessaires, par lots de `batch_size`.
+    Avec `reinitialiser_statut=False`, une affectation inchangée garde son statut
+    (par exemple « approved ») au lieu de repasser à « pending ».
+    """
+    batch_size = batch_size or getattr(settings, "ASSIGNMENT_BATCH_SIZE", TAILLE_LOT_PAR_DEFAUT)
+    timings = {}
+    debut = time.perf_counter()
+
+    existantes = defaultdict(list)
+    # Comme avant la réécriture : les affectations d'étudiants d'un autre niveau ne sont pas touchées
+    lignes_niveau = ProjectAssignment.objects.filter(project__level=level, student__level=level)
+    for a in lignes_niveau.only("id", "student_id", "project_id", "status"):
+        existantes[a.student_id].append(a)
+
+    a_supprimer, a_modifier, a_creer = [], [], []
+    maintenant = timezone.now()
+
+    for student_id, lignes in existantes.items():
+        projet_id = affectations.get(student_id)
+        conservee = None
+        if projet_id is not None:
+            # On garde de préférence la ligne qui pointe déjà vers le bon projet
+            conservee = next((a for a in lignes if a.project_id == projet_id), lignes[0])
+        a_supprimer.extend(a.id for a in lignes if a is not conservee)
+
+        if conservee is not None and (
+            conservee.project_id != projet_id or (reinitialiser_statut and conservee.status != 'pending')
+        ):
+            conservee.project_id = projet_id
+            conservee.status = 'pending'
+            conservee.assignment_date = maintenant
+            a_modifier.append(conservee)
+
+    for student_id, projet_id in affectations.items():
+        if student_id not in existantes:
+            a_creer.append(ProjectAssignment(student_id=student_id, project_id=projet_id, status='pending'))
+    debut = _chrono(timings, "diff", debut)
+
+    # Import local : les modules de score importent eux-mêmes ce module
+    from ges_project_app.attribution.satisfaction import suspendre_suivi, reconstruire_ou_invalider
+
+    with transaction.atomic(), suspendre_suivi():
+        # Les suppressions passent en premier pour libérer les couples (student, project) uniques
+        for i in range(0, len(a_supprimer), batch_size):
+            ProjectAssignment.objects.filter(id__in=a_supprimer[i:i + batch_size]).delete()
+        debut = _chrono(timings, "suppression", debut)
+
+        ProjectAssignment.objects.bulk_update(a_modifier, ["project", "status", "assignment_date"], batch_size=batch_size)
+        debut = _chrono(timings, "mise_a_jour", debut)
+
+        ProjectAssignment.objects.bulk_create(a_creer, batch_size=batch_size)
+        debut = _chrono(timings, "creation", debut)
+
+        # Les écritures en masse ne passent pas par les signaux : agrégat de satisfaction recalculé en une fois
+        # (invalidé si un barème rejette un vœu, sans faire échouer l'écriture)
+        reconstruire_ou_invalider(level)
+        _chrono(timings, "satisfaction", debut)
+
+    return {
+        "created": len(a_creer),
+        "updated": len(a_modifier),
+        "deleted": len(a_supprimer),
+        "unchanged": sum(len(lignes) for lignes in existantes.values()) - len(a_modifier) - len(a_supprimer),
+        "timings": timings,
+    }
@@ -0,0 +1,159 @@
+import itertools
+import sys
+import time
+import numpy as np
+from ges_project_app import parametres_niveau
+from ges_project_app.models import Project, Team, Voeux
+
+TAILLE_LOT = 2000
+
+
+class Equipe:
+    """Équipe du problème : identifiant en base, indice dense de son projet et capacité."""
+    __slots__ = ("id", "projet", "capacite")
+
+    def __init__(self, id, projet, capacite):
+        self.id = id
+        self.projet = projet
+        self.capacite = capacite
+
+
+class MatchingProblem:
+    """
+    Problème d'affectation d'un niveau, partagé par les moteurs.
+
+    Étudiants (ceux qui ont au moins un vœu), projets et équipes sont numérotés de 0
+    à n - 1 ; `etudiant_ids`, `projet_ids` et `Equipe.id` redonnent les identifiants
+    en base. Les vœux sont au format CSR : ceux de l'étudiant i occupent les positions
+    `debut[i]:debut[i + 1]` de `voeux_projet`, `voeux_rang` et `voeux_note`, triés
+    par rang. `statistiques` garde la durée du chargement et la mémoire occupée.
+    """
+    __slots__ = (
+        "level", "max_choice", "etudiant_ids", "projet_ids", "prioritaires", "equipes",
+        "debut", "voeux_projet", "voeux_rang", "voeux_note", "statistiques",
+    )
+
+    def __init__(self, level, max_choice, etudiant_ids, projet_ids, prioritaires, equipes,
+                 debut, voeux_projet, voeux_rang, voeux_note, duree_chargement=0.0):
+        self.level = level
+        self.max_choice = max_choice
+        self.etudiant_ids = etudiant_ids
+        self.projet_ids = projet_ids
+        self.prioritaires = prioritaires
+        self.equipes = equipes
+        self.debut = debut
+        self.voeux_projet = voeux_projet
+        self.voeux_rang = voeux_rang
+        self.voeux_note = voeux_note
+        self.statistiques = {
+            "etudiants": len(etudiant_ids),
+            "projets": len(projet_ids),
+            "equipes": len(equipes),
+            "voeux": len(voeux_projet),
+            "chargement_s": round(duree_chargement, 4),
+            "memoire_octets": self.memoire(),
+        }
+
+    def memoire(self):
+        """Octets occupés par les tableaux et les enregistrements des équipes."""
+        tableaux = (self.etudiant_ids, self.projet_ids, self.prioritaires, self.debut,
+                    self.voeux_projet, self.voeux_rang, self.voeux_note)
+        return (
+            sum(t.nbytes for t in tableaux)
+            + sys.getsizeof(self.equipes) + sum(sys.getsizeof(e) for e in self.equipes)
+        )
+
+    def voeux_par_etudiant(self, calculer_score):
+        """Vœux de chaque étudiant, par indice : [[(projet, rang, score), ...], ...] triés par rang."""
+        projets, rangs, notes = self.voeux_projet.tolist(), self.voeux_rang.tolist(), self.voeux_note.tolist()
+        scores = [calculer_score(r, n, max_choice=self.max_choice) for r, n in zip(rangs, notes)]
+        voeux = list(zip(projets, rangs, scores))
+        debut = self.debut.tolist()
+        return [voeux[debut[i]:debut[i + 1]] for i in range(len(self.etudiant_ids))]
+
+    def equipes_en_base(self):
+        """Équipes en identifiants de la base : [(team_id, project_id, capacité)]."""
+        projet_ids = self.projet_ids.tolist()
+        return [(e.id, projet_ids[e.projet], e.capacite) for e in self.equipes]
+
+    def projets_prioritaires_en_base(self):
+        return self.projet_ids[self.prioritaires].tolist()
+
+    def en_base(self, affectations):
+        """Convertit {indice étudiant: indice équipe} en {student_id: project_id}."""
+        etudiant_ids, projet_ids = self.etudiant_ids.tolist(), self.projet_ids.tolist()
+        return {etudiant_ids[e]: projet_ids[self.equipes[t].projet] for e, t in affectations.items()}
+
+    def restreindre(self, etudiants, places, projets_prioritaires):
+        """
+        Sous-problème de la réaffectation incrémentale : seulement les `etudiants`
+        (student_id), sur les places restantes des équipes ({team_id: places}) et
+        avec les seuls `projets_prioritaires` (project_id) donnés.
+        """
+        garde = np.isin(self.etudiant_ids, np.fromiter(etudiants, dtype=np.int64))
+        n_voeux = np.diff(self.debut)
+        selection = np.repeat(garde, n_voeux)
+        prioritaires = np.isin(self.projet_ids[self.prioritaires], np.fromiter(projets_prioritaires, dtype=np.int64))
+        return MatchingProblem(
+            self.level, self.max_choice,
+            self.etudiant_ids[garde],
+            self.projet_ids,
+            self.prioritaires[prioritaires],
+            [Equipe(e.id, e.projet, places.get(e.id, 0)) for e in self.equipes],
+            np.concatenate(([0], np.cumsum(n_voeux[garde]))).astype(np.int64),
+            self.voeux_projet[selection],
+            self.voeux_rang[selection],
+            self.voeux_note[selection],
+        )
+
+
+def _tableau(requete, colonnes, taille_lot=TAILLE_LOT):
+    """Résultat d'un values_list d'entiers en tableau NumPy (n, colonnes), sans liste de tuples intermédiaire."""
+    valeurs = itertools.chain.from_iterable(requete.iterator(chunk_size=taille_lot))
+    return np.fromiter(valeurs, dtype=np.int64).reshape(-1, colonnes)
+
+
+def charger(level):
+    """
+    Construit le MatchingProblem d'un niveau en trois requêtes values_list
+    (vœux, projets, équipes) ; aucun objet du modèle n'est instancié.
+    """
+    debut_chargement = time.perf_counter()
+    max_choice = parametres_niveau.max_choice(level)
+
+    voeux = _tableau(
+        Voeux.objects.filter(student__level=level, project__level=level).order_by()
+        .values_list("student_id", "project_id", "rank", "note_preference"),
+        4,
+    )
+    projets = _tableau(Project.objects.filter(level=level).order_by("id").values_list("id", "priority"), 2)
+    equipes = _tableau(
+        Team.objects.filter(project__level=level).order_by("id").values_list("id", "project_id", "max_students"), 3
+    )
+
+    projet_ids = projets[:, 0]
+    etudiant_ids, idx_etudiant = np.unique(voeux[:, 0], return_inverse=True)
+    idx_projet = np.searchsorted(projet_ids, voeux[:, 1])
+
+    # CSR : vœux triés par étudiant puis par rang
+    ordre = np.lexsort((voeux[:, 2], idx_etudiant))
+    debut = np.zeros(len(etudiant_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(idx_etudiant, minlength=len(etudiant_ids)), out=debut[1:])
+
+    return MatchingProblem(
+        level, max_choice,
+        etudiant_ids,
+        projet_ids,
+        np.flatnonzero(projets[:, 1]).astype(np.int32),
+        [
+            Equipe(equipe, projet, capacite)
+            for equipe, projet, capacite in zip(
+                equipes[:, 0].tolist(), np.searchsorted(projet_ids, equipes[:, 1]).tolist(), equipes[:, 2].tolist()
+            )
+        ],
+        debut,
+        idx_projet[ordre].astype(np.int32),
+        voeux[ordre, 2].astype(np.int32),
+        voeux[ordre, 3].astype(np.int32),
+        duree_chargement=time.perf_counter() - debut_chargement,
+    )
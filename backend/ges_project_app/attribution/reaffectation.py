@@ -0,0 +1,137 @@
+import time
+from collections import defaultdict
+from django.db import transaction
+from ges_project_app import parametres_niveau
+from ges_project_app.models import AssignmentRun, ChangeRequest, ProjectAssignment, Voeux
+from ges_project_app.attribution import satisfaction
+from ges_project_app.attribution.persistance import enregistrer_affectations
+
+
+def selectionner(existantes, voeux, modifies, capacites, proteges):
+    """
+    Sépare les affectations existantes en affectations conservées et étudiants à replacer.
+
+    - `existantes` : [(student_id, project_id)]
+    - `voeux` : {student_id: {project_id: score}}
+    - `modifies` : étudiants dont les vœux ont changé depuis la dernière affectation
+    - `capacites` : {project_id: places} pour les projets (encore existants) du niveau
+    - `proteges` : couples (student_id, project_id) issus d'une demande de changement approuvée
+
+    Une affectation est conservée si son projet existe toujours et si les vœux de
+    l'étudiant n'ont pas changé et le contiennent encore (un étudiant sans vœu garde
+    son affectation), ou si elle provient d'une demande approuvée. Quand un
+    projet a perdu des places, les scores les plus faibles en sortent, les affectations
+    protégées en dernier. Sont à replacer tous les étudiants ayant des vœux et aucune
+    affectation conservée.
+
+    Renvoie ({student_id: project_id} conservées, étudiants à replacer).
+    """
+    conservees = {}
+    occupants = defaultdict(list)
+    for student_id, project_id in existantes:
+        if student_id in conservees or project_id not in capacites:
+            continue
+        protege = (student_id, project_id) in proteges
+        voeux_etudiant = voeux.get(student_id)
+        # Vœux modifiés, ou projet retiré des vœux (suppression d'un seul vœu)
+        if not protege and (student_id in modifies or (voeux_etudiant and project_id not in voeux_etudiant)):
+            continue
+        conservees[student_id] = project_id
+        occupants[project_id].append((protege, (voeux_etudiant or {}).get(project_id, 0), student_id))
+
+    for project_id, liste in occupants.items():
+        surplus = len(liste) - capacites[project_id]
+        if surplus > 0:
+            liste.sort()  # Non protégés d'abord, puis par score croissant
+            for _, _, student_id in liste[:surplus]:
+                del conservees[student_id]
+
+    return conservees, set(voeux) - set(conservees)
+
+
+def places_restantes(equipes, conservees):
+    """
+    Places libres de chaque équipe ({team_id: places}) une fois les affectations
+    conservées réparties dans les équipes de leur projet, dans l'ordre des équipes.
+    """
+    occupes = defaultdict(int)
+    for project_id in conservees.values():
+        occupes[project_id] += 1
+
+    places = {}
+    for equipe, projet, max_students in sorted(equipes):
+        pris = min(occupes[projet], max_students)
+        occupes[projet] -= pris
+        places[equipe] = max_students - pris
+    return places
+
+
+def reaffecter(level, moteur, bareme, seed=None, progression=None):
+    """
+    Réaffectation incrémentale d'un niveau : les affectations encore valides sont
+    gardées (statut compris) et seul le sous-problème des étudiants à replacer
+    (vœux modifiés depuis la dernière exécution réussie, projet supprimé ou équipe
+    réduite, nouveaux étudiants) est calculé par `moteur` sur les places restantes.
+    Seule la différence est écrite, en transaction ; `progression` comme pour les moteurs.
+    """
+    debut = time.perf_counter()
+    donnees = moteur.charger_donnees(level)
+    depuis = (
+        AssignmentRun.objects.filter(level=level, status="done")
+        .order_by("-started_at").values_list("started_at", flat=True).first()
+    )
+
+    max_choice = parametres_niveau.max_choice(level)
+    voeux, modifies = defaultdict(dict), set()
+    for student_id, project_id, rank, note, updated_at in Voeux.objects.filter(
+        student__level=level, project__level=level
+    ).values_list("student_id", "project_id", "rank", "note_preference", "updated_at"):
+        voeux[student_id][project_id] = bareme.calculer_score(rank, note, max_choice=max_choice)
+        if depuis is None or updated_at > depuis:
+            modifies.add(student_id)
+
+    existantes = ProjectAssignment.objects.filter(project__level=level, student__level=level).order_by("id")
+    proteges = set()
+    for student_id, projet, projet_equipe in ChangeRequest.objects.filter(
+        status="approved", student__level=level
+    ).values_list("student_id", "desired_project_id", "desired_team__project_id"):
+        proteges.update((student_id, p) for p in (projet, projet_equipe) if p is not None)
+
+    equipes = donnees.equipes_en_base()
+    capacites = defaultdict(int)
+    for _, projet, max_students in equipes:
+        capacites[projet] += max_students
+
+    conservees, a_replacer = selectionner(
+        existantes.values_list("student_id", "project_id"), voeux, modifies, capacites, proteges
+    )
+    if progression:
+        progression("donnees")
+
+    # Phase prioritaire uniquement pour les projets prioritaires restés vides
+    prioritaires_vides = set(donnees.projets_prioritaires_en_base()) - set(conservees.values())
+    sous_probleme = moteur.restreindre_donnees(
+        donnees, a_replacer, places_restantes(equipes, conservees), prioritaires_vides
+    )
+    affectations = {**conservees, **moteur.calculer_affectations(sous_probleme, seed=seed)}
+    if progression:
+        progression("calcul")
+
+    with transaction.atomic():
+        persistance = enregistrer_affectations(level, affectations, reinitialiser_statut=False)
+        satisfaction_pourcentage = satisfaction.lire_satisfaction(level, satisfaction.methode_de(bareme))
+
+    return {
+        "message": (
+            f"Réaffectation incrémentale (niveau {level}) terminée : "
+            f"{len(a_replacer)} étudiants replacés, {len(conservees)} affectations conservées."
+        ),
+        "mode": "incremental",
+        "assignments_count": len(affectations),
+        "students_touched": len(a_replacer),
+        "students_kept": len(conservees),
+        "duration": round(time.perf_counter() - debut, 4),
+        "satisfaction (%)": round(satisfaction_pourcentage, 2),
+        "seed": seed,
+        "persistance": persistance,
+    }
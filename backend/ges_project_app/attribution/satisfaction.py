@@ -0,0 +1,204 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from django.db.models import F
+from ges_project_app import parametres_niveau
+from ges_project_app.models import ProjectAssignment, Project, Voeux, SatisfactionAggregate
+from ges_project_app.attribution import attribution, gale_shapley_attribution
+
+# Barèmes suivis : chacun donne son propre score de satisfaction
+METHODES = {
+    "gale_shapley": gale_shapley_attribution,
+    "attribution": attribution,
+}
+
+_etat = threading.local()
+
+
+@contextmanager
+def suspendre_suivi():
+    """
+    Désactive la mise à jour ligne par ligne (signaux) pendant une écriture en
+    masse ; l'appelant reconstruit ensuite l'agrégat du niveau en une fois.
+    """
+    _etat.suspendu = getattr(_etat, "suspendu", 0) + 1
+    try:
+        yield
+    finally:
+        _etat.suspendu -= 1
+
+
+def suivi_suspendu():
+    return getattr(_etat, "suspendu", 0) > 0
+
+
+def calculer_totaux(level, methodes=METHODES):
+    """Recalcule entièrement les totaux de chaque barème d'un niveau : {methode: (total, max, count)}."""
+    max_choice = parametres_niveau.max_choice(level)
+    affectations = list(ProjectAssignment.objects.filter(project__level=level).values_list("student_id", "project_id"))
+    voeux = Voeux.objects.filter(student__level=level, project__level=level).values_list(
+        "student_id", "project_id", "rank", "note_preference"
+    )
+    pref_dict = {(student_id, project_id): (rank, note) for student_id, project_id, rank, note in voeux}
+
+    totaux = {}
+    for methode in methodes:
+        module = METHODES[methode]
+        total = sum(
+            module.calculer_score(*pref_dict[cle], max_choice=max_choice)
+            for cle in affectations if cle in pref_dict
+        )
+        totaux[methode] = (total, len(affectations) * module.score_maximal(max_choice), len(affectations))
+    return totaux
+
+
+def reconstruire(level):
+    """Reconstruit l'agrégat d'un niveau à partir de zéro."""
+    totaux = calculer_totaux(level)
+    # Une seule requête (INSERT ... ON CONFLICT DO UPDATE) pour tous les barèmes
+    SatisfactionAggregate.objects.bulk_create(
+        [
+            SatisfactionAggregate(level=level, methode=methode, total_score=total, max_score=maximum, count=count)
+            for methode, (total, maximum, count) in totaux.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["level", "methode"],
+        update_fields=["total_score", "max_score", "count", "updated_at"],
+    )
+    return totaux
+
+
+def lire_satisfaction(level, methode):
+    """Satisfaction (%) d'un niveau pour un barème : une seule ligne lue."""
+    agregat = SatisfactionAggregate.objects.filter(level=level, methode=methode).first()
+    if agregat is None:
+        try:
+            reconstruire(level)
+        except ValueError:
+            # Un autre barème rejette un vœu (rang au-delà d'un max_choice abaissé) : pas
+            # d'agrégat, calcul direct du seul barème demandé
+            total, maximum, count = calculer_totaux(level, [methode])[methode]
+            return SatisfactionAggregate(total_score=total, max_score=maximum, count=count).pourcentage
+        agregat = SatisfactionAggregate.objects.get(level=level, methode=methode)
+    return agregat.pourcentage
+
+
+def methode_de(module):
+    """Nom du barème correspondant à un module de moteur."""
+    return next(methode for methode, m in METHODES.items() if m is module)
+
+
+# -----------------------
+# Mises à jour incrémentales (appelées par les signaux)
+# -----------------------
+
+def contribution(student_id, project_id):
+    """
+    Niveau dont l'agrégat compte l'affectation (student_id, project_id), et
+    (rang, note) du vœu correspondant, ou None si le projet n'a pas été demandé.
+    """
+    level = Project.objects.filter(id=project_id).values_list("level", flat=True).first()
+    rank_note = Voeux.objects.filter(
+        student_id=student_id, project_id=project_id, student__level=level
+    ).values_list("rank", "note_preference").first()
+    return level, rank_note
+
+
+def appliquer(level, retirees=(), ajoutees=()):
+    """
+    Retire puis ajoute des contributions (rang, note) ou None (0 point) à
+    l'agrégat d'un niveau, par une mise à jour F() par barème.
+    Sans agrégat existant, rien à faire : il sera reconstruit à la première lecture.
+    """
+    if suivi_suspendu() or level is None or (not retirees and not ajoutees):
+        return
+    agregats = SatisfactionAggregate.objects.filter(level=level)
+    if not agregats.exists():
+        return
+
+    max_choice = parametres_niveau.max_choice(level)
+    delta_count = len(ajoutees) - len(retirees)
+    try:
+        for methode, module in METHODES.items():
+            def score(rank_note):
+                return module.calculer_score(*rank_note, max_choice=max_choice) if rank_note else 0
+
+            agregats.filter(methode=methode).update(
+                total_score=F("total_score") + sum(map(score, ajoutees)) - sum(map(score, retirees)),
+                max_score=F("max_score") + delta_count * module.score_maximal(max_choice),
+                count=F("count") + delta_count,
+            )
+    except ValueError:
+        # Vœu hors barème : l'erreur remontera à la reconstruction, lors de la prochaine lecture
+        agregats.delete()
+
+
+def supprimer(lignes, suppression):
+    """
+    Suppression d'affectations ou de vœux (`lignes`, queryset) : `suppression()` fait
+    la suppression réelle, sans signal par ligne, et les contributions des lignes
+    supprimées sont retirées de l'agrégat ensuite (deux lectures, puis une mise à jour
+    par niveau et par barème). Appelé par SuiviSatisfactionQuerySet.delete().
+    """
+    if suivi_suspendu():
+        return suppression()
+    deltas = _deltas_affectations(lignes) if lignes.model is ProjectAssignment else _deltas_voeux(lignes)
+    with suspendre_suivi():
+        resultat = suppression()
+    for level, (retirees, ajoutees) in deltas.items():
+        appliquer(level, retirees, ajoutees)
+    return resultat
+
+
+def _deltas_affectations(lignes):
+    """Chaque affectation supprimée retire sa contribution (celle de son vœu, ou 0 point)."""
+    affectations = list(lignes.values_list("student_id", "project_id", "project__level"))
+    if not affectations:
+        return {}
+    voeux = {
+        (student_id, project_id): (rank, note)
+        for student_id, project_id, rank, note in Voeux.objects.filter(
+            student_id__in=lignes.values("student_id"),
+            project_id__in=lignes.values("project_id"),
+            student__level=F("project__level"),
+        ).order_by().values_list("student_id", "project_id", "rank", "note_preference")
+    }
+    deltas = defaultdict(lambda: ([], []))
+    for student_id, project_id, level in affectations:
+        deltas[level][0].append(voeux.get((student_id, project_id)))
+    return deltas
+
+
+def _deltas_voeux(lignes):
+    """Un vœu supprimé ne compte que pour un couple affecté, qui passe à 0 point."""
+    voeux = list(
+        lignes.filter(student__level=F("project__level")).order_by()
+        .values_list("student_id", "project_id", "rank", "note_preference", "project__level")
+    )
+    if not voeux:
+        return {}
+    affectees = set(ProjectAssignment.objects.filter(
+        student_id__in=lignes.values("student_id"), project_id__in=lignes.values("project_id")
+    ).values_list("student_id", "project_id"))
+    deltas = defaultdict(lambda: ([], []))
+    for student_id, project_id, rank, note, level in voeux:
+        if (student_id, project_id) in affectees:
+            deltas[level][0].append((rank, note))
+            deltas[level][1].append(None)
+    return deltas
+
+
+def invalider(*levels):
+    """Supprime l'agrégat des niveaux donnés (de tous, sans argument) : reconstruit à la prochaine lecture."""
+    agregats = SatisfactionAggregate.objects.all()
+    if levels:
+        agregats = agregats.filter(level__in=levels)
+    agregats.delete()
+
+
+def reconstruire_ou_invalider(level):
+    """Reconstruction après un changement de barème (Deadline) ; invalide l'agrégat si le barème est incohérent."""
+    try:
+        reconstruire(level)
+    except ValueError:
+        invalider(level)
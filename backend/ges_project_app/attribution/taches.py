@@ -0,0 +1,49 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from ges_project_app.models import AssignmentRun
+from ges_project_app.attribution.moteurs import creer_execution, executer
+
+logger = logging.getLogger(__name__)
+
+_executeur = None
+
+
+def _get_executeur():
+    global _executeur
+    if _executeur is None:
+        _executeur = ThreadPoolExecutor(
+            max_workers=getattr(settings, "ASSIGNMENT_JOB_WORKERS", 2),
+            thread_name_prefix="affectation",
+        )
+    return _executeur
+
+
+def _executer_en_arriere_plan(run_id):
+    close_old_connections()
+    try:
+        executer(AssignmentRun.objects.get(id=run_id))
+    except Exception:
+        logger.exception("Échec de la tâche d'affectation %s", run_id)
+    finally:
+        close_old_connections()
+
+
+def soumettre_affectation(level, algorithm, seed=None, incremental=False):
+    """
+    Enregistre une tâche d'affectation et la confie au pool de threads local.
+    Avec ASSIGNMENT_JOBS_EAGER = True (tests, développement), elle est exécutée
+    immédiatement dans le thread appelant : aucun broker externe n'est nécessaire.
+    """
+    run = creer_execution(level, algorithm, seed=seed, incremental=incremental)
+
+    if getattr(settings, "ASSIGNMENT_JOBS_EAGER", False):
+        try:
+            executer(run)
+        except Exception:
+            logger.exception("Échec de la tâche d'affectation %s", run.id)
+    else:
+        # La tâche ne doit démarrer qu'une fois l'exécution visible par les autres connexions
+        transaction.on_commit(lambda: _get_executeur().submit(_executer_en_arriere_plan, run.id))
+    return run
@@ -0,0 +1,143 @@
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import django
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from ges_project_app import parametres_niveau
+from ges_project_app.models import LEVEL_CHOICES, Student
+from ges_project_app.attribution import cohortes, satisfaction
+from ges_project_app.attribution.moteurs import ALGORITHMES, SATISFACTION
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark des moteurs d'affectation sur des cohortes synthétiques (popularité de Zipf) : "
+        "temps, mémoire de pointe, requêtes et satisfaction, écrits en JSON. "
+        "Tout est fait dans une transaction annulée à la fin : la base n'est pas modifiée."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--etudiants", nargs="+", type=int, default=[1000, 5000],
+                            help="Tailles de cohorte à tester.")
+        parser.add_argument("--projets", type=int, help="Nombre de projets (par défaut : un pour 10 étudiants).")
+        parser.add_argument("--equipes", type=int, default=2, help="Équipes par projet.")
+        parser.add_argument("--voeux", type=int, default=5, help="Vœux par étudiant.")
+        parser.add_argument("--zipf", type=float, default=1.0,
+                            help="Exposant de Zipf de la popularité des projets (0 : uniforme).")
+        parser.add_argument("--ratio-places", type=float, default=1.1, help="Places disponibles / étudiants.")
+        parser.add_argument("--algorithmes", nargs="+", choices=sorted(ALGORITHMES), default=sorted(ALGORITHMES))
+        parser.add_argument("--level", choices=[code for code, _ in LEVEL_CHOICES], default="L2",
+                            help="Niveau utilisé pour la cohorte (il doit être vide).")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--sans-memoire", action="store_true",
+                            help="Ne mesure pas la mémoire de pointe (évite la seconde exécution sous tracemalloc).")
+        parser.add_argument("--sortie", help="Fichier JSON de résultats (par défaut : sortie standard).")
+
+    def mesurer(self, algorithme, level, seed, memoire):
+        """
+        Exécute un moteur et mesure sa durée et ses requêtes. tracemalloc ralentit
+        fortement le code Python : la mémoire de pointe est mesurée par une seconde
+        exécution, pour ne pas fausser la durée. Chaque exécution est annulée
+        ensuite : toutes partent de la cohorte telle que générée, sans affectation.
+        """
+        methode = satisfaction.methode_de(SATISFACTION[algorithme])
+        sid = transaction.savepoint()
+        try:
+            with CaptureQueriesContext(connection) as requetes:
+                debut = time.perf_counter()
+                resultat = ALGORITHMES[algorithme](level=level, seed=seed)
+                duree = time.perf_counter() - debut
+            satisfaction_pourcentage = satisfaction.lire_satisfaction(level, methode)
+        finally:
+            transaction.savepoint_rollback(sid)
+
+        pic = None
+        if memoire:
+            sid = transaction.savepoint()
+            tracemalloc.start()
+            try:
+                ALGORITHMES[algorithme](level=level, seed=seed)
+                pic = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+                transaction.savepoint_rollback(sid)
+
+        return {
+            "algorithme": algorithme,
+            "temps_s": round(duree, 4),
+            "memoire_pic_mo": round(pic / 2 ** 20, 2) if pic is not None else None,
+            "requetes": len(requetes.captured_queries),
+            "affectes": resultat.get("assignments_count"),
+            "ecritures": {
+                cle: resultat["persistance"][cle] for cle in ("created", "updated", "deleted", "unchanged")
+            },
+            "satisfaction": round(satisfaction_pourcentage, 2),
+            # Durée de chargement et mémoire du MatchingProblem (algo1 et algo2)
+            "probleme": resultat.get("probleme"),
+        }
+
+    def handle(self, *args, **options):
+        level = options["level"]
+        if Student.objects.filter(level=level).exists():
+            raise CommandError(f"Le niveau {level} contient déjà des étudiants : choisir un niveau vide avec --level.")
+        if cohortes.codes_en_conflit("bench", [level]).exists():
+            raise CommandError(f"Des codes de projet « {cohortes.prefixe_code('bench')}{level}… » existent déjà.")
+
+        resultats = []
+        try:
+            with transaction.atomic():
+                for n in options["etudiants"]:
+                    n_projets = options["projets"] or max(n // 10, options["voeux"])
+                    sid = transaction.savepoint()
+                    debut = time.perf_counter()
+                    cohorte = cohortes.generer_cohorte(
+                        level, n, n_projets, equipes_par_projet=options["equipes"], n_voeux=options["voeux"],
+                        zipf=options["zipf"], seed=options["seed"], ratio_places=options["ratio_places"], prefixe="bench",
+                    )
+                    generation = time.perf_counter() - debut
+
+                    for algorithme in options["algorithmes"]:
+                        # Chaque moteur part du même niveau sans affectation (savepoints dans mesurer)
+                        mesure = self.mesurer(algorithme, level, options["seed"], not options["sans_memoire"])
+                        mesure.update(cohorte, generation_s=round(generation, 4))
+                        resultats.append(mesure)
+                        if options["sortie"]:  # sinon, la sortie standard est réservée au JSON
+                            self.stdout.write(
+                                f"{n:>7} étudiants  {algorithme:<6} {mesure['temps_s']:>9.4f} s  "
+                                f"{mesure['requetes']:>4} requêtes  satisfaction {mesure['satisfaction']:>6.2f} %"
+                            )
+                    # Cohorte suivante sur un niveau vide
+                    transaction.savepoint_rollback(sid)
+                transaction.set_rollback(True)
+        finally:
+            # L'annulation ne passe pas par les signaux de Deadline : le cache doit être vidé ici
+            parametres_niveau.invalider(level)
+
+        rapport = {
+            "date": timezone.now().isoformat(),
+            "parametres": {
+                cle: options[cle]
+                for cle in ("etudiants", "projets", "equipes", "voeux", "zipf", "ratio_places", "algorithmes", "seed")
+            },
+            "environnement": {
+                "python": sys.version.split()[0],
+                "django": django.get_version(),
+                "numpy": np.__version__,
+                "base": connection.vendor,
+                "machine": platform.machine(),
+            },
+            "resultats": resultats,
+        }
+        contenu = json.dumps(rapport, ensure_ascii=False, indent=2)
+        if options["sortie"]:
+            with open(options["sortie"], "w", encoding="utf-8") as fichier:
+                fichier.write(contenu)
+            self.stdout.write(self.style.SUCCESS(f"Résultats écrits dans {options['sortie']}."))
+        else:
+            self.stdout.write(contenu)
@@ -0,0 +1,48 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from ges_project_app.attribution.echanges import detecter_cycles, solder
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark de la détection des cycles d'échange et du clearing des demandes "
+        "sur des demandes synthétiques (sans base de données)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tailles", nargs="+", type=int, default=[1000, 10000, 100000],
+                            help="Nombres de demandes en attente à tester.")
+        parser.add_argument("--demandes-par-equipe", type=float, default=5,
+                            help="Nombre moyen de demandes au départ de chaque équipe.")
+        parser.add_argument("--repetitions", type=int, default=3, help="Nombre d'exécutions par taille (on garde la meilleure).")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+
+        self.stdout.write(
+            f"{'demandes':>10} {'équipes':>8} {'cycles (s)':>10} {'µs/demande':>11} {'cycles':>7} {'servies':>8}"
+            f" {'clearing (s)':>12} {'servies':>8}"
+        )
+        for n in options["tailles"]:
+            equipes = range(max(2, int(n / options["demandes_par_equipe"])))
+            # Un étudiant par demande, d'une équipe vers une autre tirée au hasard
+            demandes = [(i, i, rng.choice(equipes), rng.choice(equipes)) for i in range(n)]
+            # Équipes de 3 à 5 étudiants, la moitié avec une place libre
+            tailles = {t: (taille, 2, taille + rng.randint(0, 1)) for t in equipes for taille in [rng.randint(3, 5)]}
+
+            meilleur = float("inf")
+            for _ in range(options["repetitions"]):
+                debut = time.perf_counter()
+                cycles = detecter_cycles(demandes)
+                meilleur = min(meilleur, time.perf_counter() - debut)
+
+            debut = time.perf_counter()
+            retenues = solder(demandes, tailles)
+            clearing = time.perf_counter() - debut
+
+            self.stdout.write(
+                f"{n:>10} {len(equipes):>8} {meilleur:>10.4f} {meilleur / n * 1e6:>11.2f} "
+                f"{len(cycles):>7} {sum(map(len, cycles)):>8} {clearing:>12.4f} {len(retenues):>8}"
+            )
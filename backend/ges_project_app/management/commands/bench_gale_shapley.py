@@ -0,0 +1,45 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from ges_project_app.attribution.gale_shapley_attribution import calculer_score, gale_shapley
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark de la boucle de Gale-Shapley sur des données synthétiques (sans base de données)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tailles", nargs="+", type=int, default=[100, 1000, 5000, 20000],
+                            help="Nombres d'étudiants à tester.")
+        parser.add_argument("--voeux", type=int, default=5, help="Nombre de vœux par étudiant.")
+        parser.add_argument("--repetitions", type=int, default=3, help="Nombre d'exécutions par taille (on garde la meilleure).")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        n_voeux = options["voeux"]
+
+        self.stdout.write(f"{'étudiants':>10} {'projets':>8} {'temps (s)':>10} {'µs/étudiant':>12}")
+        for n in options["tailles"]:
+            # Un projet pour 10 étudiants, 2 équipes par projet, places pour 80 à 90 % des étudiants
+            projets = list(range(max(n // 10, n_voeux)))
+            equipes_par_projet = {p: [(p, 0), (p, 1)] for p in projets}
+            capacite = max(1, (9 * n) // (20 * len(projets)))
+            capacites = {e: capacite for equipes in equipes_par_projet.values() for e in equipes}
+            voeux_par_etudiant = {
+                etudiant: [
+                    (p, rang, calculer_score(rang, rng.randint(1, 20), max_choice=n_voeux))
+                    for rang, p in enumerate(rng.sample(projets, n_voeux), start=1)
+                ]
+                for etudiant in range(n)
+            }
+
+            meilleur = float("inf")
+            for _ in range(options["repetitions"]):
+                debut = time.perf_counter()
+                affectations = gale_shapley(voeux_par_etudiant, equipes_par_projet, dict(capacites), rng=random.Random(0))
+                meilleur = min(meilleur, time.perf_counter() - debut)
+
+            self.stdout.write(
+                f"{n:>10} {len(projets):>8} {meilleur:>10.4f} {meilleur / n * 1e6:>12.2f}"
+                f"   ({len(affectations)} affectés)"
+            )
@@ -1,91 +1,85 @@
-import random
-from faker import Faker
-from django.core.management.base import BaseCommand
+import time
 from django.contrib.auth.hashers import make_password
-from ges_project_app.models import User, Student, Project, Voeux
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from ges_project_app.models import LEVEL_CHOICES, User
+from ges_project_app.attribution import cohortes
+from ges_project_app.attribution.satisfaction import reconstruire, suspendre_suivi
 
-# Constantes pour les choix
-LEVEL_CHOICES = ['L1', 'L2', 'L3', 'M1', 'M2']  # Exemple de niveaux
-ROLE_CHOICES = ['student', 'supervisor']  # Rôles disponibles
-
-fake = Faker()
 
 class Command(BaseCommand):
-    help = "Génère des données de test pour les utilisateurs, étudiants, projets et préférences."
+    help = (
+        "Génère des données de test en masse : superviseurs, projets, équipes, étudiants et vœux, "
+        "répartis sur un ou plusieurs niveaux (insertions par lots, mot de passe haché une seule fois)."
+    )
 
-    def handle(self, *args, **kwargs):
-        self.stdout.write("Génération des données de test...")
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=50, help="Nombre total d'étudiants.")
+        parser.add_argument("--projects", type=int, default=40, help="Nombre total de projets.")
+        parser.add_argument("--teams-per-project", type=int, default=2)
+        parser.add_argument("--wishes", type=int, default=5, help="Vœux par étudiant.")
+        parser.add_argument("--levels", nargs="+", choices=[code for code, _ in LEVEL_CHOICES],
+                            default=[code for code, _ in LEVEL_CHOICES],
+                            help="Niveaux entre lesquels étudiants et projets sont répartis.")
+        parser.add_argument("--zipf", type=float, default=1.0,
+                            help="Exposant de Zipf de la popularité des projets (0 : uniforme).")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--password", default="password", help="Mot de passe commun à tous les comptes.")
+        parser.add_argument("--prefix", default="gen", help="Préfixe des noms d'utilisateur et des codes de projet.")
+        parser.add_argument("--batch-size", type=int, default=cohortes.TAILLE_LOT)
+        parser.add_argument("--reset", action="store_true",
+                            help="Supprime d'abord les données générées auparavant avec le même préfixe.")
 
-        # 1. Créer des utilisateurs (étudiants et superviseurs)
-        # users = []
-        # for _ in range(50):  # Générer 50 utilisateurs (étudiants)
-        #     user = User.objects.create(
-        #         username=fake.unique.user_name(),
-        #         email=fake.unique.email(),
-        #         password=make_password("password"),  # Mot de passe par défaut
-        #         role='student',  # Rôle étudiant
-        #     )
-        #     users.append(user)
-        # self.stdout.write(f"{len(users)} utilisateurs (étudiants) créés.")
+    def repartir(self, total, n):
+        """Découpe `total` en `n` parts égales à une unité près."""
+        return [total // n + (i < total % n) for i in range(n)]
 
-        # # 2. Créer des étudiants associés aux utilisateurs
-        studentsl = []
-        # for user in users:
-        #     student = Student.objects.create(
-        #         user=user,
-        #         level=random.choice(LEVEL_CHOICES),  # Niveau aléatoire
-        #     )
-        #     students.append(student)
-        # self.stdout.write(f"{len(students)} étudiants créés.")
+    def handle(self, *args, **options):
+        levels, prefixe = options["levels"], options["prefix"]
+        if options["projects"] < options["wishes"] * len(levels):
+            raise CommandError("Il faut au moins --wishes projets par niveau.")
 
-        # # 3. Créer des superviseurs (utilisateurs avec le rôle 'supervisor')
-        # supervisors = []
-        # for _ in range(5):  # Générer 5 superviseurs
-        #     supervisor_user = User.objects.create(
-        #         username=fake.unique.user_name(),
-        #         email=fake.unique.email(),
-        #         password=make_password("password"),  # Mot de passe par défaut
-        #         role='supervisor',  # Rôle superviseur
-        #     )
-        #     supervisors.append(supervisor_user)
-        # self.stdout.write(f"{len(supervisors)} superviseurs créés.")
+        conflits = cohortes.codes_en_conflit(prefixe, levels)
+        if conflits.exists():
+            raise CommandError(
+                f"Les codes de projet « {cohortes.prefixe_code(prefixe)}… » du préfixe « {prefixe} » sont déjà pris "
+                f"(par exemple {conflits.values_list('code', flat=True).first()}) : choisir un --prefix "
+                f"commençant par d'autres lettres."
+            )
 
-        # # 4. Créer des projets associés aux superviseurs
-        projectsl = []
-        # for _ in range(10):  # Générer 10 projets
-        #     project = Project.objects.create(
-        #         code=fake.unique.bothify("P??###"),  # Code unique (ex: PAB123)
-        #         title=fake.catch_phrase(),
-        #         description=fake.text(),
-        #         number_groups=random.randint(1, 5),  # Nombre de groupes aléatoire
-        #         supervisor=random.choice(supervisors),  # Superviseur aléatoire
-        #         level=random.choice(LEVEL_CHOICES),  # Niveau aléatoire
-        #     )
-        #     projects.append(project)
-        # self.stdout.write(f"{len(projects)} projets créés.")
+        deja_generes = User.objects.filter(username__startswith=f"{prefixe}-")
+        if options["reset"]:
+            # Les étudiants, projets, équipes et vœux suivent leurs utilisateurs
+            with suspendre_suivi():
+                supprimes, _ = deja_generes.delete()
+            for level, _ in LEVEL_CHOICES:
+                reconstruire(level)
+            self.stdout.write(f"{supprimes} objets supprimés.")
+        elif deja_generes.exists():
+            raise CommandError(f"Des données avec le préfixe « {prefixe} » existent déjà : utiliser --reset ou --prefix.")
 
-        # 5. Créer des préférences pour chaque étudiant
-        
-        students = Student.objects.all()
-        projects = Project.objects.all()
+        debut = time.perf_counter()
+        mot_de_passe = make_password(options["password"])  # Un seul hachage pour tous les comptes
 
-        # Pas besoin de faire une copie des listes via une boucle, on peut les utiliser directement
-        for student in students:
-            # Projets correspondant au niveau de l'étudiant
-            available_projects = [p for p in projects if p.level == student.level]
-            random.shuffle(available_projects)
-            
-            # Prendre au maximum 5 projets
-            chosen_projects = available_projects[:5]
-            
-            for i, project in enumerate(chosen_projects):
-                if not Voeux.objects.filter(student=student, project=project).exists():
-                    Voeux.objects.create(
-                        student=student,
-                        project=project,
-                        rank=i + 1,
-                        note_preference=random.randint(1, 20),  # Note entre 1 et 20
-                    )
+        with transaction.atomic():
+            for i, (level, n_etudiants, n_projets) in enumerate(zip(
+                levels, self.repartir(options["students"], len(levels)), self.repartir(options["projects"], len(levels))
+            )):
+                cohorte = cohortes.generer_cohorte(
+                    level, n_etudiants, n_projets,
+                    equipes_par_projet=options["teams_per_project"],
+                    n_voeux=options["wishes"],
+                    zipf=options["zipf"],
+                    seed=options["seed"] + i,
+                    prefixe=prefixe,
+                    mot_de_passe_hache=mot_de_passe,
+                    taille_lot=options["batch_size"],
+                )
+                self.stdout.write(
+                    f"{level} : {cohorte['etudiants']} étudiants, {cohorte['projets']} projets, "
+                    f"{cohorte['equipes']} équipes, {cohorte['voeux']} vœux."
+                )
 
-        self.stdout.write(f"Préférences créées pour {len(students)} étudiants.")
-        self.stdout.write(self.style.SUCCESS("Données de test générées avec succès !"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Données de test générées avec succès en {time.perf_counter() - debut:.2f} s !"
+        ))
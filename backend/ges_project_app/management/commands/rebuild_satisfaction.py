@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from ges_project_app.models import LEVEL_CHOICES, SatisfactionAggregate
+from ges_project_app.attribution.satisfaction import METHODES, calculer_totaux, reconstruire
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'agrégat de satisfaction de chaque niveau à partir des affectations et des vœux."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--level", choices=[code for code, _ in LEVEL_CHOICES],
+                            help="Niveau à reconstruire (par défaut : tous).")
+        parser.add_argument("--check", action="store_true",
+                            help="Compare seulement l'agrégat stocké au recalcul, sans rien écrire.")
+        parser.add_argument("--tolerance", type=float, default=1e-6,
+                            help="Écart maximal accepté sur les scores (erreurs d'arrondi des mises à jour successives).")
+
+    def handle(self, *args, **options):
+        levels = [options["level"]] if options["level"] else [code for code, _ in LEVEL_CHOICES]
+        derives = 0
+
+        for level in levels:
+            stockes = {
+                a.methode: (a.total_score, a.max_score, a.count)
+                for a in SatisfactionAggregate.objects.filter(level=level)
+            }
+            totaux = calculer_totaux(level) if options["check"] else reconstruire(level)
+
+            for methode in METHODES:
+                attendu = totaux[methode]
+                stocke = stockes.get(methode)
+                ecart = stocke is None or stocke[2] != attendu[2] or any(
+                    abs(s - a) > options["tolerance"] for s, a in zip(stocke[:2], attendu[:2])
+                )
+                if ecart:
+                    derives += 1
+                    self.stdout.write(self.style.WARNING(
+                        f"{level} / {methode} : stocké {stocke}, recalculé {attendu}"
+                    ))
+
+        if options["check"] and derives:
+            raise CommandError(f"{derives} agrégat(s) de satisfaction en écart.")
+        action = "vérifiés" if options["check"] else "reconstruits"
+        self.stdout.write(self.style.SUCCESS(
+            f"Agrégats de satisfaction {action} pour {', '.join(levels)} ({derives} écart(s))."
+        ))
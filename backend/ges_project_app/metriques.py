@@ -0,0 +1,107 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from ges_project_app import parametres_niveau
+
+# Bornes supérieures des seaux des histogrammes (le seau +Inf est implicite)
+SEAUX_DUREE = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SEAUX_REQUETES = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+SEAUX_TAILLE = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+HISTOGRAMMES = {
+    "http_request_duration_seconds": ("Durée de traitement des requêtes HTTP.", SEAUX_DUREE),
+    "http_request_sql_queries": ("Nombre de requêtes SQL par requête HTTP.", SEAUX_REQUETES),
+    "http_request_sql_duration_seconds": ("Temps passé en SQL par requête HTTP.", SEAUX_DUREE),
+    "http_response_size_bytes": ("Taille des réponses HTTP (hors réponses en flux).", SEAUX_TAILLE),
+}
+
+
+class Histogramme:
+    """Histogramme cumulatif à seaux fixes, au format de Prometheus (non protégé : voir _verrou)."""
+    __slots__ = ("seaux", "comptes", "somme", "nombre")
+
+    def __init__(self, seaux):
+        self.seaux = seaux
+        self.comptes = [0] * (len(seaux) + 1)
+        self.somme = 0.0
+        self.nombre = 0
+
+    def observer(self, valeur):
+        self.comptes[bisect_left(self.seaux, valeur)] += 1
+        self.somme += valeur
+        self.nombre += 1
+
+    def cumuls(self):
+        total = 0
+        for borne, compte in zip(self.seaux + (float("inf"),), self.comptes):
+            total += compte
+            yield borne, total
+
+
+# État du processus courant : {nom: {(vue, méthode): Histogramme}} et {(vue, méthode, statut): nombre}
+_histogrammes = {nom: {} for nom in HISTOGRAMMES}
+_requetes = defaultdict(int)
+_verrou = threading.Lock()
+
+
+def enregistrer(vue, methode, statut, duree, nb_sql, duree_sql, taille=None):
+    """Enregistre les mesures d'une requête HTTP (appelé par MetriquesMiddleware)."""
+    mesures = {
+        "http_request_duration_seconds": duree,
+        "http_request_sql_queries": nb_sql,
+        "http_request_sql_duration_seconds": duree_sql,
+        "http_response_size_bytes": taille,
+    }
+    with _verrou:
+        _requetes[(vue, methode, statut)] += 1
+        for nom, valeur in mesures.items():
+            if valeur is None:
+                continue
+            histogramme = _histogrammes[nom].get((vue, methode))
+            if histogramme is None:
+                histogramme = _histogrammes[nom][(vue, methode)] = Histogramme(HISTOGRAMMES[nom][1])
+            histogramme.observer(valeur)
+
+
+def reinitialiser():
+    with _verrou:
+        for histogrammes in _histogrammes.values():
+            histogrammes.clear()
+        _requetes.clear()
+
+
+def _etiquettes(**etiquettes):
+    echapper = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{cle}="{echapper(valeur)}"' for cle, valeur in etiquettes.items()) + "}"
+
+
+def _nombre(valeur):
+    return "+Inf" if valeur == float("inf") else repr(valeur)
+
+
+def exposer():
+    """Toutes les métriques du processus au format texte de Prometheus (version 0.0.4)."""
+    lignes = [
+        "# HELP http_requests_total Requêtes HTTP traitées, par vue, méthode et statut.",
+        "# TYPE http_requests_total counter",
+    ]
+    with _verrou:
+        for (vue, methode, statut), nombre in sorted(_requetes.items()):
+            lignes.append(f"http_requests_total{_etiquettes(view=vue, method=methode, status=statut)} {nombre}")
+
+        for nom, (aide, _) in HISTOGRAMMES.items():
+            lignes += [f"# HELP {nom} {aide}", f"# TYPE {nom} histogram"]
+            for (vue, methode), histogramme in sorted(_histogrammes[nom].items()):
+                for borne, cumul in histogramme.cumuls():
+                    lignes.append(f"{nom}_bucket{_etiquettes(view=vue, method=methode, le=_nombre(borne))} {cumul}")
+                lignes.append(f"{nom}_sum{_etiquettes(view=vue, method=methode)} {_nombre(histogramme.somme)}")
+                lignes.append(f"{nom}_count{_etiquettes(view=vue, method=methode)} {histogramme.nombre}")
+
+    cache = parametres_niveau.statistiques()
+    lignes += [
+        "# HELP deadline_cache_requests_total Lectures du cache des paramètres de vœux par niveau.",
+        "# TYPE deadline_cache_requests_total counter",
+        f'deadline_cache_requests_total{{result="hit"}} {cache["hits"]}',
+        f'deadline_cache_requests_total{{result="miss"}} {cache["misses"]}',
+    ]
+    return "\n".join(lignes) + "\n"
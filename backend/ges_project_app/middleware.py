@@ -0,0 +1,46 @@
+import time
+from django.db import connection
+from ges_project_app import metriques
+
+
+class CompteurSQL:
+    """execute_wrapper de la connexion : compte les requêtes SQL et cumule leur durée."""
+    __slots__ = ("nombre", "duree")
+
+    def __init__(self):
+        self.nombre = 0
+        self.duree = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duree += time.perf_counter() - debut
+            self.nombre += 1
+
+
+class MetriquesMiddleware:
+    """
+    Mesure chaque requête HTTP : vue résolue, durée, nombre et durée des requêtes SQL,
+    taille de la réponse. Les mesures alimentent les histogrammes de `metriques`,
+    exposés par /api/metrics/. Pour une réponse en flux, seule la préparation est
+    mesurée (le corps est produit après la sortie du middleware) et la taille est omise.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        compteur = CompteurSQL()
+        debut = time.perf_counter()
+        with connection.execute_wrapper(compteur):
+            response = self.get_response(request)
+        duree = time.perf_counter() - debut
+
+        # Nom de la vue plutôt que le chemin : nombre d'étiquettes borné (pas d'identifiants)
+        match = getattr(request, "resolver_match", None)
+        vue = (match.view_name or match._func_path) if match else "non_resolue"
+        taille = None if response.streaming else len(response.content)
+        metriques.enregistrer(vue, request.method, response.status_code, duree, compteur.nombre, compteur.duree, taille)
+        return response
@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-18 20:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ges_project_app', '0007_delete_parametragesysteme_deadline_level_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssignmentRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(choices=[('L2', 'Licence 2'), ('L3', 'Licence 3'), ('M1', 'Master 1'), ('M2', 'Master 2')], max_length=5)),
+                ('algorithm', models.CharField(max_length=20)),
+                ('seed', models.BigIntegerField()),
+                ('details', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
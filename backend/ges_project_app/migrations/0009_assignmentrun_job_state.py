@@ -0,0 +1,44 @@
+# Generated by Django 4.2 on 2026-10-18 20:33
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ges_project_app', '0008_assignmentrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignmentrun',
+            name='error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='assignmentrun',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='assignmentrun',
+            name='progress',
+            field=models.PositiveSmallIntegerField(default=0, validators=[django.core.validators.MaxValueValidator(100)]),
+        ),
+        migrations.AddField(
+            model_name='assignmentrun',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='assignmentrun',
+            name='status',
+            field=models.CharField(choices=[('queued', "En file d'attente"), ('running', 'En cours'), ('done', 'Terminé'), ('failed', 'Échoué')], default='queued', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='assignmentrun',
+            name='timings',
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 20:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ges_project_app', '0009_assignmentrun_job_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SatisfactionAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(choices=[('L2', 'Licence 2'), ('L3', 'Licence 3'), ('M1', 'Master 1'), ('M2', 'Master 2')], max_length=5)),
+                ('methode', models.CharField(max_length=20)),
+                ('total_score', models.FloatField(default=0)),
+                ('max_score', models.FloatField(default=0)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('level', 'methode')},
+            },
+        ),
+    ]
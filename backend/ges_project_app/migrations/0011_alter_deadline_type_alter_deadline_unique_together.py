@@ -0,0 +1,22 @@
+# Generated by Django 4.2 on 2026-10-18 20:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ges_project_app', '0010_satisfactionaggregate'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deadline',
+            name='type',
+            field=models.CharField(choices=[('voeux', 'Voeux')], default='voeux', max_length=50),
+        ),
+        migrations.AlterUniqueTogether(
+            name='deadline',
+            unique_together={('type', 'level')},
+        ),
+    ]
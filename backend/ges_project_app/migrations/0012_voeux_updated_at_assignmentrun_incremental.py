@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 21:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ges_project_app', '0011_alter_deadline_type_alter_deadline_unique_together'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignmentrun',
+            name='incremental',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='voeux',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-18 21:42
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def borner_notes(apps, schema_editor):
+    """Ramène les notes déjà enregistrées dans le barème 1..20 ; l'agrégat de satisfaction sera recalculé."""
+    Voeux = apps.get_model('ges_project_app', 'Voeux')
+    SatisfactionAggregate = apps.get_model('ges_project_app', 'SatisfactionAggregate')
+    bornees = Voeux.objects.filter(note_preference__lt=1).update(note_preference=1)
+    bornees += Voeux.objects.filter(note_preference__gt=20).update(note_preference=20)
+    if bornees:
+        SatisfactionAggregate.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ges_project_app', '0012_voeux_updated_at_assignmentrun_incremental'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='voeux',
+            name='note_preference',
+            field=models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(20)]),
+        ),
+        migrations.RunPython(borner_notes, migrations.RunPython.noop),
+    ]
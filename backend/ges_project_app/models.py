@@ -1,3 +1,4 @@
+import functools
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -16,6 +17,17 @@ STATUS_CHOICES = [
     ('rejected', 'Rejeté'),
 ]
 
+JOB_STATUS_CHOICES = [
+    ('queued', 'En file d\'attente'),
+    ('running', 'En cours'),
+    ('done', 'Terminé'),
+    ('failed', 'Échoué'),
+]
+
+# Barème des notes de préférence des vœux, partagé par la validation et par le calcul des scores
+NOTE_PREFERENCE_MIN = 1
+NOTE_PREFERENCE_MAX = 20
+
 LEVEL_CHOICES = [
     ('L2', 'Licence 2'),
     ('L3', 'Licence 3'),
@@ -52,11 +64,37 @@ class Project(models.Model):
     def __str__(self):
         return f"{self.code} - {self.title} ({self.level})"
 
-class Voeux(models.Model):
+class SuiviSatisfactionQuerySet(models.QuerySet):
+    """
+    delete() retire les lignes supprimées de l'agrégat de satisfaction en quelques
+    requêtes, sans signal par ligne : la suppression rapide de Django reste possible.
+    """
+
+    def delete(self):
+        from ges_project_app.attribution import satisfaction  # Import local : satisfaction importe les modèles
+        return satisfaction.supprimer(self, super().delete)
+
+
+class SuiviSatisfactionMixin:
+    """Même suivi pour la suppression d'une seule instance."""
+
+    def delete(self, *args, **kwargs):
+        from ges_project_app.attribution import satisfaction
+        lignes = type(self).objects.filter(pk=self.pk)
+        return satisfaction.supprimer(lignes, functools.partial(super().delete, *args, **kwargs))
+
+
+class Voeux(SuiviSatisfactionMixin, models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name="voeux")
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="voeux")
     rank = models.PositiveIntegerField(validators=[MinValueValidator(1)])
-    note_preference = models.PositiveIntegerField(validators=[MinValueValidator(1), MaxValueValidator(10)])
+    note_preference = models.PositiveIntegerField(
+        validators=[MinValueValidator(NOTE_PREFERENCE_MIN), MaxValueValidator(NOTE_PREFERENCE_MAX)]
+    )
+    # Comparée au début de la dernière exécution d'affectation par la réaffectation incrémentale
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = SuiviSatisfactionQuerySet.as_manager()
     
     class Meta:
         unique_together = ('student', 'project')  # Un étudiant ne peut noter un projet qu'une seule fois
@@ -83,12 +121,14 @@ class StudentsTeams(models.Model):
         return f"{self.student} in {self.team}"
     
 
-class ProjectAssignment(models.Model):
+class ProjectAssignment(SuiviSatisfactionMixin, models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name="assignments")
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="assignments")
     assignment_date = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='pending')
 
+    objects = SuiviSatisfactionQuerySet.as_manager()
+
     class Meta:
         unique_together = ('student', 'project')  # Un étudiant ne peut avoir qu'un seul projet
         indexes = [
@@ -101,11 +141,14 @@ class ProjectAssignment(models.Model):
 
     
 class Deadline(models.Model):
-    type = models.CharField(max_length=50, choices=[('voeux', 'Voeux')], default='voeux', unique=True)
+    type = models.CharField(max_length=50, choices=[('voeux', 'Voeux')], default='voeux')
     limite_date = models.DateField()
     max_choice = models.PositiveIntegerField(default=5)
     level = models.CharField(max_length=5, choices=LEVEL_CHOICES, default='null')
 
+    class Meta:
+        unique_together = ('type', 'level')  # Une date limite des vœux par niveau
+
     def __str__(self):
         return f"Deadline for {self.type}: {self.limite_date}"
     
@@ -126,3 +169,53 @@ class ChangeRequest(models.Model):
         return f"Demande de {self.student} ({self.status})"
 
 
+class SatisfactionAggregate(models.Model):
+    """
+    Satisfaction d'un niveau tenue à jour à chaque écriture (somme des scores,
+    score maximal possible et nombre d'affectations), pour une lecture en O(1).
+    `methode` désigne le barème : celui de Gale-Shapley ou celui de l'algorithme glouton.
+    """
+    level = models.CharField(max_length=5, choices=LEVEL_CHOICES)
+    methode = models.CharField(max_length=20)
+    total_score = models.FloatField(default=0)
+    max_score = models.FloatField(default=0)
+    count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('level', 'methode')
+
+    @property
+    def pourcentage(self):
+        return (self.total_score / self.max_score) * 100 if self.max_score > 0 else 0
+
+    def __str__(self):
+        return f"Satisfaction {self.methode} ({self.level}) : {self.pourcentage:.2f} %"
+
+
+class AssignmentRun(models.Model):
+    """
+    Exécution (tâche) d'affectation : graine utilisée pour pouvoir la rejouer,
+    état d'avancement, durées et résultat final.
+    """
+    level = models.CharField(max_length=5, choices=LEVEL_CHOICES)
+    algorithm = models.CharField(max_length=20)
+    seed = models.BigIntegerField()
+    # Réparation des affectations existantes au lieu d'un recalcul complet du niveau
+    incremental = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=JOB_STATUS_CHOICES, default='queued')
+    progress = models.PositiveSmallIntegerField(default=0, validators=[MaxValueValidator(100)])
+    details = models.JSONField(default=dict)
+    timings = models.JSONField(default=dict)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Affectation {self.algorithm} ({self.level}, seed={self.seed})"
+
+
@@ -0,0 +1,57 @@
+import threading
+from django.conf import settings
+from django.core.cache import cache
+from ges_project_app.models import Deadline
+
+MAX_CHOICE_PAR_DEFAUT = 5
+DUREE_CACHE_PAR_DEFAUT = 300  # secondes
+
+# Compteurs du processus courant (le cache locmem est lui aussi propre à chaque processus)
+_compteurs = {"hits": 0, "misses": 0}
+_verrou = threading.Lock()
+
+
+def _cle(level):
+    return f"deadline:voeux:{level}"
+
+
+def _compter(resultat):
+    with _verrou:
+        _compteurs[resultat] += 1
+
+
+def lire_parametres(level):
+    """
+    Paramètres de vœux d'un niveau : {"limite_date": date ou None, "max_choice": int}.
+    Lus dans le cache de Django, sinon en base puis mis en cache ; l'entrée est
+    invalidée par les signaux de Deadline, et expire de toute façon après
+    DEADLINE_CACHE_TTL secondes (mises à jour qui ne passent pas par save()).
+    """
+    parametres = cache.get(_cle(level))
+    if parametres is not None:
+        _compter("hits")
+        return parametres
+
+    _compter("misses")
+    deadline = Deadline.objects.filter(type="voeux", level=level).values("limite_date", "max_choice").first()
+    parametres = deadline or {"limite_date": None, "max_choice": MAX_CHOICE_PAR_DEFAUT}
+    cache.set(_cle(level), parametres, getattr(settings, "DEADLINE_CACHE_TTL", DUREE_CACHE_PAR_DEFAUT))
+    return parametres
+
+
+def max_choice(level):
+    return lire_parametres(level)["max_choice"]
+
+
+def date_limite(level):
+    return lire_parametres(level)["limite_date"]
+
+
+def invalider(*levels):
+    cache.delete_many([_cle(level) for level in levels])
+
+
+def statistiques():
+    """Compteurs de succès et d'échecs du cache depuis le démarrage du processus."""
+    with _verrou:
+        return dict(_compteurs)
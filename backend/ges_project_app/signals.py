@@ -0,0 +1,129 @@
+from collections import defaultdict
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from ges_project_app.models import ProjectAssignment, Voeux, Deadline, Project, Student
+from ges_project_app import parametres_niveau
+from ges_project_app.attribution import satisfaction
+
+
+def _ancienne_valeur(sender, instance, *champs):
+    """Valeurs en base avant la sauvegarde (None pour une création)."""
+    if instance.pk is None:
+        return None
+    return sender.objects.filter(pk=instance.pk).values_list(*champs).first()
+
+
+# -----------------------
+# Agrégat de satisfaction : affectations
+# -----------------------
+
+@receiver(pre_save, sender=ProjectAssignment)
+def memoriser_affectation(sender, instance, **kwargs):
+    if not satisfaction.suivi_suspendu():
+        instance._avant_sauvegarde = _ancienne_valeur(sender, instance, "student_id", "project_id")
+
+
+@receiver(post_save, sender=ProjectAssignment)
+def affectation_enregistree(sender, instance, created, **kwargs):
+    if satisfaction.suivi_suspendu():
+        return
+    avant = getattr(instance, "_avant_sauvegarde", None)
+    apres = (instance.student_id, instance.project_id)
+    if avant == apres:
+        return
+
+    deltas = defaultdict(lambda: ([], []))
+    if avant is not None:
+        level, rank_note = satisfaction.contribution(*avant)
+        deltas[level][0].append(rank_note)
+    level, rank_note = satisfaction.contribution(*apres)
+    deltas[level][1].append(rank_note)
+    for level, (retirees, ajoutees) in deltas.items():
+        satisfaction.appliquer(level, retirees, ajoutees)
+
+
+# Pas de receveur de suppression sur ProjectAssignment ni sur Voeux : il désactiverait la
+# suppression rapide de Django. Leurs suppressions passent par SuiviSatisfactionQuerySet.delete()
+# (satisfaction.supprimer) ; les suppressions en cascade sont traitées plus bas.
+
+
+# -----------------------
+# Agrégat de satisfaction : vœux (ne comptent que pour un couple affecté)
+# -----------------------
+
+def _changement_voeu(student_id, project_id, rank_note, retire):
+    """Le vœu d'un couple affecté apparaît (retire=False) ou disparaît (retire=True)."""
+    if not ProjectAssignment.objects.filter(student_id=student_id, project_id=project_id).exists():
+        return
+    level, actuel = satisfaction.contribution(student_id, project_id)
+    if retire:
+        if actuel is not None:  # Le vœu comptait bien dans l'agrégat du niveau
+            satisfaction.appliquer(level, retirees=[actuel], ajoutees=[None])
+    elif rank_note is not None and actuel == rank_note:
+        satisfaction.appliquer(level, retirees=[None], ajoutees=[rank_note])
+
+
+@receiver(pre_save, sender=Voeux)
+def memoriser_voeu(sender, instance, **kwargs):
+    if satisfaction.suivi_suspendu():
+        return
+    instance._avant_sauvegarde = _ancienne_valeur(sender, instance, "student_id", "project_id", "rank", "note_preference")
+    if instance._avant_sauvegarde is not None:
+        # Le vœu en base est retiré ici, puis la nouvelle version ajoutée au post_save
+        student_id, project_id, _, _ = instance._avant_sauvegarde
+        _changement_voeu(student_id, project_id, None, retire=True)
+
+
+@receiver(post_save, sender=Voeux)
+def voeu_enregistre(sender, instance, **kwargs):
+    if satisfaction.suivi_suspendu():
+        return
+    _changement_voeu(instance.student_id, instance.project_id,
+                     (instance.rank, instance.note_preference), retire=False)
+
+
+# -----------------------
+# Suppressions en cascade : un étudiant ou un projet emporte ses vœux et ses affectations
+# sans passer par leur queryset. L'agrégat est invalidé, une requête par ligne supprimée,
+# et reconstruit à la prochaine lecture.
+# -----------------------
+
+@receiver(post_delete, sender=Student)
+def etudiant_supprime(sender, instance, **kwargs):
+    # Ses affectations peuvent concerner des projets d'autres niveaux
+    if not satisfaction.suivi_suspendu():
+        satisfaction.invalider()
+
+
+@receiver(post_delete, sender=Project)
+def projet_supprime(sender, instance, **kwargs):
+    if not satisfaction.suivi_suspendu():
+        satisfaction.invalider(instance.level)
+
+
+# -----------------------
+# Deadline : cache des paramètres du niveau, et agrégat de satisfaction
+# (max_choice change tout le barème du niveau)
+# -----------------------
+
+@receiver(pre_save, sender=Deadline)
+def memoriser_deadline(sender, instance, **kwargs):
+    instance._avant_sauvegarde = _ancienne_valeur(sender, instance, "level")
+
+
+@receiver(post_save, sender=Deadline)
+def deadline_enregistree(sender, instance, **kwargs):
+    avant = getattr(instance, "_avant_sauvegarde", None)
+    levels = {instance.level} | ({avant[0]} if avant is not None else set())
+    # Le cache des paramètres est invalidé en premier : la reconstruction relit max_choice
+    parametres_niveau.invalider(*levels)
+    if not satisfaction.suivi_suspendu():
+        for level in levels:
+            satisfaction.reconstruire_ou_invalider(level)
+
+
+@receiver(post_delete, sender=Deadline)
+def deadline_supprimee(sender, instance, **kwargs):
+    parametres_niveau.invalider(instance.level)
+    if not satisfaction.suivi_suspendu():
+        satisfaction.reconstruire_ou_invalider(instance.level)
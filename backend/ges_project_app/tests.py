@@ -1,3 +1,1613 @@
-from django.test import TestCase
+import itertools
+import json
+import os
+import pickle
+import random
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from unittest import mock
+from datetime import date
+from io import StringIO
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models.deletion import Collector
+from django.db.models import Count, F, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from ges_project_app import metriques, parametres_niveau
+from ges_project_app.attribution import (
+    attribution, cohortes, echanges, equipes, flot_cout_min, gale_shapley_attribution, gale_shapley_vectorise,
+    moteurs, probleme, reaffectation,
+)
+from ges_project_app.attribution.analyser_affectation import analyser_affectations
+from ges_project_app.attribution.moteurs import ALGORITHMES, lancer_affectation
+from ges_project_app.attribution.parallele import affecter_tous_niveaux
+from ges_project_app.attribution.persistance import enregistrer_affectations
+from ges_project_app.attribution.satisfaction import lire_satisfaction, reconstruire, suspendre_suivi
+from ges_project_app.models import (
+    User, Student, Project, Voeux, Team, StudentsTeams, ProjectAssignment, Deadline, AssignmentRun, ChangeRequest,
+    SatisfactionAggregate, NOTE_PREFERENCE_MIN, NOTE_PREFERENCE_MAX,
+)
+
+
+def generer_niveau(level="M1", n_etudiants=60, n_projets=8, seed=0):
+    """Crée un niveau synthétique : étudiants, projets (dont des prioritaires), équipes et vœux."""
+    rng = random.Random(seed)
+    cache.clear()  # Le cache des paramètres survit au rollback de la base entre deux tests
+    superviseur = User.objects.create(username=f"sup-{level}-{seed}", role="supervisor")
+    if not Deadline.objects.filter(level=level).exists():
+        Deadline.objects.create(limite_date=date(2030, 1, 1), max_choice=5, level=level)
+
+    projets = [
+        Project.objects.create(
+            code=f"{level}{seed}-{i}", title=f"Projet {i}", description="", number_groups=2,
+            supervisor=superviseur, level=level, priority=(i % 4 == 0),
+        )
+        for i in range(n_projets)
+    ]
+    for projet in projets:
+        for j in range(rng.randint(1, 2)):
+            Team.objects.create(name=f"{projet.code}-{j}", min_students=1, max_students=rng.randint(2, 5), project=projet)
+
+    for i in range(n_etudiants):
+        user = User.objects.create(username=f"etu-{level}-{seed}-{i}", role="student")
+        etudiant = Student.objects.create(user=user, level=level)
+        # Quelques étudiants sans vœu, et des notes resserrées pour provoquer des égalités
+        for rang, projet in enumerate(rng.sample(projets, rng.randint(0, 5)), start=1):
+            Voeux.objects.create(student=etudiant, project=projet, rank=rang, note_preference=rng.randint(8, 12))
+    return projets
+
+
+def generer_niveau_en_masse(level, n_etudiants, n_projets=20, seed=0):
+    """Variante de generer_niveau par insertions en masse, pour les gros volumes."""
+    rng = random.Random(seed)
+    cache.clear()
+    superviseur = User.objects.create(username=f"sup-masse-{level}-{seed}", role="supervisor")
+    projets = Project.objects.bulk_create([
+        Project(code=f"X{level}{seed}-{i}", title=f"Projet {i}", description="", number_groups=1,
+                supervisor=superviseur, level=level)
+        for i in range(n_projets)
+    ])
+    Team.objects.bulk_create([Team(name=f"T{p.id}", min_students=1, max_students=3, project=p) for p in projets])
+    users = User.objects.bulk_create([
+        User(username=f"masse-{level}-{seed}-{i}", first_name="Prénom", last_name=str(i), role="student")
+        for i in range(n_etudiants)
+    ])
+    etudiants = Student.objects.bulk_create([Student(user=u, level=level) for u in users])
+    Voeux.objects.bulk_create([
+        Voeux(student=e, project=p, rank=rang, note_preference=rng.randint(1, 10))
+        for e in etudiants
+        for rang, p in enumerate(rng.sample(projets, rng.randint(0, 3)), start=1)
+    ])
+    ProjectAssignment.objects.bulk_create([
+        ProjectAssignment(student=e, project=rng.choice(projets)) for e in etudiants[::4]
+    ])
+
+
+def vider_niveaux():
+    """Supprime les données générées (les étudiants et projets suivent leurs utilisateurs)."""
+    with suspendre_suivi():
+        User.objects.all().delete()
+        Deadline.objects.all().delete()
+    SatisfactionAggregate.objects.all().delete()
+
+
+def affecter_projets_reference(level, force_assign=False):
+    """Implémentation d'origine de attribution.affecter_projets (sans écriture), servant de référence."""
+    try:
+        max_choice = Deadline.objects.get(level=level).max_choice
+    except Deadline.DoesNotExist:
+        max_choice = 5
+
+    scores = defaultdict(list)
+    preferences = Voeux.objects.filter(project__level=level, student__level=level)
+    etudiants_ayant_fait_un_voeu = set()
+    for pref in preferences:
+        score = attribution.calculer_score(pref.rank, pref.note_preference, max_choice=max_choice)
+        scores[pref.project].append((score, pref.student))
+        etudiants_ayant_fait_un_voeu.add(pref.student)
+    for projet in scores:
+        scores[projet].sort(key=lambda x: x[0], reverse=True)
+
+    equipes_disponibles = {equipe: equipe.max_students for equipe in Team.objects.filter(project__level=level)}
+    affectations = {}
+
+    for projet in Project.objects.filter(priority=True, level=level):
+        if projet not in scores or not scores[projet]:
+            continue
+        equipes_projet = [e for e in equipes_disponibles if e.project == projet]
+        if equipes_projet:
+            _, etudiant = scores[projet].pop(0)
+            affectations[etudiant] = equipes_projet[0]
+            equipes_disponibles[equipes_projet[0]] -= 1
+
+    for projet, etudiants_scores in scores.items():
+        equipes_projet = [e for e in equipes_disponibles if e.project == projet]
+        if not equipes_projet:
+            continue
+        while etudiants_scores:
+            equipe_courante = next((e for e in equipes_projet if equipes_disponibles[e] > 0), None)
+            if not equipe_courante:
+                break
+            meilleurs_scores = etudiants_scores[:equipes_disponibles[equipe_courante]]
+            dernier_score = meilleurs_scores[-1][0] if meilleurs_scores else None
+            candidats = [et for sc, et in meilleurs_scores if sc == dernier_score]
+            etudiant_choisi = random.choice(candidats) if len(candidats) > 1 else candidats[0]
+            if etudiant_choisi in etudiants_ayant_fait_un_voeu:
+                affectations[etudiant_choisi] = equipe_courante
+                equipes_disponibles[equipe_courante] -= 1
+            etudiants_scores = [(s, e) for s, e in etudiants_scores if e != etudiant_choisi]
+
+    etudiants_non_affectes = set(Student.objects.filter(level=level)) - set(affectations.keys())
+    etudiants_non_affectes = etudiants_non_affectes.intersection(etudiants_ayant_fait_un_voeu)
+
+    for etudiant in etudiants_non_affectes:
+        if force_assign:
+            equipe_disponible = next((e for e, cap in equipes_disponibles.items() if cap > 0), None)
+            if equipe_disponible and equipe_disponible.project.level == etudiant.level:
+                affectations[etudiant] = equipe_disponible
+                equipes_disponibles[equipe_disponible] -= 1
+        else:
+            for voeu in Voeux.objects.filter(student=etudiant, project__level=level).order_by('rank'):
+                equipe_dispo = next(
+                    (e for e, cap in equipes_disponibles.items() if e.project == voeu.project and cap > 0), None
+                )
+                if equipe_dispo:
+                    affectations[etudiant] = equipe_dispo
+                    equipes_disponibles[equipe_dispo] -= 1
+                    break
+
+    return {etudiant.id: equipe.project_id for etudiant, equipe in affectations.items()}
+
+
+class AffecterProjetsRegressionTests(TestCase):
+    """Le réécriture de affecter_projets doit produire les mêmes affectations que l'implémentation d'origine."""
+
+    def assertMemesAffectations(self, level, force_assign):
+        random.seed(42)
+        attendu = affecter_projets_reference(level, force_assign=force_assign)
+        random.seed(42)
+        resultat = attribution.affecter_projets(level, force_assign=force_assign)
+
+        obtenu = dict(ProjectAssignment.objects.filter(project__level=level).values_list("student_id", "project_id"))
+        self.assertEqual(obtenu, attendu)
+        self.assertEqual(resultat["assignments_count"], len(attendu))
+
+    def test_memes_affectations_que_la_reference(self):
+        for seed in range(3):
+            with self.subTest(seed=seed):
+                generer_niveau("M1", seed=seed)
+                self.assertMemesAffectations("M1", force_assign=False)
+                vider_niveaux()
+
+    def test_memes_affectations_avec_force_assign(self):
+        generer_niveau("L3", n_etudiants=80, seed=7)
+        self.assertMemesAffectations("L3", force_assign=True)
+
+
+class EnregistrerAffectationsTests(TestCase):
+    """Écriture différentielle des affectations : créations, mises à jour, suppressions et doublons."""
+
+    def setUp(self):
+        generer_niveau("M1", n_etudiants=6, n_projets=3, seed=1)
+        self.p1, self.p2, self.p3 = Project.objects.filter(level="M1").order_by("id").values_list("id", flat=True)
+        self.e = list(Student.objects.filter(level="M1").order_by("id").values_list("id", flat=True))
+        lignes = [
+            (self.e[0], self.p1, "pending"),   # inchangée
+            (self.e[1], self.p1, "approved"),  # même projet, statut validé
+            (self.e[2], self.p1, "pending"),   # change de projet
+            (self.e[3], self.p1, "pending"),   # doublon : la ligne vers p2 est gardée
+            (self.e[3], self.p2, "pending"),
+            (self.e[4], self.p1, "pending"),   # plus affecté
+        ]
+        ProjectAssignment.objects.bulk_create([
+            ProjectAssignment(student_id=e, project_id=p, status=statut) for e, p, statut in lignes
+        ])
+        # Étudiant d'un autre niveau sur un projet de M1 : hors du périmètre du niveau
+        autre = Student.objects.create(user=User.objects.create(username="autre-niveau"), level="L1")
+        self.hors_niveau = ProjectAssignment.objects.create(student=autre, project_id=self.p1)
+        self.affectations = {
+            self.e[0]: self.p1, self.e[1]: self.p1, self.e[2]: self.p2, self.e[3]: self.p2, self.e[5]: self.p3,
+        }
+
+    def test_difference_par_lots(self):
+        resultat = enregistrer_affectations("M1", self.affectations, batch_size=1)
+        self.assertEqual(
+            {cle: resultat[cle] for cle in ("created", "updated", "deleted", "unchanged")},
+            {"created": 1, "updated": 2, "deleted": 2, "unchanged": 2},
+        )
+        lignes = ProjectAssignment.objects.filter(student__level="M1")
+        self.assertEqual(dict(lignes.values_list("student_id", "project_id")), self.affectations)
+        self.assertEqual(lignes.count(), len(self.affectations))  # Doublon supprimé
+        self.assertEqual(set(lignes.values_list("status", flat=True)), {"pending"})  # Statut réinitialisé
+        self.assertTrue(ProjectAssignment.objects.filter(id=self.hors_niveau.id).exists())
+
+    def test_statut_conserve(self):
+        resultat = enregistrer_affectations("M1", self.affectations, batch_size=1, reinitialiser_statut=False)
+        self.assertEqual((resultat["updated"], resultat["unchanged"]), (1, 3))
+        self.assertEqual(ProjectAssignment.objects.get(student_id=self.e[1]).status, "approved")
+
+
+class AffecterProjetsNombreRequetesTests(TestCase):
+    """affecter_projets doit émettre un nombre fixe de requêtes, quel que soit le nombre d'étudiants."""
+
+    # Vœux, projets et équipes (MatchingProblem), affectations existantes, insertion
+    # en masse, recalcul de l'agrégat de satisfaction (affectations, vœux, upsert) et les
+    # points de sauvegarde des transactions imbriquées ; la Deadline vient du cache
+    NB_REQUETES = 12
+
+    def test_nombre_de_requetes_constant(self):
+        for n_etudiants, seed in ((10, 1), (150, 2)):
+            for force_assign in (False, True):
+                with self.subTest(n_etudiants=n_etudiants, force_assign=force_assign):
+                    generer_niveau("M2", n_etudiants=n_etudiants, n_projets=6, seed=seed)
+                    parametres_niveau.max_choice("M2")  # Cache des paramètres chaud
+                    with self.assertNumQueries(self.NB_REQUETES):
+                        attribution.affecter_projets("M2", force_assign=force_assign)
+                    vider_niveaux()
+
+
+class AffectationReproductibleTests(TestCase):
+    """Une même graine doit redonner exactement les mêmes affectations."""
+
+    def test_meme_graine_memes_affectations(self):
+        generer_niveau("M1", n_etudiants=80, seed=3)
+        for algorithm in ALGORITHMES:
+            with self.subTest(algorithm=algorithm):
+                resultats = []
+                for _ in range(2):
+                    ProjectAssignment.objects.all().delete()
+                    lancer_affectation("M1", algorithm, seed=1234)
+                    resultats.append(set(ProjectAssignment.objects.values_list("student_id", "project_id")))
+                self.assertEqual(resultats[0], resultats[1])
+
+                run = AssignmentRun.objects.filter(algorithm=algorithm).first()
+                self.assertEqual(run.seed, 1234)
+                self.assertEqual(run.details["seed"], 1234)
+
+
+class AssignmentJobTests(TransactionTestCase):
+    """Tâches d'affectation : lancement, suivi de l'avancement et résultat final."""
+
+    def setUp(self):
+        generer_niveau("M1", n_etudiants=40, seed=5)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username="admin", role="admin"))
+
+    def attendre(self, job_id, delai=10):
+        limite = time.monotonic() + delai
+        while time.monotonic() < limite:
+            job = self.client.get(f"/api/assignment-jobs/{job_id}/").data
+            if job["status"] in ("done", "failed"):
+                return job
+            time.sleep(0.05)
+        self.fail(f"La tâche {job_id} n'est pas terminée après {delai} s")
+
+    def test_tache_en_arriere_plan(self):
+        response = self.client.post("/api/assignment-jobs/", {"level": "M1", "algorithm": "algo1", "seed": 9}, format="json")
+        self.assertEqual(response.status_code, 202)
+
+        job = self.attendre(response.data["id"])
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["progress"], 100)
+        self.assertEqual(job["seed"], 9)
+        self.assertEqual(set(job["timings"]), {"attente", "calcul", "total"})
+        self.assertEqual(job["result"]["assignments_count"], ProjectAssignment.objects.count())
+
+    def test_etapes_d_avancement(self):
+        """Chaque étape est écrite hors transaction : visible des autres connexions pendant le calcul."""
+        for algorithm, incremental in [(a, False) for a in ALGORITHMES] + [("algo1", True), ("algo2", True)]:
+            with self.subTest(algorithm=algorithm, incremental=incremental):
+                etapes = []
+
+                def avancer(run, **champs):
+                    if "progress" in champs:
+                        etapes.append((champs["progress"], connection.in_atomic_block))
+                    avancer_original(run, **champs)
+
+                avancer_original = moteurs._avancer
+                with mock.patch.object(moteurs, "_avancer", side_effect=avancer):
+                    lancer_affectation("M1", algorithm, seed=3, incremental=incremental)
+                self.assertEqual(etapes, [(10, False), (40, False), (70, False), (100, False)])
+
+    @override_settings(ASSIGNMENT_JOBS_EAGER=True)
+    def test_tache_immediate_et_erreurs(self):
+        response = self.client.post("/api/assignment-jobs/", {"level": "M1", "algorithm": "algo2"}, format="json")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["status"], "done")
+
+        response = self.client.post("/api/assignment-jobs/", {"level": "M1", "algorithm": "inconnu"}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get("/api/assignment-jobs/999999/").status_code, 404)
+
+    def test_graine_hors_limites(self):
+        for url in ("/api/assignment-jobs/", "/api/projects-assign/"):
+            for seed in (-1, 2 ** 32, 2 ** 63, "abc"):
+                with self.subTest(url=url, seed=seed):
+                    response = self.client.post(url, {"level": "M1", "algorithm": "algo1", "seed": seed}, format="json")
+                    self.assertEqual(response.status_code, 400)
+        self.assertFalse(AssignmentRun.objects.exists())
+        self.assertFalse(ProjectAssignment.objects.exists())
+
+
+class AffectationTousNiveauxTests(TestCase):
+    """Le mode « tous les niveaux » doit donner le même résultat que les niveaux lancés un par un."""
+
+    def test_tous_niveaux_en_parallele(self):
+        for i, level in enumerate(("L3", "M1", "M2")):
+            generer_niveau(level, n_etudiants=30, seed=10 + i)
+
+        for algorithm in ALGORITHMES:
+            with self.subTest(algorithm=algorithm):
+                resultat = affecter_tous_niveaux(algorithm, seed=77, levels=["L3", "M1", "M2"], max_workers=2)
+                en_parallele = set(ProjectAssignment.objects.values_list("student_id", "project_id"))
+
+                ProjectAssignment.objects.all().delete()
+                for level in ("L3", "M1", "M2"):
+                    lancer_affectation(level, algorithm, seed=77)
+                self.assertEqual(set(ProjectAssignment.objects.values_list("student_id", "project_id")), en_parallele)
+
+                self.assertEqual(set(resultat["levels"]), {"L3", "M1", "M2"})
+                self.assertEqual(
+                    set(resultat["levels"]["M1"]["timings"]), {"chargement", "calcul", "ecriture", "total"}
+                )
+                self.assertGreater(resultat["total_time"], 0)
+
+
+def analyser_affectations_reference(level, algorithm):
+    """Implémentation d'origine de analyser_affectations, servant de référence."""
+    from collections import Counter
+    all_students = Student.objects.filter(level=level)
+    all_projects = Project.objects.filter(level=level)
+    all_voeux = Voeux.objects.filter(student__level=level, project__level=level)
+    affectations = ProjectAssignment.objects.filter(project__level=level)
+
+    assigned_students = set(a.student for a in affectations)
+    unassigned_students = set(all_students) - assigned_students
+    voeux_dict = defaultdict(list)
+    for v in all_voeux:
+        voeux_dict[v.student.id].append(v.project.id)
+    equipes_capacite = {equipe.project_id: 0 for equipe in Team.objects.filter(project__level=level)}
+    for equipe in Team.objects.filter(project__level=level):
+        equipes_capacite[equipe.project_id] += equipe.max_students
+    demande_par_projet = Counter(v.project_id for v in all_voeux)
+
+    no_wish, no_available_place = [], []
+    for student in unassigned_students:
+        student_voeux = voeux_dict.get(student.id, [])
+        if not student_voeux:
+            no_wish.append(student)
+        elif all(demande_par_projet[p] > equipes_capacite.get(p, 0) for p in student_voeux):
+            no_available_place.append(student)
+
+    module = attribution if algorithm == "algo2" else gale_shapley_attribution
+    satisfaction_score = module.calculer_satisfaction(level=level)
+
+    demande_filtree = Counter()
+    for s in unassigned_students:
+        for pid in voeux_dict.get(s.id, []):
+            demande_filtree[pid] += 1
+    projets_satures = [
+        {"project_id": pid, "project_title": Project.objects.get(id=pid).title,
+         "demandes": demande_filtree[pid], "capacite": equipes_capacite.get(pid, 0)}
+        for pid in demande_filtree if demande_filtree[pid] > equipes_capacite.get(pid, 0)
+    ]
+    projets_non_demandes = [
+        {"project_id": p.id, "project_title": p.title, "supervisor": p.supervisor.username}
+        for p in all_projects if demande_filtree.get(p.id, 0) == 0
+    ]
+    return {
+        "non_affectes": {
+            "aucun_voeu": [{"id": s.id, "nom": s.user.username, "full_name": s.user.get_full_name()} for s in no_wish],
+            "projets_satures": [
+                {"id": s.id, "nom": s.user.username, "full_name": s.user.get_full_name()} for s in no_available_place
+            ],
+            "autres": len(unassigned_students) - len(no_wish) - len(no_available_place)
+        },
+        "suggestions": {"dupliquer_projets": projets_satures, "revoir_projets": projets_non_demandes},
+        "stats": {
+            "total_students": all_students.count(),
+            "assigned": len(assigned_students),
+            "unassigned": len(unassigned_students),
+            "satisfaction_score": round(satisfaction_score, 2)
+        }
+    }
+
+
+class AnalyserAffectationsTests(TestCase):
+    """analyser_affectations : même JSON qu'avant, en un nombre fixe de requêtes."""
+
+    # Étudiants, projets, vœux, affectations, capacités agrégées des équipes et agrégat de satisfaction
+    NB_REQUETES = 6
+
+    def normaliser(self, analyse):
+        """L'ordre des listes d'étudiants dépendait de l'itération d'un set : on compare trié."""
+        for cle in ("aucun_voeu", "projets_satures"):
+            analyse["non_affectes"][cle].sort(key=lambda e: e["id"])
+        for cle in ("dupliquer_projets", "revoir_projets"):
+            analyse["suggestions"][cle].sort(key=lambda p: p["project_id"])
+        return analyse
+
+    def test_meme_resultat_que_la_reference(self):
+        generer_niveau("M1", n_etudiants=80, n_projets=6, seed=4)
+        attribution.affecter_projets("M1")
+        for algorithm in ("algo1", "algo2", "algo3"):
+            with self.subTest(algorithm=algorithm):
+                self.assertEqual(
+                    self.normaliser(analyser_affectations("M1", algorithm)),
+                    self.normaliser(analyser_affectations_reference("M1", algorithm)),
+                )
+
+    def test_nombre_de_requetes_constant(self):
+        for n_etudiants in (10, 10_000):
+            with self.subTest(n_etudiants=n_etudiants):
+                generer_niveau_en_masse("L3", n_etudiants, seed=n_etudiants)
+                reconstruire("L3")  # Insertions en masse : pas de signaux
+                with self.assertNumQueries(self.NB_REQUETES):
+                    analyse = analyser_affectations("L3", "algo1")
+                self.assertEqual(analyse["stats"]["total_students"], n_etudiants)
+                vider_niveaux()
+
+    def test_algorithme_inconnu(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username="admin", role="admin"))
+        response = client.get("/api/projects-assign/", {"level": "M1", "algorithm": "inconnu"})
+        self.assertEqual(response.status_code, 400)
+
+
+class SatisfactionAggregateTests(TestCase):
+    """L'agrégat de satisfaction tenu à jour par les signaux doit rester égal au recalcul complet."""
+
+    def assertAgregatAJour(self, level):
+        for methode, module in (("gale_shapley", gale_shapley_attribution), ("attribution", attribution)):
+            self.assertAlmostEqual(lire_satisfaction(level, methode), module.calculer_satisfaction(level))
+
+    def test_mises_a_jour_incrementales(self):
+        generer_niveau("M1", n_etudiants=40, n_projets=6, seed=5)
+        gale_shapley_attribution.affectation_projet("M1", seed=1)
+        self.assertAgregatAJour("M1")
+
+        # Affectations : création, changement de projet, suppression
+        voeu = Voeux.objects.filter(student__level="M1").exclude(
+            student__assignments__project=F("project")).first()
+        ProjectAssignment.objects.filter(student=voeu.student).delete()
+        self.assertAgregatAJour("M1")
+        affectation = ProjectAssignment.objects.create(student=voeu.student, project=voeu.project)
+        self.assertAgregatAJour("M1")
+        affectation.project = Project.objects.filter(level="M1").exclude(id=voeu.project_id).first()
+        affectation.save()
+        self.assertAgregatAJour("M1")
+        affectation.project = voeu.project
+        affectation.save()
+
+        # Vœux : modification, suppression et recréation d'un vœu affecté
+        voeu.note_preference = 20
+        voeu.save()
+        self.assertAgregatAJour("M1")
+        voeu.delete()
+        self.assertAgregatAJour("M1")
+        Voeux.objects.create(student=voeu.student, project=voeu.project, rank=1, note_preference=3)
+        self.assertAgregatAJour("M1")
+
+        # Date limite : un autre max_choice change tout le barème
+        Deadline.objects.filter(level="M1").update(max_choice=5)
+        deadline = Deadline.objects.get(level="M1")
+        deadline.max_choice = 6
+        deadline.save()
+        self.assertAgregatAJour("M1")
+
+        # Suppression en cascade d'un étudiant (vœux et affectation en même temps)
+        ProjectAssignment.objects.filter(project__level="M1").first().student.user.delete()
+        self.assertAgregatAJour("M1")
+
+        # Suppression en cascade d'un projet
+        Project.objects.filter(level="M1", assignments__isnull=False).first().delete()
+        self.assertAgregatAJour("M1")
+
+    def test_suppressions_en_masse_rapides(self):
+        """Aucun receveur de suppression : Django supprime en une requête, quel que soit le nombre de lignes."""
+        collecteur = Collector(using="default")
+        self.assertTrue(collecteur.can_fast_delete(ProjectAssignment.objects.all()))
+        self.assertTrue(collecteur.can_fast_delete(Voeux.objects.all()))
+
+        generer_niveau("M1", n_etudiants=40, n_projets=6, seed=5)
+        gale_shapley_attribution.affectation_projet("M1", seed=1)
+        lire_satisfaction("M1", "gale_shapley")
+        # Lectures des lignes et des vœux, suppression, existence de l'agrégat, mise à jour par barème
+        with self.assertNumQueries(6):
+            ProjectAssignment.objects.filter(project__level="M1", student_id__in=Student.objects.filter(
+                level="M1").order_by("id").values("id")[:20]).delete()
+        self.assertAgregatAJour("M1")
+        # Lectures des vœux et des affectations, suppression, existence de l'agrégat, mise à jour par barème
+        with self.assertNumQueries(6):
+            Voeux.objects.filter(student__level="M1", rank=1).delete()
+        self.assertAgregatAJour("M1")
+
+    def test_max_choice_abaisse_apres_les_voeux(self):
+        # Des vœux de rang 4 et 5 restent en base : le barème de l'algorithme glouton les rejette,
+        # mais les moteurs notés par le barème de Gale-Shapley doivent toujours aboutir
+        generer_niveau("M1", n_etudiants=40, n_projets=6, seed=5)
+        # Tous les vœux de cet étudiant sont au-delà du nouveau max_choice : son affectation les utilise forcément
+        etudiant = Student.objects.filter(level="M1", voeux__isnull=False).first()
+        Voeux.objects.filter(student=etudiant).update(rank=F("rank") + 3)
+        deadline = Deadline.objects.get(level="M1")
+        deadline.max_choice = 3
+        deadline.save()
+
+        for algorithm in ("algo1", "algo3", "algo4"):
+            with self.subTest(algorithm=algorithm):
+                result = lancer_affectation("M1", algorithm, seed=1)
+                self.assertEqual(result["assignments_count"], ProjectAssignment.objects.filter(project__level="M1").count())
+                self.assertAlmostEqual(result["satisfaction (%)"],
+                                       round(gale_shapley_attribution.calculer_satisfaction("M1"), 2))
+                if algorithm == "algo1":
+                    # L'agrégat incohérent est invalidé au lieu de faire échouer l'écriture
+                    self.assertTrue(ProjectAssignment.objects.filter(student=etudiant).exists())
+                    self.assertFalse(SatisfactionAggregate.objects.filter(level="M1").exists())
+
+    def test_cent_pour_cent_atteignable(self):
+        # Premier vœu avec la note maximale du barème : satisfaction de 100 % pour les deux méthodes
+        projets = generer_niveau("M1", n_etudiants=1, n_projets=5, seed=7)
+        etudiant = Student.objects.get(level="M1")
+        Voeux.objects.filter(student=etudiant).delete()
+        Voeux.objects.create(student=etudiant, project=projets[0], rank=1, note_preference=NOTE_PREFERENCE_MAX)
+        ProjectAssignment.objects.create(student=etudiant, project=projets[0])
+        # Le score maximal suit le max_choice du niveau
+        for max_choice in (5, 3, 8):
+            deadline = Deadline.objects.get(level="M1")
+            deadline.max_choice = max_choice
+            deadline.save()
+            for methode, module in (("gale_shapley", gale_shapley_attribution), ("attribution", attribution)):
+                with self.subTest(max_choice=max_choice, methode=methode):
+                    self.assertAlmostEqual(lire_satisfaction("M1", methode), 100)
+                    self.assertAlmostEqual(module.calculer_satisfaction("M1"), 100)
+
+    def test_commande_de_reconstruction(self):
+        generer_niveau("M2", n_etudiants=30, n_projets=5, seed=6)
+        gale_shapley_attribution.affectation_projet("M2", seed=2)
+        call_command("rebuild_satisfaction", "--level", "M2", "--check", stdout=StringIO())
+
+        SatisfactionAggregate.objects.filter(level="M2").update(total_score=0)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_satisfaction", "--level", "M2", "--check", stdout=StringIO())
+        call_command("rebuild_satisfaction", "--level", "M2", stdout=StringIO())
+        self.assertAgregatAJour("M2")
+
+
+class VoeuxAdminTests(TestCase):
+    """Liste admin des vœux : pagination par curseur, filtre par niveau et nombre de requêtes fixe."""
+
+    # Page d'étudiants, vœux de la page et projets non choisis
+    NB_REQUETES = 3
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username="admin", role="admin"))
+
+    def lire_toutes_les_pages(self, params):
+        response = self.client.get("/api/voeux/admin/", params)
+        self.assertEqual(response.status_code, 200)
+        etudiants, projets_non_choisis = list(response.data["results"]), response.data["unchoose_projects"]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            self.assertNotIn("unchoose_projects", response.data)
+            etudiants.extend(response.data["results"])
+        return etudiants, projets_non_choisis
+
+    def test_contenu_et_filtre_par_niveau(self):
+        generer_niveau("M1", n_etudiants=25, n_projets=6, seed=8)
+        generer_niveau("L3", n_etudiants=10, n_projets=5, seed=9)
+        Project.objects.create(code="VIDE", title="Sans vœu", description="", number_groups=1,
+                               supervisor=User.objects.get(username="admin"), level="M1")
+
+        etudiants, projets_non_choisis = self.lire_toutes_les_pages({"level": "M1", "page_size": 7})
+        self.assertEqual([e["id"] for e in etudiants],
+                         list(Student.objects.filter(level="M1").order_by("id").values_list("id", flat=True)))
+        for etudiant in etudiants:
+            attendus = list(Voeux.objects.filter(student_id=etudiant["id"]).order_by("rank")
+                            .values_list("project_id", "rank", "note_preference"))
+            self.assertEqual([(c["project"]["id"], c["rank"], c["note_preference"]) for c in etudiant["choices"]],
+                             attendus)
+        self.assertEqual(
+            {p["id"] for p in projets_non_choisis},
+            set(Project.objects.filter(level="M1", voeux__isnull=True).values_list("id", flat=True)),
+        )
+
+    def test_nombre_de_requetes_constant(self):
+        for n_etudiants in (10, 1000):
+            with self.subTest(n_etudiants=n_etudiants):
+                generer_niveau_en_masse("L3", n_etudiants, seed=n_etudiants)
+                with self.assertNumQueries(self.NB_REQUETES):
+                    response = self.client.get("/api/voeux/admin/", {"level": "L3", "page_size": 1000})
+                self.assertEqual(len(response.data["results"]), n_etudiants)
+                vider_niveaux()
+                self.client.force_authenticate(User.objects.create(username="admin", role="admin"))
+
+    def test_reserve_aux_administrateurs(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username="etudiant", role="student"))
+        self.assertEqual(client.get("/api/voeux/admin/").status_code, 403)
+
+    def test_liste_principale_paginee_pour_l_admin(self):
+        generer_niveau("M1", n_etudiants=25, n_projets=6, seed=8)
+
+        premiere = self.client.get("/api/voeux/", {"page_size": 10}).data
+        action_admin = self.client.get("/api/voeux/admin/", {"page_size": 10}).data
+        for cle in ("results", "unchoose_projects"):
+            self.assertEqual(premiere[cle], action_admin[cle])
+        self.assertIsNone(premiere["previous"])
+        self.assertIn("unchoose_projects", premiere)
+
+        pages, page = [premiere], premiere
+        while page["next"]:
+            self.assertTrue(page["next"].startswith("http://testserver/api/voeux/?"))
+            page = self.client.get(page["next"]).data
+            self.assertIsNotNone(page["previous"])
+            pages.append(page)
+        self.assertEqual([len(p["results"]) for p in pages], [10, 10, 5])
+        self.assertEqual([e["id"] for p in pages for e in p["results"]],
+                         list(Student.objects.order_by("id").values_list("id", flat=True)))
+
+        # Retour en arrière : la page précédente de la dernière est la deuxième
+        self.assertEqual(self.client.get(pages[-1]["previous"]).data["results"], pages[1]["results"])
+
+        # Un étudiant reçoit toujours la liste simple de ses vœux
+        etudiant = Student.objects.filter(voeux__isnull=False).first()
+        client = APIClient()
+        client.force_authenticate(etudiant.user)
+        self.assertEqual(len(client.get("/api/voeux/").data), etudiant.voeux.count())
+
+
+class ListesEnFluxTests(TestCase):
+    """?stream=1 doit produire exactement le même JSON que la réponse classique, au fil de l'eau."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username="admin", role="admin"))
+        projets = generer_niveau("M1", n_etudiants=30, n_projets=6, seed=10)
+        equipe = Team.objects.filter(project=projets[0]).first()
+        for etudiant in Student.objects.all()[:3]:
+            StudentsTeams.objects.create(student=etudiant, team=equipe)
+
+    def lire_flux(self, url):
+        response = self.client.get(url, {"stream": "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return json.loads(b"".join(response.streaming_content))
+
+    def test_meme_contenu_que_la_reponse_classique(self):
+        for url in ("/api/users/", "/api/projects-with-teams/"):
+            with self.subTest(url=url):
+                self.assertEqual(self.lire_flux(url), json.loads(self.client.get(url).content))
+
+    def test_export_des_voeux(self):
+        # Sans ?stream, la liste admin est paginée (voir VoeuxAdminTests) ; le flux exporte tous les vœux
+        self.assertEqual(
+            [(v["student"]["id"], v["project"]["id"]) for v in self.lire_flux("/api/voeux/")],
+            list(Voeux.objects.order_by("student", "rank").values_list("student_id", "project_id")),
+        )
+
+    def test_ndjson(self):
+        response = self.client.get("/api/users/", {"stream": "ndjson", "role": "student"})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lignes = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            [json.loads(ligne)["id"] for ligne in lignes],
+            list(User.objects.filter(role="student").values_list("id", flat=True)),
+        )
+
+
+class SoumissionVoeuxTests(TestCase):
+    """submit_voeux : validation complète avant écriture, remplacement atomique et requêtes en nombre fixe."""
+
+    def setUp(self):
+        self.projets = generer_niveau("M1", n_etudiants=5, n_projets=6, seed=11)
+        self.etudiant = Student.objects.filter(level="M1", voeux__isnull=False).distinct().first()
+        self.client = APIClient()
+        self.client.force_authenticate(self.etudiant.user)
+
+    def soumettre(self, voeux):
+        return self.client.post("/api/voeux/submit_voeux/", {"voeux": voeux}, format="json")
+
+    def voeux_en_base(self):
+        return list(Voeux.objects.filter(student=self.etudiant).order_by("rank")
+                    .values_list("project_id", "rank", "note_preference"))
+
+    def test_remplacement_complet(self):
+        voeux = [{"project_id": p.id, "rank": rang, "note_preference": str(10 - rang)}
+                 for rang, p in enumerate(self.projets[:5], start=1)]
+        response = self.soumettre(voeux)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("latency_ms", response.data)
+        self.assertEqual(self.voeux_en_base(), [(p.id, rang, 10 - rang) for rang, p in enumerate(self.projets[:5], start=1)])
+
+    def test_erreurs_sans_ecriture(self):
+        avant = self.voeux_en_base()
+        autre_niveau = generer_niveau("L3", n_etudiants=0, n_projets=1, seed=12)[0]
+        p = self.projets
+        cas = {
+            "projet inexistant": [{"project_id": p[0].id, "rank": 1, "note_preference": 5},
+                                  {"project_id": 999999, "rank": 2, "note_preference": 5}],
+            "autre niveau": [{"project_id": autre_niveau.id, "rank": 1, "note_preference": 5}],
+            "rang en double": [{"project_id": p[0].id, "rank": 1, "note_preference": 5},
+                               {"project_id": p[1].id, "rank": 1, "note_preference": 4}],
+            "rang hors barème": [{"project_id": p[0].id, "rank": 6, "note_preference": 5}],
+            "projet en double": [{"project_id": p[0].id, "rank": 1, "note_preference": 5},
+                                 {"project_id": p[0].id, "rank": 2, "note_preference": 4}],
+            "note nulle": [{"project_id": p[0].id, "rank": 1, "note_preference": 0}],
+            "note au-dessus du barème": [{"project_id": p[0].id, "rank": 1, "note_preference": 21}],
+            "champ manquant": [{"project_id": p[0].id, "rank": 1}],
+        }
+        for nom, voeux in cas.items():
+            with self.subTest(nom):
+                self.assertEqual(self.soumettre(voeux).status_code, 400)
+                self.assertEqual(self.voeux_en_base(), avant)
+
+    def test_notes_aux_bornes_du_modele(self):
+        for note in (NOTE_PREFERENCE_MIN, NOTE_PREFERENCE_MAX):
+            with self.subTest(note=note):
+                voeux = [{"project_id": self.projets[0].id, "rank": 1, "note_preference": note}]
+                self.assertEqual(self.soumettre(voeux).status_code, 200)
+                self.assertEqual(self.voeux_en_base(), [(self.projets[0].id, 1, note)])
+
+    def test_nombre_de_requetes_constant(self):
+        nombres = []
+        for n in (1, 5):
+            voeux = [{"project_id": p.id, "rank": rang, "note_preference": 5}
+                     for rang, p in enumerate(self.projets[:n], start=1)]
+            with CaptureQueriesContext(connection) as requetes:
+                self.assertEqual(self.soumettre(voeux).status_code, 200)
+            nombres.append(len(requetes))
+        self.assertEqual(nombres[0], nombres[1])
+
+    def test_satisfaction_a_jour_si_deja_affecte(self):
+        ProjectAssignment.objects.create(student=self.etudiant, project=self.projets[2])
+        reconstruire("M1")
+        response = self.soumettre([{"project_id": self.projets[2].id, "rank": 1, "note_preference": 20}])
+        self.assertEqual(response.status_code, 200)
+        self.assertAlmostEqual(lire_satisfaction("M1", "gale_shapley"), gale_shapley_attribution.calculer_satisfaction("M1"))
+
+
+class ParametresNiveauTests(TestCase):
+    """Cache par niveau des paramètres de vœux (Deadline) : succès, échecs, invalidation et expiration."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cache_et_invalidation(self):
+        self.assertEqual(parametres_niveau.max_choice("M1"), 5)  # Pas de Deadline : valeur par défaut
+        deadline = Deadline.objects.create(limite_date=date(2030, 1, 1), max_choice=4, level="M1")
+        Deadline.objects.create(limite_date=date(2030, 1, 1), max_choice=7, level="L3")
+
+        cache.clear()  # La création a déjà relu les paramètres (reconstruction de la satisfaction)
+        avant = parametres_niveau.statistiques()
+        with self.assertNumQueries(1):
+            self.assertEqual(parametres_niveau.max_choice("M1"), 4)
+            self.assertEqual(parametres_niveau.max_choice("M1"), 4)
+            self.assertEqual(parametres_niveau.date_limite("M1"), date(2030, 1, 1))
+        apres = parametres_niveau.statistiques()
+        self.assertEqual(apres["misses"] - avant["misses"], 1)
+        self.assertEqual(apres["hits"] - avant["hits"], 2)
+
+        deadline.max_choice = 3
+        deadline.save()
+        self.assertEqual(parametres_niveau.max_choice("M1"), 3)
+        self.assertEqual(parametres_niveau.max_choice("L3"), 7)
+
+        deadline.delete()
+        self.assertEqual(parametres_niveau.max_choice("M1"), 5)
+
+    @override_settings(DEADLINE_CACHE_TTL=0.05)
+    def test_expiration(self):
+        Deadline.objects.create(limite_date=date(2030, 1, 1), max_choice=4, level="M2")
+        self.assertEqual(parametres_niveau.max_choice("M2"), 4)
+        Deadline.objects.filter(level="M2").update(max_choice=6)  # update() ne déclenche pas les signaux
+        self.assertEqual(parametres_niveau.max_choice("M2"), 4)
+        time.sleep(0.1)
+        self.assertEqual(parametres_niveau.max_choice("M2"), 6)
+
+    def test_date_limite_par_niveau(self):
+        Deadline.objects.create(limite_date=date(2000, 1, 1), max_choice=5, level="L3")
+        projets = generer_niveau("M1", n_etudiants=1, n_projets=5, seed=13)
+        client = APIClient()
+        client.force_authenticate(Student.objects.get(level="M1").user)
+        voeux = [{"project_id": projets[0].id, "rank": 1, "note_preference": 5}]
+        # La date limite dépassée du niveau L3 ne bloque pas un étudiant de M1
+        self.assertEqual(client.post("/api/voeux/submit_voeux/", {"voeux": voeux}, format="json").status_code, 200)
+
+
+class RepartitionEquipesTests(TestCase):
+    """Répartition en équipes : min/max respectés, tailles équilibrées, nombre de requêtes fixe."""
+
+    # Transaction (2), affectations, équipes avec leur taille, membres existants, insertion en masse
+    NB_REQUETES = 6
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username="admin", role="admin"))
+
+    def test_quotas_equilibres_et_minimums(self):
+        # Équipe 1 déjà à 3, équipe 2 vide avec un minimum de 2 : le minimum passe d'abord, puis l'équilibrage
+        quotas, sans_place = equipes.calculer_quotas(5, [(1, 1, 5, 3), (2, 2, 5, 0), (3, 1, 5, 0)])
+        self.assertEqual(quotas, {1: 0, 2: 3, 3: 2})
+        self.assertEqual(sans_place, 0)
+
+        # Capacité dépassée : les étudiants en trop sont signalés
+        quotas, sans_place = equipes.calculer_quotas(7, [(1, 1, 2, 0), (2, 1, 3, 0)])
+        self.assertEqual(quotas, {1: 2, 2: 3})
+        self.assertEqual(sans_place, 2)
+
+    def test_rapport_de_faisabilite(self):
+        # 4 étudiants pour deux équipes de minimum 3 : une seule peut être complétée
+        placements, non_places, rapport = equipes.repartir_projet([1, 2, 3, 4], [(10, 3, 5, 0), (11, 3, 5, 1)])
+        self.assertEqual(len(placements), 4)
+        self.assertEqual(non_places, [])
+        self.assertEqual(len(rapport["equipes_sous_minimum"]), 1)
+        self.assertEqual(rapport["etudiants_manquants"], 1)
+
+    def test_regroupement_par_voeux(self):
+        voeux = {1: [7, 8], 2: [9, 7], 3: [7, 8], 4: [9, 7]}
+        placements, _, _ = equipes.repartir_projet([1, 2, 3, 4], [(10, 1, 2, 0), (11, 1, 2, 0)], voeux)
+        self.assertEqual(placements[1], placements[3])
+        self.assertEqual(placements[2], placements[4])
+
+    def test_etudiant_dans_deux_projets(self):
+        # L'étudiant 1 a une affectation en attente dans les projets 7 et 8 : une équipe dans chacun
+        placements, non_places, _ = equipes.repartir({7: [1, 2], 8: [1]}, {7: [(70, 1, 2, 0)], 8: [(80, 1, 2, 0)]})
+        self.assertEqual(placements, {(1, 7): 70, (2, 7): 70, (1, 8): 80})
+        self.assertEqual(non_places, {})
+
+        generer_niveau("M1", n_etudiants=1, n_projets=2, seed=15)
+        etudiant = Student.objects.get(level="M1")
+        for projet in Project.objects.filter(level="M1"):
+            ProjectAssignment.objects.create(student=etudiant, project=projet)
+        response = self.client.post("/api/assign-student-team/", {}, format="json")
+        self.assertEqual(len(response.data["assigned_students"]), 2)
+        self.assertEqual(StudentsTeams.objects.filter(student=etudiant).values("team__project").distinct().count(), 2)
+
+    def test_dix_mille_etudiants_en_moins_d_une_seconde(self):
+        rng = random.Random(0)
+        equipes_par_projet = {p: [(p * 10 + j, 2, 8, rng.randint(0, 2)) for j in range(5)] for p in range(400)}
+        etudiants_par_projet = {p: list(range(p * 25, (p + 1) * 25)) for p in range(400)}
+        voeux = {e: rng.sample(range(400), 5) for e in range(10_000)}
+        debut = time.perf_counter()
+        placements, _, _ = equipes.repartir(etudiants_par_projet, equipes_par_projet, voeux)
+        self.assertLess(time.perf_counter() - debut, 1)
+        self.assertEqual(len(placements), 10_000)
+
+    def test_vue_respecte_les_contraintes(self):
+        generer_niveau("M1", n_etudiants=60, n_projets=6, seed=14)
+        attribution.affecter_projets("M1")
+        deja_place = ProjectAssignment.objects.first()
+        StudentsTeams.objects.create(student=deja_place.student, team=deja_place.project.teams.first())
+
+        response = self.client.post("/api/assign-student-team/", {"cluster": True}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f"Student {deja_place.student.user.username} is already assigned to a team.",
+                      response.data["errors"])
+        self.assertEqual(StudentsTeams.objects.count(), ProjectAssignment.objects.count())
+        for team in Team.objects.annotate(taille=Count("members")):
+            self.assertLessEqual(team.taille, team.max_students)
+            if team.taille < team.min_students:
+                self.assertIn(team.project_id, response.data["feasibility"])
+
+    def test_nombre_de_requetes_constant(self):
+        for n_etudiants in (10, 2000):
+            with self.subTest(n_etudiants=n_etudiants):
+                generer_niveau_en_masse("L3", n_etudiants, n_projets=50, seed=n_etudiants)
+                with self.assertNumQueries(self.NB_REQUETES):
+                    response = self.client.post("/api/assign-student-team/", {}, format="json")
+                self.assertEqual(len(response.data["assigned_students"]), StudentsTeams.objects.count())
+                StudentsTeams.objects.all().delete()
+                ProjectAssignment.objects.all().delete()
+
+
+class GaleShapleyTests(TestCase):
+    """Boucle de Gale-Shapley à tas bornés (algo1), sur des données simples."""
+
+    def resoudre(self, voeux, equipes_par_projet, capacites):
+        # Les étudiants libres sont dépilés par la fin : le dernier de `voeux` propose en premier
+        return gale_shapley_attribution.gale_shapley(voeux, equipes_par_projet, dict(capacites), rng=random.Random(0))
+
+    def test_capacite_et_meilleurs_scores(self):
+        voeux = {e: [("P", 1, score)] for e, score in (("a", 3), ("b", 9), ("c", 5), ("d", 7), ("e", 1))}
+        equipe_de = self.resoudre(voeux, {"P": ["T"]}, {"T": 2})
+        self.assertEqual(equipe_de, {"b": "T", "d": "T"})
+
+    def test_eviction_du_score_le_plus_faible(self):
+        voeux = {
+            "fort": [("P", 1, 9)],
+            "moyen": [("P", 1, 6)],
+            "faible": [("P", 1, 4), ("Q", 2, 2)],
+        }
+        # « faible » et « moyen » remplissent P, puis « fort » évince « faible », qui passe à Q
+        equipe_de = self.resoudre(voeux, {"P": ["T"], "Q": ["U"]}, {"T": 2, "U": 1})
+        self.assertEqual(equipe_de, {"moyen": "T", "fort": "T", "faible": "U"})
+
+    def test_egalite_dernier_arrive_premier_evince(self):
+        voeux = {
+            "fort": [("P", 1, 9)],
+            "second": [("P", 1, 5), ("R", 2, 1)],
+            "premier": [("P", 1, 5), ("R", 2, 1)],
+        }
+        # « premier » puis « second » arrivent à score égal ; « fort » évince le dernier arrivé
+        equipe_de = self.resoudre(voeux, {"P": ["T"], "R": ["V"]}, {"T": 2, "V": 2})
+        self.assertEqual(equipe_de, {"premier": "T", "fort": "T", "second": "V"})
+
+        # Équipe pleine : un nouveau venu à score égal est refusé, il n'évince personne
+        voeux = {"tardif": [("P", 1, 5), ("R", 2, 1)], "occupant": [("P", 1, 5)]}
+        self.assertEqual(self.resoudre(voeux, {"P": ["T"], "R": ["V"]}, {"T": 1, "V": 1}),
+                         {"occupant": "T", "tardif": "V"})
+
+    def test_projet_sans_place_voeu_suivant(self):
+        voeux = {
+            "a": [("COMPLET", 1, 9), ("SANS_EQUIPE", 2, 8), ("Q", 3, 1)],
+            "b": [("COMPLET", 1, 9)],
+        }
+        # Aucune équipe libre ni aucune équipe du tout : passage au vœu suivant ; « b » reste libre
+        equipe_de = self.resoudre(voeux, {"COMPLET": ["T"], "Q": ["U"]}, {"T": 0, "U": 1})
+        self.assertEqual(equipe_de, {"a": "U"})
+
+    def test_une_seule_equipe_par_etudiant(self):
+        rng = random.Random(4)
+        projets = [f"P{i}" for i in range(6)]
+        equipes_par_projet = {p: [f"{p}-{j}" for j in range(2)] for p in projets}
+        capacites = {e: rng.randint(1, 3) for equipes_p in equipes_par_projet.values() for e in equipes_p}
+        voeux = {
+            e: [(p, rang, rng.randint(1, 10)) for rang, p in enumerate(rng.sample(projets, 3), start=1)]
+            for e in range(40)
+        }
+        equipe_de = self.resoudre(voeux, equipes_par_projet, capacites)
+        occupation = Counter(equipe_de.values())
+        self.assertTrue(all(occupation[e] <= capacite for e, capacite in capacites.items()))
+        for etudiant, equipe in equipe_de.items():
+            self.assertIn(equipe.split("-")[0], {p for p, _, _ in voeux[etudiant]})
+
+
+class GaleShapleyVectoriseTests(TestCase):
+    """Acceptation différée par tours (algo3) sur une petite cohorte construite à la main."""
+
+    # {étudiant: [(projet, note), ...]} dans l'ordre des vœux ; P0 est prioritaire
+    VOEUX = {
+        "s0": [("P0", 9), ("P1", 5)],
+        "s1": [("P0", 7), ("P1", 8), ("P2", 3)],
+        "s2": [("P1", 9), ("P2", 4)],
+        "s3": [("P1", 6), ("P3", 8)],
+        "s4": [("P2", 9), ("P1", 2)],
+        "s5": [("P1", 3), ("P2", 6), ("P3", 5)],
+        "s6": [("P3", 2), ("P2", 1)],
+    }
+    # Capacités des équipes de chaque projet : 6 places pour 7 étudiants
+    EQUIPES = {"P0": [1], "P1": [1, 1], "P2": [2], "P3": [1]}
+
+    def setUp(self):
+        cache.clear()
+        Deadline.objects.create(limite_date=date(2030, 1, 1), max_choice=3, level="L1")
+        superviseur = User.objects.create(username="sup-vec", role="supervisor")
+        self.projets = {}
+        for code, capacites in self.EQUIPES.items():
+            projet = Project.objects.create(code=code, title=code, description="", number_groups=len(capacites),
+                                            supervisor=superviseur, level="L1", priority=(code == "P0"))
+            for j, capacite in enumerate(capacites):
+                Team.objects.create(name=f"{code}-{j}", min_students=1, max_students=capacite, project=projet)
+            self.projets[code] = projet
+        for nom, voeux in self.VOEUX.items():
+            etudiant = Student.objects.create(user=User.objects.create(username=nom, role="student"), level="L1")
+            for rang, (code, note) in enumerate(voeux, start=1):
+                Voeux.objects.create(student=etudiant, project=self.projets[code], rank=rang, note_preference=note)
+
+    def test_resultat_valide_et_stable(self):
+        donnees = gale_shapley_vectorise.charger_donnees("L1")
+        scores, equipe_projet, capacites = donnees["scores"], donnees["equipe_projet"], donnees["capacites"]
+        prioritaire = self.projets["P0"].id
+        p0 = int(np.searchsorted(donnees["projet_ids"], prioritaire))
+
+        for seed in range(5):
+            with self.subTest(seed=seed):
+                equipe = gale_shapley_vectorise.resoudre(donnees, rng=np.random.default_rng(seed))
+                affectes = np.flatnonzero(equipe >= 0)
+                projet = np.full(len(equipe), -1)
+                projet[affectes] = equipe_projet[equipe[affectes]]
+
+                # Capacités respectées, uniquement des projets souhaités
+                self.assertTrue((np.bincount(equipe[affectes], minlength=len(capacites)) <= capacites).all())
+                self.assertTrue(np.isfinite(scores[affectes, projet[affectes]]).all())
+
+                # Le projet prioritaire prend son meilleur candidat (s0, premier vœu et meilleure note)
+                self.assertEqual(np.flatnonzero(projet == p0).tolist(), [int(np.argmax(scores[:, p0]))])
+
+                # Aucune paire bloquante hors projet prioritaire : chaque projet préféré est
+                # plein et ne garde que des étudiants de score au moins égal
+                places = np.bincount(equipe_projet, weights=capacites, minlength=len(donnees["projet_ids"]))
+                for e in np.flatnonzero(projet != p0):
+                    rang_obtenu = donnees["rangs"][e, projet[e]] if projet[e] >= 0 else np.inf
+                    for p in donnees["preferences"][e, :donnees["n_voeux"][e]]:
+                        if p == p0 or donnees["rangs"][e, p] >= rang_obtenu:
+                            continue
+                        occupants = np.flatnonzero(projet == p)
+                        self.assertEqual(len(occupants), places[p])
+                        self.assertTrue((scores[occupants, p] >= scores[e, p]).all())
+
+    def test_persistance_une_affectation_par_etudiant(self):
+        gale_shapley_vectorise.affectation_projet_vectorisee("L1", seed=3)
+        par_etudiant = Counter(ProjectAssignment.objects.values_list("student_id", flat=True))
+        self.assertEqual(len(par_etudiant), 6)
+        self.assertEqual(set(par_etudiant.values()), {1})
+        voeux = set(Voeux.objects.values_list("student_id", "project_id"))
+        self.assertLessEqual(set(ProjectAssignment.objects.values_list("student_id", "project_id")), voeux)
+
+
+class FlotCoutMinTests(TestCase):
+    """Moteur algo4 : affectation de score total maximal, capacités et projets prioritaires respectés."""
+
+    def score_total(self, donnees, affectations):
+        ligne = {int(e): i for i, e in enumerate(donnees["etudiant_ids"])}
+        colonne = {int(p): j for j, p in enumerate(donnees["projet_ids"])}
+        return sum(donnees["scores"][ligne[e], colonne[p]] for e, p in affectations.items())
+
+    def score_optimal_reference(self, donnees):
+        """Hongrois dense (linear_sum_assignment) sur la matrice étudiants × places, sans priorité."""
+        scores = donnees["scores"]
+        places = np.repeat(donnees["equipe_projet"], donnees["capacites"])
+        gains = np.where(np.isfinite(scores[:, places]), scores[:, places], 0)
+        lignes, colonnes = linear_sum_assignment(gains, maximize=True)
+        return gains[lignes, colonnes].sum()
+
+    def test_optimal_et_capacites(self):
+        for seed in (15, 16, 17):
+            with self.subTest(seed=seed):
+                vider_niveaux()
+                generer_niveau("M1", n_etudiants=70, n_projets=7, seed=seed)
+                Project.objects.update(priority=False)
+                donnees = flot_cout_min.charger_donnees("M1")
+                affectations = flot_cout_min.calculer_affectations(donnees)
+
+                self.assertEqual(self.score_total(donnees, affectations), self.score_optimal_reference(donnees))
+                capacites = Counter()
+                for _, projet, capacite in Team.objects.values_list("id", "project_id", "max_students"):
+                    capacites[projet] += capacite
+                for projet, n in Counter(affectations.values()).items():
+                    self.assertLessEqual(n, capacites[projet])
+
+    def test_borne_inferieure_des_projets_prioritaires(self):
+        generer_niveau("M1", n_etudiants=70, n_projets=7, seed=18)
+        donnees = flot_cout_min.charger_donnees("M1")
+        equipe = flot_cout_min.resoudre(donnees)
+        for p in donnees["projets_prioritaires"]:
+            premiere = np.flatnonzero(donnees["equipe_projet"] == p)[0]
+            candidats = np.isfinite(donnees["scores"][:, p]).sum()
+            self.assertEqual((equipe == premiere).sum(), min(candidats, donnees["capacites"][premiere]))
+
+    def test_via_l_api(self):
+        generer_niveau("M2", n_etudiants=30, n_projets=5, seed=19)
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username="admin", role="admin"))
+        response = client.post("/api/projects-assign/", {"level": "M2", "algorithm": "algo4"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertIn("solve_time", response.data["details"])
+        self.assertEqual(response.data["details"]["assignments_count"], ProjectAssignment.objects.count())
+
+
+class BenchAffectationTests(TestCase):
+    """Cohortes synthétiques (popularité de Zipf) et benchmark des moteurs, sans modifier la base."""
+
+    def test_cohorte_zipf(self):
+        cohorte = cohortes.generer_cohorte("L3", 2000, 20, equipes_par_projet=2, n_voeux=4, zipf=1.2, seed=1)
+        self.assertEqual(cohorte["voeux"], 8000)
+        self.assertEqual(Voeux.objects.filter(student__level="L3").count(), 8000)
+        self.assertEqual(Team.objects.filter(project__level="L3").count(), 40)
+        self.assertGreaterEqual(40 * cohorte["capacite_equipe"], 2000)
+
+        # Listes complètes, sans doublon, et popularité très inégale
+        par_etudiant = Counter(Voeux.objects.values_list("student_id", flat=True))
+        self.assertEqual(set(par_etudiant.values()), {4})
+        demandes = sorted(Counter(Voeux.objects.filter(rank=1).values_list("project_id", flat=True)).values())
+        self.assertGreater(demandes[-1], 10 * demandes[0])
+
+    def test_uniforme_sans_zipf(self):
+        popularites = cohortes.popularites_zipf(10, 0.0, np.random.default_rng(0))
+        self.assertTrue(np.allclose(popularites, 0.1))
+
+    def test_commande_json(self):
+        with tempfile.TemporaryDirectory() as dossier:
+            sortie = os.path.join(dossier, "bench.json")
+            call_command("bench_affectation", "--etudiants", "50", "120", "--level", "L3",
+                         "--sortie", sortie, stdout=StringIO())
+            with open(sortie, encoding="utf-8") as fichier:
+                rapport = json.load(fichier)
+
+        self.assertEqual(len(rapport["resultats"]), 2 * len(ALGORITHMES))
+        self.assertTrue(all(mesure["memoire_pic_mo"] > 0 for mesure in rapport["resultats"]))
+        for mesure in rapport["resultats"]:
+            self.assertGreater(mesure["requetes"], 0)
+            self.assertGreater(mesure["affectes"], 0)
+            self.assertTrue(0 <= mesure["satisfaction"] <= 100)
+            # Chaque moteur part d'un niveau sans affectation, même après les autres
+            self.assertEqual(mesure["ecritures"], {"created": mesure["affectes"], "updated": 0, "deleted": 0, "unchanged": 0})
+        # Tout a été annulé
+        self.assertFalse(Student.objects.exists())
+        self.assertFalse(Deadline.objects.exists())
+
+    def test_niveau_occupe(self):
+        generer_niveau("L3", n_etudiants=10, n_projets=5)
+        with self.assertRaises(CommandError):
+            call_command("bench_affectation", "--level", "L3", stdout=StringIO())
+
+
+class GenDataTests(TestCase):
+    """Générateur en masse : volumes répartis entre niveaux, mot de passe commun, préfixe et --reset."""
+
+    def test_generation(self):
+        call_command("gen_data", "--students", "101", "--projects", "20", "--teams-per-project", "3",
+                     "--levels", "M1", "M2", "--wishes", "4", stdout=StringIO())
+
+        self.assertEqual(Student.objects.filter(level="M1").count(), 51)
+        self.assertEqual(Student.objects.filter(level="M2").count(), 50)
+        self.assertEqual(Team.objects.count(), 60)
+        self.assertEqual(Voeux.objects.count(), 101 * 4)
+        self.assertFalse(Voeux.objects.exclude(project__level=F("student__level")).exists())
+
+        mots_de_passe = set(User.objects.values_list("password", flat=True))
+        self.assertEqual(len(mots_de_passe), 1)
+        self.assertTrue(User.objects.get(username="gen-M1-0").check_password("password"))
+
+    def test_prefixe_existant_et_reset(self):
+        arguments = ["gen_data", "--students", "30", "--projects", "10", "--levels", "L3"]
+        call_command(*arguments, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command(*arguments, stdout=StringIO())
+
+        call_command(*arguments, "--reset", "--students", "12", stdout=StringIO())
+        self.assertEqual(Student.objects.count(), 12)
+        self.assertEqual(Project.objects.count(), 10)
+
+    def test_prefixes_aux_memes_premieres_lettres(self):
+        # « gen » et « ge2 » donneraient les mêmes codes de projet « GEL3… »
+        call_command("gen_data", "--students", "10", "--projects", "5", "--levels", "L3", stdout=StringIO())
+        with self.assertRaisesMessage(CommandError, "GEL300000"):
+            call_command("gen_data", "--students", "10", "--projects", "5", "--levels", "L3", "--prefix", "ge2",
+                         stdout=StringIO())
+        self.assertFalse(User.objects.filter(username__startswith="ge2-").exists())
+
+        # Autre niveau, ou autres premières lettres : pas de conflit
+        call_command("gen_data", "--students", "10", "--projects", "5", "--levels", "M1", "--prefix", "ge2",
+                     stdout=StringIO())
+        call_command("gen_data", "--students", "10", "--projects", "5", "--levels", "L3", "--prefix", "xy",
+                     stdout=StringIO())
+        self.assertEqual(Project.objects.count(), 15)
+
+
+class MetriquesTests(TestCase):
+    """Middleware de mesure des requêtes et exposition au format de Prometheus."""
+
+    def setUp(self):
+        metriques.reinitialiser()
+        self.admin = User.objects.create(username="admin", role="admin")
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_mesures_par_vue(self):
+        generer_niveau("M1", n_etudiants=20, n_projets=5)
+        for _ in range(2):
+            self.client.get("/api/voeux/admin/", {"level": "M1"})
+
+        texte = self.client.get("/api/metrics/").content.decode()
+        vue = 'view="voeux-admin-voeux",method="GET"'
+        self.assertIn(f'http_requests_total{{{vue},status="200"}} 2', texte)
+        self.assertIn(f"http_request_sql_queries_count{{{vue}}} 2", texte)
+        self.assertIn(f"http_request_sql_queries_sum{{{vue}}} {2 * VoeuxAdminTests.NB_REQUETES}.0", texte)
+        self.assertIn(f'http_request_sql_queries_bucket{{{vue},le="+Inf"}} 2', texte)
+        self.assertIn("# TYPE http_request_duration_seconds histogram", texte)
+        self.assertIn('deadline_cache_requests_total{result="hit"}', texte)
+
+    def test_histogramme_cumulatif(self):
+        histogramme = metriques.Histogramme((1, 5, 10))
+        for valeur in (0, 1, 3, 7, 50):
+            histogramme.observer(valeur)
+        self.assertEqual(list(histogramme.cumuls()), [(1, 2), (5, 3), (10, 4), (float("inf"), 5)])
+        self.assertEqual(histogramme.somme, 61)
+
+    def test_reserve_aux_admins(self):
+        etudiant = User.objects.create(username="etudiant", role="student")
+        self.client.force_authenticate(etudiant)
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 403)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 401)
+
+
+class DetectionCyclesTests(TestCase):
+    """Cycles d'échange : composantes fortement connexes (Tarjan itératif) et extraction de cycles disjoints."""
+
+    def verifier_cycles(self, demandes, cycles):
+        par_id = {d[0]: d for d in demandes}
+        etudiants = [par_id[r][1] for cycle in cycles for r in cycle]
+        self.assertEqual(len(etudiants), len(set(etudiants)))  # cycles disjoints
+        for cycle in cycles:
+            for r, suivante in zip(cycle, cycle[1:] + cycle[:1]):
+                self.assertEqual(par_id[r][3], par_id[suivante][2])
+
+    def test_composantes(self):
+        composante = echanges.composantes_fortement_connexes({1: [2], 2: [3], 3: [1, 4], 4: [5], 5: [4], 6: [1]})
+        self.assertEqual(composante[1], composante[2])
+        self.assertEqual(composante[2], composante[3])
+        self.assertEqual(composante[4], composante[5])
+        self.assertEqual(len({composante[1], composante[4], composante[6]}), 3)
+
+    def test_plusieurs_demandes_par_equipe(self):
+        # Deux étudiants de A vers B et deux de B vers A : deux échanges (l'ancien code n'en voyait qu'un)
+        demandes = [(1, 10, "A", "B"), (2, 11, "A", "B"), (3, 12, "B", "A"), (4, 13, "B", "A"), (5, 14, "B", "C")]
+        cycles = echanges.detecter_cycles(demandes)
+        self.assertEqual(len(cycles), 2)
+        self.verifier_cycles(demandes, cycles)
+
+    def test_cycles_imbriques_avec_equipe_commune(self):
+        # L'étudiant 10 demande B -> C et C -> A, l'étudiant 20 A -> B et C -> B : le tour A -> B -> C -> A
+        # ferait bouger 10 deux fois, mais l'échange B <-> C (demandes 2 et 4) reste possible
+        demandes = [(1, 20, "A", "B"), (2, 10, "B", "C"), (3, 10, "C", "A"), (4, 20, "C", "B")]
+        cycles = echanges.detecter_cycles(demandes)
+        self.assertEqual(cycles, [[2, 4]])
+        self.verifier_cycles(demandes, cycles)
+
+        # Les mêmes demandes dans tous les ordres : l'échange est toujours trouvé
+        for ordre in itertools.permutations(demandes):
+            with self.subTest(ordre=[d[0] for d in ordre]):
+                self.assertEqual([sorted(c) for c in echanges.detecter_cycles(list(ordre))], [[2, 4]])
+
+    def test_sans_cycle_et_chemin_profond(self):
+        self.assertEqual(echanges.detecter_cycles([(1, 1, "A", "B"), (2, 2, "B", "C")]), [])
+        # Pas de récursion : un cycle de 50 000 équipes ne dépasse pas la pile
+        n = 50000
+        cycles = echanges.detecter_cycles([(i, i, i, (i + 1) % n) for i in range(n)])
+        self.assertEqual([len(c) for c in cycles], [n])
+
+    def test_un_etudiant_dans_un_seul_cycle(self):
+        rng = random.Random(0)
+        demandes = [(i, rng.randrange(300), rng.randrange(50), rng.randrange(50)) for i in range(2000)]
+        cycles = echanges.detecter_cycles(demandes)
+        self.assertTrue(cycles)
+        self.verifier_cycles(demandes, cycles)
+
+    def test_api_10000_demandes(self):
+        cohortes.generer_cohorte("M1", 10000, 100, equipes_par_projet=2, n_voeux=1)
+        rng = random.Random(1)
+        equipes_ids = list(Team.objects.values_list("id", flat=True))
+        ChangeRequest.objects.bulk_create([
+            ChangeRequest(student_id=etudiant, current_team_id=a, desired_team_id=b, reason="")
+            for etudiant in Student.objects.values_list("id", flat=True)
+            for a, b in [rng.sample(equipes_ids, 2)]
+        ])
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username="admin", role="admin"))
+        debut = time.perf_counter()
+        with self.assertNumQueries(1):
+            response = client.get("/api/change-requests/detect_cycles/")
+        self.assertLess(time.perf_counter() - debut, 10)
+
+        self.assertTrue(response.data["cycle_detected"])
+        self.assertEqual(response.data["cycle"], response.data["cycles"][0])
+        for cycle in response.data["cycles"]:
+            for demande, suivante in zip(cycle, cycle[1:] + cycle[:1]):
+                self.assertEqual(demande["desired_team"], suivante["current_team"])
+        etudiants = [d["student"] for cycle in response.data["cycles"] for d in cycle]
+        self.assertEqual(len(etudiants), len(set(etudiants)))
+
+
+class SolderMarcheTests(TestCase):
+    """Clearing des demandes : cycles et chaînes disjoints, capacités respectées, nombre maximal de demandes."""
+
+    def realisable(self, demandes, equipes):
+        solde = Counter()
+        for _, _, actuelle, souhaitee in demandes:
+            solde[souhaitee] += 1
+            solde[actuelle] -= 1
+        etudiants = [d[1] for d in demandes]
+        return len(etudiants) == len(set(etudiants)) and all(
+            -(taille - minimum) <= solde[t] <= maximum - taille for t, (taille, minimum, maximum) in equipes.items()
+        )
+
+    def test_cycle_et_chaine(self):
+        equipes = {"A": (3, 1, 4), "B": (3, 1, 3), "C": (3, 1, 3), "D": (3, 3, 3)}
+        # Échange B <-> C ; D -> B impossible (D passerait sous son minimum) ; chaîne C -> A vers la place libre
+        demandes = [(1, 10, "B", "C"), (2, 11, "C", "B"), (3, 12, "D", "B"), (4, 13, "C", "A")]
+        retenues = echanges.solder(demandes, equipes)
+        self.assertEqual(sorted(retenues), [1, 2, 4])
+
+    def test_optimal_sur_petits_cas(self):
+        from itertools import combinations
+        rng = random.Random(3)
+        for essai in range(30):
+            equipes = {t: (taille, rng.randint(1, taille), taille + rng.randint(0, 1))
+                       for t in range(5) for taille in [rng.randint(1, 3)]}
+            demandes = [(i, rng.randrange(8), rng.randrange(5), rng.randrange(5)) for i in range(9)]
+            retenues = echanges.solder(demandes, equipes)
+            choisies = [d for d in demandes if d[0] in retenues]
+            self.assertTrue(self.realisable(choisies, equipes))
+            utiles = [d for d in demandes if d[2] != d[3]]
+            meilleur = max(k for k in range(len(utiles) + 1)
+                           for sous_ensemble in combinations(utiles, k) if self.realisable(sous_ensemble, equipes))
+            self.assertEqual(len(retenues), meilleur, essai)
+
+    def test_api(self):
+        generer_niveau("M1", n_etudiants=4, n_projets=5, seed=20)
+        p1, p2 = Project.objects.filter(level="M1")[:2]
+        Team.objects.all().delete()
+        t1 = Team.objects.create(name="T1", min_students=1, max_students=2, project=p1)
+        t2 = Team.objects.create(name="T2", min_students=1, max_students=2, project=p2)
+        e1, e2, e3, e4 = Student.objects.filter(level="M1").order_by("id")
+        for etudiant, equipe in ((e1, t1), (e2, t1), (e3, t2), (e4, t2)):
+            StudentsTeams.objects.create(student=etudiant, team=equipe)
+            ProjectAssignment.objects.create(student=etudiant, project=equipe.project)
+        ChangeRequest.objects.create(student=e1, current_team=t1, desired_team=t2, reason="")
+        ChangeRequest.objects.create(student=e3, current_team=t2, desired_team=t1, reason="")
+        ChangeRequest.objects.create(student=e4, current_team=t2, desired_team=t1, reason="")
+        # Demande périmée : e2 n'est pas dans t2
+        ChangeRequest.objects.create(student=e2, current_team=t2, desired_team=t1, reason="")
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username="admin", role="admin"))
+        response = client.post("/api/change-requests/clear_market/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["requests_considered"], 3)
+        self.assertEqual(response.data["requests_satisfied"], 2)
+        self.assertIn("solve_time", response.data)
+
+        self.assertEqual(StudentsTeams.objects.get(student=e1).team, t2)
+        self.assertEqual(ProjectAssignment.objects.get(student=e1).project, p2)
+        self.assertEqual(ChangeRequest.objects.filter(status="approved").count(), 2)
+        for equipe in (t1, t2):
+            self.assertEqual(equipe.members.count(), 2)
+        self.assertEqual(ProjectAssignment.objects.filter(project=p1).count(), 2)
+        tenue_a_jour = lire_satisfaction("M1", "gale_shapley")
+        reconstruire("M1")
+        self.assertAlmostEqual(tenue_a_jour, lire_satisfaction("M1", "gale_shapley"))
+
+        client.force_authenticate(User.objects.create(username="etu", role="student"))
+        self.assertEqual(client.post("/api/change-requests/clear_market/").status_code, 403)
+
+
+class ApprobationCycleTests(TransactionTestCase):
+    """approve_cycle : tout ou rien, 409 en cas de conflit, y compris entre sessions concurrentes."""
+
+    def setUp(self):
+        generer_niveau("M1", n_etudiants=6, n_projets=5, seed=21)
+        p1, p2, p3 = Project.objects.filter(level="M1").order_by("id")[:3]
+        Team.objects.all().delete()
+        self.equipes = [Team.objects.create(name=f"T{i}", min_students=1, max_students=2, project=p)
+                        for i, p in enumerate((p1, p2, p3))]
+        self.etudiants = list(Student.objects.filter(level="M1").order_by("id"))
+        for i, etudiant in enumerate(self.etudiants):
+            equipe = self.equipes[i // 2]
+            StudentsTeams.objects.create(student=etudiant, team=equipe)
+            ProjectAssignment.objects.create(student=etudiant, project=equipe.project)
+
+        # Cycle T0 -> T1 -> T2 -> T0
+        t0, t1, t2 = self.equipes
+        e = self.etudiants
+        self.cycle = [
+            ChangeRequest.objects.create(student=e[0], current_team=t0, desired_team=t1, reason="").id,
+            ChangeRequest.objects.create(student=e[2], current_team=t1, desired_team=t2, reason="").id,
+            ChangeRequest.objects.create(student=e[4], current_team=t2, desired_team=t0, reason="").id,
+        ]
+        self.admin = User.objects.create(username="admin", role="admin")
+
+    def approuver(self, request_ids):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        return client.post("/api/change-requests/approve_cycle/", {"request_ids": request_ids}, format="json")
+
+    def test_cycle_approuve(self):
+        response = self.approuver(self.cycle)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["requests_approved"], 3)
+        e, (t0, t1, t2) = self.etudiants, self.equipes
+        self.assertEqual(StudentsTeams.objects.get(student=e[0]).team, t1)
+        self.assertEqual(StudentsTeams.objects.get(student=e[4]).team, t0)
+        # Le projet suit l'équipe (desired_project n'était plus ignoré)
+        self.assertEqual(ProjectAssignment.objects.get(student=e[2]).project, t2.project)
+        self.assertEqual(ChangeRequest.objects.filter(status="approved").count(), 3)
+        for equipe in self.equipes:
+            self.assertEqual(equipe.members.count(), 2)
+
+    def test_conflits(self):
+        # Pas un cycle : rien n'est appliqué
+        self.assertEqual(self.approuver(self.cycle[:2]).status_code, 409)
+        self.assertFalse(ChangeRequest.objects.exclude(status="pending").exists())
+        self.assertEqual(StudentsTeams.objects.get(student=self.etudiants[0]).team, self.equipes[0])
+
+        # Étudiant qui a changé d'équipe depuis sa demande
+        StudentsTeams.objects.filter(student=self.etudiants[2]).update(team=self.equipes[0])
+        self.assertEqual(self.approuver(self.cycle).status_code, 409)
+        StudentsTeams.objects.filter(student=self.etudiants[2]).update(team=self.equipes[1])
+
+        self.assertEqual(self.approuver(self.cycle).status_code, 200)
+        response = self.approuver(self.cycle)
+        self.assertEqual(response.status_code, 409)
+        self.assertIn("déjà traitée", response.data["error"])
+        self.assertEqual(self.approuver(["x"]).status_code, 400)
+
+    def test_approbations_concurrentes(self):
+        n = 4
+        barriere = threading.Barrier(n)
+        statuts = []
+
+        def session():
+            try:
+                barriere.wait()
+                statuts.append(self.approuver(self.cycle).status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=session) for _ in range(n)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Au plus une session applique l'échange, les autres reçoivent 409. Sous SQLite
+        # (verrous de table, sans attente en mémoire partagée), toutes peuvent échouer :
+        # rien n'est alors appliqué et une nouvelle tentative réussit.
+        self.assertEqual(len(statuts), n)
+        self.assertLessEqual(statuts.count(200), 1)
+        self.assertEqual(statuts.count(409), n - statuts.count(200))
+        if 200 not in statuts:
+            self.assertFalse(ChangeRequest.objects.exclude(status="pending").exists())
+            self.assertEqual(self.approuver(self.cycle).status_code, 200)
+
+        self.assertEqual(ChangeRequest.objects.filter(status="approved").count(), 3)
+        for equipe in self.equipes:
+            self.assertEqual(equipe.members.count(), 2)
+        self.assertEqual(ProjectAssignment.objects.count(), 6)
+
+
+class ReaffectationIncrementaleTests(TestCase):
+    """Réaffectation incrémentale : seules les affectations invalidées sont recalculées."""
+
+    def test_selection_des_affectations_conservees(self):
+        existantes = [(1, 10), (2, 10), (3, 10), (4, 11), (5, 12), (6, 13), (7, 13), (8, 11)]
+        voeux = {1: {10: 5}, 2: {10: 3}, 3: {10: 9}, 4: {11: 1}, 5: {12: 2}, 6: {13: 1}, 7: {14: 4}, 9: {10: 1}}
+        capacites = {10: 2, 11: 1, 13: 2}  # Le projet 12 a été supprimé
+        conservees, a_replacer = reaffectation.selectionner(existantes, voeux, {4}, capacites, {(2, 10)})
+
+        # 1 sort du projet 10 (score le plus faible, 2 est protégé), 4 a modifié ses vœux,
+        # 7 a retiré le projet 13 de ses vœux, 8 n'a aucun vœu et garde son affectation
+        self.assertEqual(conservees, {2: 10, 3: 10, 6: 13, 8: 11})
+        self.assertEqual(a_replacer, {1, 4, 5, 7, 9})
+        self.assertEqual(
+            reaffectation.places_restantes([(101, 10, 3), (100, 10, 1), (102, 13, 1)], conservees),
+            {100: 0, 101: 2, 102: 0},
+        )
+
+    def test_reparation_apres_modifications(self):
+        for algorithm, level in (("algo1", "M1"), ("algo2", "M2")):
+            with self.subTest(algorithm=algorithm):
+                projets = generer_niveau(level, n_etudiants=80, n_projets=10, seed=11)
+                lancer_affectation(level, algorithm, seed=1)
+                avant = {
+                    student_id: (id_, project_id)
+                    for id_, student_id, project_id in ProjectAssignment.objects.filter(project__level=level)
+                    .values_list("id", "student_id", "project_id")
+                }
+                occupants = defaultdict(list)
+                for student_id, (_, project_id) in sorted(avant.items()):
+                    occupants[project_id].append(student_id)
+                pleins = sorted((p for p in occupants if len(occupants[p]) >= 2), key=lambda p: len(occupants[p]))
+                reduit, supprime = pleins[-1], pleins[-2]
+                autres = [e for p, liste in occupants.items() if p not in (reduit, supprime) for e in liste]
+                approuve, modifie = autres[0], autres[1]
+
+                # Affectation validée, vœux soumis à nouveau, projet supprimé,
+                # équipe réduite d'une place et nouvel étudiant
+                ProjectAssignment.objects.filter(student_id=approuve).update(status="approved")
+                Voeux.objects.filter(student_id=modifie).delete()
+                Voeux.objects.bulk_create([
+                    Voeux(student_id=modifie, project=p, rank=rang, note_preference=5)
+                    for rang, p in enumerate([p for p in projets if p.id != supprime][:3], start=1)
+                ])
+                Project.objects.filter(id=supprime).delete()
+                Team.objects.filter(project_id=reduit).update(max_students=0)
+                equipe = Team.objects.filter(project_id=reduit).first()
+                equipe.max_students = len(occupants[reduit]) - 1
+                equipe.save()
+                nouveau = Student.objects.create(user=User.objects.create(username=f"nouveau-{level}"), level=level)
+                Voeux.objects.create(student=nouveau, project=projets[1], rank=1, note_preference=7)
+
+                result = lancer_affectation(level, algorithm, seed=1, incremental=True)
+
+                invalides = {modifie, *occupants[supprime]}
+                avec_voeux = set(Voeux.objects.filter(student__level=level).values_list("student_id", flat=True))
+                self.assertEqual(result["mode"], "incremental")
+                self.assertEqual(result["students_touched"], len(avec_voeux - (set(avant) - invalides)) + 1)
+                self.assertEqual(result["students_kept"], len(avant) - len(invalides) - 1)
+                self.assertIn("duration", result)
+                self.assertTrue(AssignmentRun.objects.filter(level=level, incremental=True, status="done").exists())
+
+                apres = {a.student_id: a for a in ProjectAssignment.objects.filter(project__level=level)}
+                # Les affectations valides restent en place, ligne et statut compris ; une seule sort du projet réduit
+                gardees = [
+                    e for e in set(avant) - invalides
+                    if e in apres and (apres[e].id, apres[e].project_id) == avant[e]
+                ]
+                self.assertEqual(len(gardees), len(avant) - len(invalides) - 1)
+                self.assertEqual(apres[approuve].status, "approved")
+                self.assertEqual(result["persistance"]["unchanged"], len(gardees))
+                for project_id, places in Team.objects.filter(project__level=level).values_list("project_id") \
+                        .annotate(places=Sum("max_students")):
+                    self.assertLessEqual(sum(a.project_id == project_id for a in apres.values()), places)
+
+    def test_mode_incremental_indisponible(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username="admin", role="admin"))
+        generer_niveau("M1", n_etudiants=10, seed=2)
+        for donnees in ({"level": "M1", "algorithm": "algo3", "incremental": True},
+                        {"level": "all", "algorithm": "algo1", "incremental": True}):
+            with self.subTest(donnees=donnees):
+                self.assertEqual(client.post("/api/projects-assign/", donnees, format="json").status_code, 400)
+
+
+class MatchingProblemTests(TestCase):
+    """Problème d'affectation partagé : trois requêtes, indices denses et vœux au format CSR."""
+
+    def test_chargement(self):
+        generer_niveau("M1", n_etudiants=50, seed=4)
+        parametres_niveau.max_choice("M1")  # Cache des paramètres chaud
+        with self.assertNumQueries(3):
+            pb = probleme.charger("M1")
+
+        voeux = defaultdict(list)
+        for student_id, project_id, rank, note in Voeux.objects.filter(student__level="M1").order_by("rank") \
+                .values_list("student_id", "project_id", "rank", "note_preference"):
+            voeux[student_id].append((project_id, rank, note))
+        self.assertEqual(pb.etudiant_ids.tolist(), sorted(voeux))
+        projet_ids = pb.projet_ids.tolist()
+        for i, student_id in enumerate(pb.etudiant_ids.tolist()):
+            tranche = slice(pb.debut[i], pb.debut[i + 1])
+            self.assertEqual(
+                list(zip([projet_ids[p] for p in pb.voeux_projet[tranche]], pb.voeux_rang[tranche].tolist(),
+                         pb.voeux_note[tranche].tolist())),
+                voeux[student_id],
+            )
+        self.assertEqual(
+            pb.equipes_en_base(),
+            list(Team.objects.filter(project__level="M1").order_by("id").values_list("id", "project_id", "max_students")),
+        )
+        self.assertEqual(
+            pb.projets_prioritaires_en_base(),
+            list(Project.objects.filter(level="M1", priority=True).order_by("id").values_list("id", flat=True)),
+        )
+        self.assertEqual(pb.statistiques["voeux"], Voeux.objects.count())
+        self.assertGreater(pb.statistiques["memoire_octets"], 0)
+        self.assertIn("chargement_s", pb.statistiques)
+        self.assertFalse(hasattr(pb, "__dict__"))
+
+        # Transmissible aux processus de `parallele`, et les deux moteurs tournent dessus
+        copie = pickle.loads(pickle.dumps(pb))
+        self.assertEqual(copie.voeux_projet.tolist(), pb.voeux_projet.tolist())
+        for moteur in (attribution, gale_shapley_attribution):
+            with self.subTest(moteur=moteur.__name__):
+                affectations = moteur.calculer_affectations(copie, seed=1)
+                self.assertEqual(affectations, moteur.calculer_affectations(pb, seed=1))
+                self.assertTrue(all(p in {v[0] for v in voeux[e]} for e, p in affectations.items()))
+
+    def test_restriction(self):
+        generer_niveau("M1", n_etudiants=30, seed=6)
+        pb = probleme.charger("M1")
+        etudiants = set(pb.etudiant_ids.tolist()[::3])
+        places = {equipe.id: 1 for equipe in pb.equipes[:2]}
+        sous_probleme = pb.restreindre(etudiants, places, set())
+
+        self.assertEqual(set(sous_probleme.etudiant_ids.tolist()), etudiants)
+        self.assertEqual(sous_probleme.debut[-1], len(sous_probleme.voeux_projet))
+        self.assertEqual(len(sous_probleme.prioritaires), 0)
+        affectations = gale_shapley_attribution.calculer_affectations(sous_probleme, seed=2)
+        self.assertLessEqual(set(affectations), etudiants)
+        self.assertLessEqual(len(affectations), 2)
 
-# Create your tests here.
@@ -1,20 +1,26 @@
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Count, F
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from collections import defaultdict
-import itertools
-from ges_project_app.models import StudentsTeams, ProjectAssignment, Student, Team
+from ges_project_app.models import StudentsTeams, ProjectAssignment, Student, Team, Voeux
+from ges_project_app.attribution import equipes
 
 class AssignStudentsToTeamsView(APIView):
     """
     API permettant d'affecter automatiquement les étudiants validés à une équipe
     dans leur projet respectif en respectant les contraintes et en équilibrant
     le nombre d'étudiants par équipe.
+    Options : "reset" (vider les équipes avant) et "cluster" (regrouper les
+    étudiants aux vœux proches). "feasibility" décrit, par projet, les équipes
+    dont le minimum ne peut pas être atteint et les étudiants sans place.
     """
     permission_classes = [IsAuthenticated]
 
+    @transaction.atomic  # Réinitialisation, lectures et insertion : tout ou rien
     def post(self, request):
         user = request.user
 
@@ -27,53 +33,85 @@ class AssignStudentsToTeamsView(APIView):
         if reset:
             StudentsTeams.objects.all().delete() 
 
-        # Récupérer toutes les affectations validées
-        assignments = ProjectAssignment.objects.filter(status="pending")
+        # Récupérer toutes les affectations validées (1 requête, nom d'utilisateur compris)
+        assignments = list(
+            ProjectAssignment.objects.filter(status="pending").order_by("id")
+            .values_list("student_id", "student__user__username", "project_id")
+        )
 
-        if not assignments.exists():
+        if not assignments:
             return Response({"message": "No students to assign."}, status=status.HTTP_200_OK)
 
-        assigned_students = []
-        errors = []
-
         # Organiser les étudiants par projet
         students_by_project = defaultdict(list)
-        for assignment in assignments:
-            students_by_project[assignment.project.id].append(assignment.student)
+        usernames = {}
+        for student_id, username, project_id in assignments:
+            students_by_project[project_id].append(student_id)
+            usernames[student_id] = username
 
-        # Traiter chaque projet séparément
-        for project_id, students in students_by_project.items():
-            project_teams = Team.objects.filter(project_id=project_id).annotate(
-                current_size=Count("members")
-            ).order_by("current_size")
+        # Équipes de ces projets avec leur taille actuelle (1 requête)
+        teams_by_project = defaultdict(list)
+        team_names = {}
+        teams = (
+            Team.objects.filter(project_id__in=students_by_project)
+            .annotate(current_size=Count("members"))
+            .order_by("id")
+            .values_list("id", "name", "min_students", "max_students", "current_size", "project_id")
+        )
+        for team_id, name, min_students, max_students, current_size, project_id in teams:
+            teams_by_project[project_id].append((team_id, min_students, max_students, current_size))
+            team_names[team_id] = name
 
-            # Vérifier s'il y a des équipes disponibles
-            if not project_teams.exists():
+        # Étudiants déjà membres d'une équipe de ces projets (1 requête)
+        already_in_team = set(
+            StudentsTeams.objects.filter(team__project_id__in=students_by_project)
+            .values_list("student_id", "team__project_id")
+        )
+
+        errors = []
+        to_place = defaultdict(list)
+        for project_id, students in students_by_project.items():
+            if not teams_by_project[project_id]:
                 errors.append(f"No teams found for project {project_id}.")
                 continue
+            for student_id in students:
+                # Vérifier si l'étudiant est déjà affecté à une équipe pour ce projet
+                if (student_id, project_id) in already_in_team:
+                    errors.append(f"Student {usernames[student_id]} is already assigned to a team.")
+                else:
+                    to_place[project_id].append(student_id)
 
-            # Trier les étudiants et répartir de manière équilibrée dans les équipes
-            teams_cycle = itertools.cycle(project_teams)  # Tourner sur les équipes disponibles
+        # Option : regrouper les étudiants aux vœux proches (1 requête de plus)
+        wishes = None
+        if request.data.get("cluster", False):
+            wishes = defaultdict(list)
+            for student_id, project_id in (
+                Voeux.objects.filter(student_id__in=usernames).order_by("student_id", "rank")
+                .values_list("student_id", "project_id")
+            ):
+                wishes[student_id].append(project_id)
 
-            for student in students:
-                # Vérifier si l'étudiant est déjà affecté à une équipe pour ce projet
-                if StudentsTeams.objects.filter(student=student, team__project_id=project_id).exists():
-                    errors.append(f"Student {student.user.username} is already assigned to a team.")
-                    continue
+        # Répartition équilibrée entièrement en mémoire (min/max des équipes respectés)
+        placements, unplaced, feasibility = equipes.repartir(to_place, teams_by_project, wishes)
 
-                for _ in range(len(project_teams)):  # Éviter boucle infinie
-                    team = next(teams_cycle)
+        assigned_students = [
+            f"Student {usernames[student_id]} assigned to {team_names[team_id]}."
+            for (student_id, _), team_id in placements.items()
+        ]
+        for project_id, students in unplaced.items():
+            errors.extend(
+                f"No available team for student {usernames[student_id]} in project {project_id}."
+                for student_id in students
+            )
 
-                    # Vérifier que l'équipe n'a pas atteint sa capacité maximale
-                    if team.current_size < team.max_students:
-                        StudentsTeams.objects.create(student=student, team=team)
-                        assigned_students.append(f"Student {student.user.username} assigned to {team.name}.")
-                        team.current_size += 1  # Mettre à jour la taille de l'équipe
-                        break
-                else:
-                    errors.append(f"No available team for student {student.user.username} in project {project_id}.")
+        # Écriture en une seule insertion (par lots pour les très gros volumes)
+        StudentsTeams.objects.bulk_create(
+            [StudentsTeams(student_id=student_id, team_id=team_id) for (student_id, _), team_id in placements.items()],
+            batch_size=getattr(settings, "ASSIGNMENT_BATCH_SIZE", 500),
+        )
 
         return Response({
             "assigned_students": assigned_students,
-            "errors": errors
-        }, status=status.HTTP_200_OK)
\ No newline at end of file
+            "errors": errors,
+            "feasibility": feasibility
+        }, status=status.HTTP_200_OK)
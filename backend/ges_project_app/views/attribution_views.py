@@ -2,8 +2,11 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from collections import defaultdict
-from ges_project_app.models import ProjectAssignment, Student, Project
-from ges_project_app.attribution import attribution, gale_shapley_attribution, analyser_affectation
+from ges_project_app.models import ProjectAssignment, Student, Project, AssignmentRun
+from ges_project_app.attribution import analyser_affectation
+from ges_project_app.attribution.moteurs import lancer_affectation, AlgorithmeInconnu, GRAINE_MAX
+from ges_project_app.attribution.taches import soumettre_affectation
+from ges_project_app.attribution.parallele import affecter_tous_niveaux
 from .permissions import IsAdmin,IsAdminUser    
 
 class ProjectAssignmentView(APIView):
@@ -13,6 +16,7 @@ class ProjectAssignmentView(APIView):
     def post(self, request, format=None):
         """
         Lancer l'affectation des étudiants aux projets.
+        Avec level="all", tous les niveaux sont calculés en parallèle.
         """
         try:
             level = request.data.get("level")
@@ -24,16 +28,29 @@ class ProjectAssignmentView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            if algorithm == "algo1":
-                result = gale_shapley_attribution.affectation_projet(level=level)
-            elif algorithm == "algo2":
-                result = attribution.affecter_projets(level=level)
-            else:
+            try:
+                seed = lire_seed(request)  # Optionnelle : permet de rejouer une affectation
+            except (TypeError, ValueError):
                 return Response(
-                    {"error": f"Algorithme inconnu : {algorithm}"},
+                    {"error": f"Le paramètre 'seed' doit être un entier entre 0 et {GRAINE_MAX - 1}."},
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
+            incremental = lire_incremental(request)
+            if incremental and level == "all":
+                return Response(
+                    {"error": "Le mode incrémental se lance niveau par niveau."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            try:
+                if level == "all":
+                    result = affecter_tous_niveaux(algorithm, seed=seed)
+                else:
+                    result = lancer_affectation(level, algorithm, seed=seed, incremental=incremental)
+            except AlgorithmeInconnu as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
             return Response(
                 {"message": "Affectation terminée avec succès.", "details": result},
                 status=status.HTTP_201_CREATED
@@ -59,7 +76,10 @@ class ProjectAssignmentView(APIView):
                 )
 
 
-            analyse = analyser_affectation.analyser_affectations(level, algorithm = algorithm)
+            try:
+                analyse = analyser_affectation.analyser_affectations(level, algorithm=algorithm)
+            except AlgorithmeInconnu as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
             return Response(analyse, status=status.HTTP_200_OK)
 
@@ -67,4 +87,82 @@ class ProjectAssignmentView(APIView):
             return Response(
                 {"error": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+
+def lire_seed(request):
+    """Lit le paramètre optionnel 'seed' ; lève ValueError s'il n'est pas entier ou hors de [0, 2**32[."""
+    seed = request.data.get("seed")
+    if seed is None:
+        return None
+    seed = int(seed)
+    if not 0 <= seed < GRAINE_MAX:
+        raise ValueError(seed)
+    return seed
+
+
+def lire_incremental(request):
+    """Lit le paramètre optionnel 'incremental' (booléen JSON ou chaîne de formulaire)."""
+    return str(request.data.get("incremental", False)).lower() in ("true", "1")
+
+
+def job_data(run):
+    return {
+        "id": run.id,
+        "level": run.level,
+        "algorithm": run.algorithm,
+        "seed": run.seed,
+        "incremental": run.incremental,
+        "status": run.status,
+        "progress": run.progress,
+        "timings": run.timings,
+        "result": run.details if run.status == "done" else None,
+        "error": run.error or None,
+        "created_at": run.created_at,
+        "started_at": run.started_at,
+        "finished_at": run.finished_at,
+    }
+
+
+class AssignmentJobView(APIView):
+    """
+    Lance une affectation en arrière-plan : la requête rend la main tout de suite
+    avec l'identifiant de la tâche, à suivre ensuite avec AssignmentJobDetailView.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, format=None):
+        level = request.data.get("level")
+        algorithm = request.data.get("algorithm", "algo1")
+
+        if level is None:
+            return Response(
+                {"error": "Le paramètre 'level' est requis."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            seed = lire_seed(request)
+        except (TypeError, ValueError):
+            return Response(
+                {"error": f"Le paramètre 'seed' doit être un entier entre 0 et {GRAINE_MAX - 1}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            run = soumettre_affectation(level, algorithm, seed=seed, incremental=lire_incremental(request))
+        except AlgorithmeInconnu as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(job_data(run), status=status.HTTP_202_ACCEPTED)
+
+
+class AssignmentJobDetailView(APIView):
+    """État, avancement, durées et résultat d'une tâche d'affectation."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, pk, format=None):
+        try:
+            run = AssignmentRun.objects.get(pk=pk)
+        except AssignmentRun.DoesNotExist:
+            return Response({"error": "Tâche introuvable."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job_data(run), status=status.HTTP_200_OK)
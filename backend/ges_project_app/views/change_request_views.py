@@ -2,11 +2,11 @@ from rest_framework import viewsets, permissions
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
 from rest_framework.decorators import action
-from .permissions import IsAdmin
+from .permissions import IsAdmin, IsAdminUser
 from ges_project_app.models import ChangeRequest, StudentsTeams, ProjectAssignment
+from ges_project_app.attribution import echanges
 from ges_project_app.serializers.change_request_serializer import ChangeRequestSerializer
 from django.utils.timezone import now
-from collections import defaultdict
 
 
 class ChangeRequestViewSet(viewsets.ModelViewSet):
@@ -78,76 +78,84 @@ class ChangeRequestViewSet(viewsets.ModelViewSet):
         instance.save()
         return Response({"message": "Demande traitée avec succès."})
     
+    def details_demande(self, req):
+        if req.current_team_id is not None and req.desired_team_id is not None:
+            return {
+                "student": req.student.user.username,
+                "current_team": req.current_team.name,
+                "desired_team": req.desired_team.name,
+                "request_id": req.id,
+            }
+        return {
+            "student": req.student.user.username,
+            "current_project": req.current_project.title,
+            "desired_project": req.desired_project.title,
+            "request_id": req.id,
+        }
+
     @action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated])
     def detect_cycles(self, request):
-        change_requests = ChangeRequest.objects.filter(status="pending")
-
-        graph = defaultdict(list)
-        team_to_student = {}
-        for req in change_requests:
-            if req.current_team is not None and req.desired_team is not None:
-                graph[req.current_team.id].append(req.desired_team.id)
-                team_to_student[req.current_team.id] = {
-                    "student": req.student.user.username,
-                    "current_team": req.current_team.name,
-                    "desired_team": req.desired_team.name,
-                    "request_id": req.id,
-                }
-                
-            elif req.current_project is not None   and req.desired_project is not None :
-                graph[req.current_project.id].append(req.desired_project.id)
-                team_to_student[req.current_project.id] = {
-                    "student": req.student.user.username,
-                    "current_project": req.current_project.title,
-                    "desired_project": req.desired_project.title,
-                    "request_id": req.id,
-                }
-
-        visited = set()
-        stack = []
-
-        def dfs(node, start):
-            if node in stack:
-                cycle = stack[stack.index(node):] + [node]
-                return cycle
-            if node in visited:
-                return None
-            visited.add(node)
-            stack.append(node)
-            for neighbor in graph.get(node, []):
-                cycle = dfs(neighbor, start)
-                if cycle:
-                    return cycle
-            stack.pop()
-            return None
-
-        for team_id in graph:
-            visited.clear()
-            stack.clear()
-            cycle = dfs(team_id, team_id)
-            if cycle:
-                cycle_details = [team_to_student[tid] for tid in cycle if tid in team_to_student]
-            return Response({"cycle_detected": True, "cycle": cycle_details})
-
-        return Response({"cycle_detected": False})
+        """
+        Tous les cycles d'échange disjoints parmi les demandes en attente (équipe vers
+        équipe, ou à défaut projet vers projet), en une requête et en temps linéaire.
+        "cycle" reste le premier cycle trouvé ; "cycles" les contient tous.
+        """
+        change_requests = {
+            req.id: req
+            for req in ChangeRequest.objects.filter(status="pending").select_related(
+                "student__user", "current_team", "desired_team", "current_project", "desired_project"
+            )
+        }
+
+        demandes = []
+        for req in change_requests.values():
+            if req.current_team_id is not None and req.desired_team_id is not None:
+                demandes.append((req.id, req.student_id, ("team", req.current_team_id), ("team", req.desired_team_id)))
+            elif req.current_project_id is not None and req.desired_project_id is not None:
+                demandes.append((req.id, req.student_id, ("project", req.current_project_id), ("project", req.desired_project_id)))
+
+        cycles = [
+            [self.details_demande(change_requests[request_id]) for request_id in cycle]
+            for cycle in echanges.detecter_cycles(demandes)
+        ]
+        if not cycles:
+            return Response({"cycle_detected": False, "cycles": []})
+        return Response({"cycle_detected": True, "cycle": cycles[0], "cycles": cycles})
     
-    @action(detail=False, methods=["post"], permission_classes=[permissions.IsAuthenticated])
+    @action(detail=False, methods=["post"], permission_classes=[IsAdminUser])
+    def clear_market(self, request):
+        """
+        Approuve d'un coup l'ensemble maximal de demandes de changement d'équipe
+        compatibles (cycles d'échange et chaînes vers des places libres).
+        """
+        try:
+            resultat = echanges.solder_marche(request.user)
+        except echanges.ConflitEchange as e:
+            return Response({"error": str(e)}, status=409)
+        resultat["message"] = (
+            f"{resultat['requests_satisfied']} demande(s) satisfaite(s) sur {resultat['requests_considered']}."
+        )
+        return Response(resultat)
+
+    @action(detail=False, methods=["post"], permission_classes=[IsAdminUser])
     def approve_cycle(self, request):
+        """
+        Approuve un échange en une transaction : tout ou rien. 409 si une demande a
+        déjà été traitée ou si l'ensemble ne forme plus un cycle d'échange valide.
+        """
         request_ids = request.data.get("request_ids", [])
 
         if not isinstance(request_ids, list) or not request_ids:
             return Response({"error": "Liste de demandes invalide."}, status=400)
+        try:
+            request_ids = [int(req_id) for req_id in request_ids]
+        except (TypeError, ValueError):
+            return Response({"error": "Liste de demandes invalide."}, status=400)
+
+        try:
+            resultat = echanges.approuver_cycle(request_ids, request.user)
+        except echanges.ConflitEchange as e:
+            return Response({"error": str(e)}, status=409)
 
-        for req_id in request_ids:
-            try:
-                req = ChangeRequest.objects.get(id=req_id, status="pending")
-                req.status = "approved"
-                req.processed_by = request.user
-                req.processed_at = now()
-                if req.desired_team:
-                    StudentsTeams.objects.update_or_create(student=req.student, defaults={"team": req.desired_team})
-                req.save()
-            except ChangeRequest.DoesNotExist:
-                continue
-
-        return Response({"message": "Échange du cycle approuvé avec succès."})
\ No newline at end of file
+        resultat["message"] = "Échange du cycle approuvé avec succès."
+        return Response(resultat)
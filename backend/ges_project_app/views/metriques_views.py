@@ -0,0 +1,12 @@
+from django.http import HttpResponse
+from rest_framework.views import APIView
+from ges_project_app import metriques
+from .permissions import IsAdminUser
+
+
+class MetriquesView(APIView):
+    """Métriques du processus (latence, SQL, taille des réponses par vue) au format texte de Prometheus."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(metriques.exposer(), content_type="text/plain; version=0.0.4; charset=utf-8")
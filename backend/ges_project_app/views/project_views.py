@@ -8,6 +8,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.db.models import Prefetch
 from rest_framework import status
+from .streaming import flux_demande, reponse_en_flux, taille_bloc
 
 
 class ProjectViewSet(viewsets.ModelViewSet):
@@ -17,8 +18,7 @@ class ProjectViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         level = self.request.query_params.get("level")
-        print("Level:", level)
-        
+
         if user.is_authenticated:
             if user.role == 'student':
                 try:
@@ -76,13 +76,13 @@ class ProjectWithTeamsView(APIView):
         # **1. Si Admin → Voir tous les projets**
         if user.role == "admin":
             projects = Project.objects.prefetch_related(
-                Prefetch("teams", queryset=Team.objects.prefetch_related("members__student"))
+                Prefetch("teams", queryset=Team.objects.prefetch_related("members__student__user"))
             ).select_related("supervisor")
 
         # **2. Si Supervisor → Voir seulement ses projets**
         elif user.role == "supervisor":
             projects = Project.objects.filter(supervisor=user).prefetch_related(
-                Prefetch("teams", queryset=Team.objects.prefetch_related("members__student"))
+                Prefetch("teams", queryset=Team.objects.prefetch_related("members__student__user"))
             ).select_related("supervisor")
 
         # **3. Si Student → Voir seulement ses équipes**
@@ -113,32 +113,38 @@ class ProjectWithTeamsView(APIView):
             }
             return Response(data)  # Si étudiant, pas besoin d'afficher les projets
 
+        # **?stream=1 : projets produits au fil de la lecture, par blocs (préchargements compris)**
+        mode = flux_demande(request)
+        if mode:
+            projets = projects.iterator(chunk_size=taille_bloc())
+            return reponse_en_flux((self.donnees_projet(project) for project in projets), mode, cle="projects")
+
         # **Générer la réponse pour Admin et Supervisor**
-        data = []
-        for project in projects:
-            project_data = {
-                "project_id": project.id,
-                "project_code": project.code,
-                "project_title": project.title,
-                "project_priority": project.priority,
-                "supervisor": project.supervisor.username,
-                "teams": []
-            }
+        data = [self.donnees_projet(project) for project in projects]
+        return Response({"projects": data})
 
-            for team in project.teams.all():
-                team_data = {
-                    "id": team.id,
-                    "name": team.name,
-                    "min_students": team.min_students,
-                    "max_students": team.max_students,
-                    "project_id": team.project.id,
-                    "students": [
-                        {"id": student.student.id, "name": student.student.user.username}
-                        for student in team.members.all()
-                    ],
-                }
-                project_data["teams"].append(team_data)
+    def donnees_projet(self, project):
+        project_data = {
+            "project_id": project.id,
+            "project_code": project.code,
+            "project_title": project.title,
+            "project_priority": project.priority,
+            "supervisor": project.supervisor.username,
+            "teams": []
+        }
 
-            data.append(project_data)
+        for team in project.teams.all():
+            team_data = {
+                "id": team.id,
+                "name": team.name,
+                "min_students": team.min_students,
+                "max_students": team.max_students,
+                "project_id": team.project.id,
+                "students": [
+                    {"id": student.student.id, "name": student.student.user.username}
+                    for student in team.members.all()
+                ],
+            }
+            project_data["teams"].append(team_data)
 
-        return Response({"projects": data})
\ No newline at end of file
+        return project_data
\ No newline at end of file
@@ -0,0 +1,48 @@
+import json
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+TAILLE_BLOC_PAR_DEFAUT = 500
+
+
+def flux_demande(request):
+    """
+    Mode flux demandé par le client : ?stream=1 (même JSON que la réponse
+    classique, produit au fil de l'eau) ou ?stream=ndjson (un objet par ligne).
+    Renvoie None, "json" ou "ndjson".
+    """
+    valeur = request.query_params.get("stream", "").lower()
+    if valeur == "ndjson":
+        return "ndjson"
+    if valeur in ("1", "true", "json"):
+        return "json"
+    return None
+
+
+def taille_bloc():
+    return getattr(settings, "STREAM_CHUNK_SIZE", TAILLE_BLOC_PAR_DEFAUT)
+
+
+def _json(objet):
+    return json.dumps(objet, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def reponse_en_flux(elements, mode, cle=None):
+    """
+    StreamingHttpResponse produisant `elements` (un itérable paresseux de dicts,
+    typiquement construit sur `.iterator(chunk_size=...)`) sans jamais charger
+    toute la liste en mémoire.
+    En JSON, la liste est enveloppée dans {cle: [...]} si `cle` est donnée.
+    """
+    if mode == "ndjson":
+        contenu = (_json(element) + "\n" for element in elements)
+        return StreamingHttpResponse(contenu, content_type="application/x-ndjson")
+
+    def generer():
+        yield '{"%s": [' % cle if cle else "["
+        for i, element in enumerate(elements):
+            yield ("," if i else "") + _json(element)
+        yield "]}" if cle else "]"
+
+    return StreamingHttpResponse(generer(), content_type="application/json")
@@ -6,6 +6,7 @@ from ges_project_app.models import User, Student
 from ges_project_app.serializers.user_serialier import UserSerializer
 from django.contrib.auth.hashers import make_password
 from ges_project_app.views.permissions import IsAdminUser
+from ges_project_app.views.streaming import flux_demande, reponse_en_flux, taille_bloc
 import logging
 
 logger = logging.getLogger(__name__) 
@@ -39,18 +40,26 @@ class UserViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Filtrer les utilisateurs en fonction de leur rôle si le paramètre role est fourni."""
         role = self.request.query_params.get('role', None)
+        queryset = self.queryset.select_related('student')
         if role:
-            return self.queryset.filter(role=role)
-        return self.queryset
+            return queryset.filter(role=role)
+        return queryset
+
+    def donnees_utilisateur(self, user):
+        serialized = UserSerializer(user).data
+        if hasattr(user, 'student'):
+            serialized['level'] = user.student.level
+        return serialized
     
     def list(self, request, *args, **kwargs):
         # Réécriture de list pour inclure les données d'étudiant si elles existent
         queryset = self.get_queryset()
-        data = []
-        for user in queryset:
-            serialized = UserSerializer(user).data
-            if hasattr(user, 'student'):
-                serialized['level'] = user.student.level
-            data.append(serialized)
-        return Response(data)
+
+        # ?stream=1 : utilisateurs produits au fil de la lecture, par blocs
+        mode = flux_demande(request)
+        if mode:
+            users = queryset.iterator(chunk_size=taille_bloc())
+            return reponse_en_flux((self.donnees_utilisateur(user) for user in users), mode)
+
+        return Response([self.donnees_utilisateur(user) for user in queryset])
     
\ No newline at end of file
@@ -1,11 +1,43 @@
 from rest_framework import viewsets, permissions
 from rest_framework.response import Response
-from ges_project_app.models import Voeux, Project, Student, Deadline
+from ges_project_app.models import Voeux, Project, Student, ProjectAssignment
+from ges_project_app import parametres_niveau
 from ges_project_app.serializers.voeux_serializer import VoeuxSerializer
 from rest_framework import serializers
 from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
+from django.core.validators import MaxValueValidator, MinValueValidator
+import logging
+import time
 from collections import defaultdict
+from django.db import transaction
 from django.utils import timezone
+from ges_project_app.attribution import satisfaction
+from .permissions import IsAdminUser
+from .streaming import flux_demande, reponse_en_flux, taille_bloc
+
+logger = logging.getLogger(__name__)
+
+
+def bornes_du_champ(modele, nom):
+    """(minimum, maximum) déclarés par les validateurs d'un champ du modèle."""
+    validateurs = modele._meta.get_field(nom).validators
+    minimum = next(v.limit_value for v in validateurs if isinstance(v, MinValueValidator))
+    maximum = next(v.limit_value for v in validateurs if isinstance(v, MaxValueValidator))
+    return minimum, maximum
+
+
+# Mêmes bornes que le modèle : les vœux sont écrits par bulk_create, sans full_clean()
+NOTE_MIN, NOTE_MAX = bornes_du_champ(Voeux, 'note_preference')
+
+
+class VoeuxAdminPagination(CursorPagination):
+    """Pagination par curseur sur l'identifiant : pas d'OFFSET, coût constant quelle que soit la page."""
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = 'id'
+
 
 class VoeuxViewSet(viewsets.ModelViewSet):
     queryset = Voeux.objects.all()
@@ -20,117 +52,166 @@ class VoeuxViewSet(viewsets.ModelViewSet):
             return Voeux.objects.filter(student=user.student)
         
         elif user.is_authenticated and user.role == 'admin':
-            # Charger tous les vœux
-            voeux = Voeux.objects.select_related('student', 'project').order_by('student', 'rank')
-
-            # Charger tous les étudiants
-            all_students = Student.objects.all()
-
-            # Charger tous les projets
-            all_projects = Project.objects.all()
-
-            # Initialisation de la structure des données
-            students_dict = defaultdict(lambda: {"student": {}, "choices": []})
-            used_projects = set()  # Pour suivre les projets choisis
-            students_with_choices = []
-            students_without_choices = []
-
-            # Remplir la structure avec les vœux existants
-            for voeu in voeux:
-                student_id = voeu.student.id
-
-                if not students_dict[student_id]["student"]:
-                    students_dict[student_id]["student"] = {
-                        "id": voeu.student.id,
-                        "name": voeu.student.user.username,
-                        "full_name": voeu.student.user.get_full_name(),
-                        "level": voeu.student.level
-                    }
-
-                students_dict[student_id]["choices"].append({
-                    "project": {
-                        "id": voeu.project.id,
-                        "code": voeu.project.code,
-                        "title": voeu.project.title
-                    },
-                    "rank": voeu.rank,
-                    "note_preference": voeu.note_preference
-                })
-
-                # Ajouter le projet dans la liste des projets utilisés
-                used_projects.add(voeu.project.id)
-
-            # Séparer les étudiants avec et sans vœux
-            for student in all_students:
-                student_data = {
-                    "id": student.id,
-                    "name": student.user.username,
-                    "full_name": student.user.get_full_name(),
-                    "level": voeu.student.level,
-                    "choices": students_dict[student.id]["choices"]
-                }
-                if student.id in students_dict and students_dict[student.id]["choices"]:
-                    students_with_choices.append(student_data)
-                else:
-                    students_without_choices.append(student_data)
-
-            # Identifier les projets non choisis
-            unused_projects = [
-                {"id": project.id, "title": project.title}
-                for project in all_projects if project.id not in used_projects
-            ]
-
-            return {
-                "students_with_choices": students_with_choices,
-                "students_without_choices": students_without_choices,
-                "unchoose_projects": unused_projects
-            }
+            # Export ?stream=1 ; la liste paginée par étudiant est servie par l'action `admin`
+            return Voeux.objects.select_related('student__user', 'project__supervisor').order_by('student', 'rank')
 
         return Voeux.objects.none()
-    
+
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        
-        # Si on retourne déjà des données structurées (cas admin), pas besoin de sérialisation
-        if isinstance(queryset, dict):
-            return Response(queryset)
-        
-        # Si c'est un étudiant, DRF s'occupe de la sérialisation classique
+        """
+        Étudiant : ses vœux, sans pagination.
+        Admin : mêmes pages que l'action `admin` (/api/voeux/admin/), parcourues avec
+        un curseur : {"next", "previous", "results": [étudiant avec ses "choices"],
+        "unchoose_projects" (première page)}. Cette forme remplace l'ancien dictionnaire
+        students_with_choices / students_without_choices, construit sur toute l'école ;
+        le découpage avec ou sans vœux se fait à partir de "choices".
+        Admin avec ?stream=1 : export complet des vœux sérialisés, au fil de la lecture.
+        """
+        if request.user.role == 'admin':
+            mode = flux_demande(request)
+            if not mode:
+                return self.admin_voeux(request)
+            voeux = self.get_queryset().iterator(chunk_size=taille_bloc())
+            context = self.get_serializer_context()
+            return reponse_en_flux((VoeuxSerializer(voeu, context=context).data for voeu in voeux), mode)
         return super().list(request, *args, **kwargs)
     
-    def check_deadline_passed(self):
+    @action(detail=False, methods=['get'], url_path='admin', permission_classes=[IsAdminUser])
+    def admin_voeux(self, request):
+        """
+        Vœux de tous les étudiants (ou d'un niveau avec ?level=), par pages de
+        `page_size` étudiants parcourues avec un curseur (?cursor=).
+        Trois requêtes par page quel que soit le nombre d'étudiants : la page
+        d'étudiants, leurs vœux, et les projets non choisis (première page seulement).
+        """
+        level = request.query_params.get('level')
+
+        etudiants = Student.objects.values('id', 'level', 'user__username', 'user__first_name', 'user__last_name')
+        if level:
+            etudiants = etudiants.filter(level=level)
+
+        paginator = VoeuxAdminPagination()
+        page = paginator.paginate_queryset(etudiants, request, view=self)
+
+        choix = defaultdict(list)
+        voeux = (
+            Voeux.objects.filter(student_id__in=[e['id'] for e in page])
+            .order_by('student_id', 'rank')
+            .values('student_id', 'rank', 'note_preference', 'project_id', 'project__code', 'project__title')
+        )
+        for voeu in voeux:
+            choix[voeu['student_id']].append({
+                "project": {
+                    "id": voeu['project_id'],
+                    "code": voeu['project__code'],
+                    "title": voeu['project__title']
+                },
+                "rank": voeu['rank'],
+                "note_preference": voeu['note_preference']
+            })
+
+        results = [
+            {
+                "id": e['id'],
+                "name": e['user__username'],
+                "full_name": f"{e['user__first_name']} {e['user__last_name']}".strip(),
+                "level": e['level'],
+                "choices": choix[e['id']]
+            }
+            for e in page
+        ]
+        response = paginator.get_paginated_response(results)
+
+        if 'cursor' not in request.query_params:
+            projets = Project.objects.filter(voeux__isnull=True)
+            if level:
+                projets = projets.filter(level=level)
+            response.data["unchoose_projects"] = list(projets.values('id', 'code', 'title'))
+        return response
+
+    def check_deadline_passed(self, level):
+        limite_date = parametres_niveau.date_limite(level)
+        return limite_date is not None and timezone.now().date() > limite_date
+
+    def lire_preferences(self, preferences):
+        """Liste de vœux reçue -> [(project_id, rank, note_preference)] d'entiers, ou None si mal formée."""
+        if not isinstance(preferences, list):
+            return None
         try:
-            deadline = Deadline.objects.get(type="voeux")
-            if timezone.now().date() > deadline.limite_date:
-                return True
-        except Deadline.DoesNotExist:
-            pass
-        return False
+            return [
+                (int(pref['project_id']), int(pref['rank']), int(pref['note_preference']))
+                for pref in preferences
+            ]
+        except (TypeError, KeyError, ValueError):
+            return None
+
+    def valider_preferences(self, preferences, projets, level, max_choice):
+        """
+        Vérifie en mémoire les vœux (project_id, rank, note) avec les projets déjà
+        chargés (in_bulk). Renvoie un message d'erreur, ou None si tout est valide.
+        """
+        if len(preferences) > max_choice:
+            return f"La liste de vœux doit contenir au plus {max_choice} projets."
+
+        rangs, projets_vus = set(), set()
+        for project_id, rank, note in preferences:
+            projet = projets.get(project_id)
+            if projet is None or projet.level != level:
+                return f"Projet invalide : {project_id}."
+            if project_id in projets_vus:
+                return f"Le projet {project_id} apparaît plusieurs fois."
+            if not 1 <= rank <= max_choice:
+                return f"Le rang doit être entre 1 et {max_choice}."
+            if rank in rangs:
+                return f"Le rang {rank} est utilisé pour plusieurs projets."
+            if not NOTE_MIN <= note <= NOTE_MAX:
+                return f"La note de préférence doit être entre {NOTE_MIN} et {NOTE_MAX}."
+            rangs.add(rank)
+            projets_vus.add(project_id)
+        return None
 
     @action(detail=False, methods=['post'])
     def submit_voeux(self, request):
-        """Soumettre une liste de préférences pour un étudiant."""
+        """
+        Soumettre une liste de préférences pour un étudiant.
+        Tout est validé avant d'écrire ; la liste existante est ensuite remplacée
+        en une transaction (une suppression et un bulk_create), ou pas du tout.
+        """
+        debut = time.perf_counter()
+        student = request.user.student
+
         # Vérifier si la date limite est dépassée
-        if self.check_deadline_passed():
+        if self.check_deadline_passed(student.level):
             return Response({"error": "La date limite pour soumettre les vœux est dépassée."}, status=400)
-        
-        student = request.user.student
-        preferences = request.data.get('voeux', [])  # Format : [{"project_id": 1, "preference_order": 1, "preference_score": 5}]
-
-        # Supprimer les préférences existantes de l'étudiant
-        Voeux.objects.filter(student=student).delete()
-        # Créer les nouvelles préférences
-        for pref in preferences:
-            project_id = pref.get('project_id')
-            rank = pref.get('rank')
-            note_preference = pref.get('note_preference', None)
-
-            project = Project.objects.get(id=project_id)
-            Voeux.objects.create(
-                student=student,
-                project=project,
-                rank=rank,
-                note_preference=note_preference,
-            )
-
-        return Response({"message": "Préférences soumises avec succès."})
\ No newline at end of file
+        max_choice = parametres_niveau.max_choice(student.level)
+
+        # Format : [{"project_id": 1, "rank": 1, "note_preference": 5}]
+        preferences = self.lire_preferences(request.data.get('voeux', []))
+        if preferences is None:
+            return Response({"error": "Chaque vœu doit indiquer project_id, rank et note_preference (entiers)."}, status=400)
+
+        # Tous les projets en une requête, puis validation en mémoire
+        projets = Project.objects.only('id', 'level').in_bulk([project_id for project_id, _, _ in preferences])
+        erreur = self.valider_preferences(preferences, projets, student.level, max_choice)
+        if erreur:
+            return Response({"error": erreur}, status=400)
+
+        with transaction.atomic():
+            # Affectations éventuelles de l'étudiant : leur score dépend de ses vœux
+            affectations = list(ProjectAssignment.objects.filter(student=student).values_list('project_id', flat=True))
+            avant = [satisfaction.contribution(student.id, project_id) for project_id in affectations]
+
+            with satisfaction.suspendre_suivi():
+                Voeux.objects.filter(student=student).delete()
+                Voeux.objects.bulk_create([
+                    Voeux(student=student, project=projets[project_id], rank=rank, note_preference=note)
+                    for project_id, rank, note in preferences
+                ])
+
+            for project_id, (level, ancien) in zip(affectations, avant):
+                _, nouveau = satisfaction.contribution(student.id, project_id)
+                satisfaction.appliquer(level, retirees=[ancien], ajoutees=[nouveau])
+
+        latence_ms = round((time.perf_counter() - debut) * 1000, 2)
+        logger.info("Vœux soumis par l'étudiant %s (%d vœux) en %.2f ms", student.id, len(preferences), latence_ms)
+        return Response({"message": "Préférences soumises avec succès.", "latency_ms": latence_ms})
@@ -53,6 +53,8 @@ REST_FRAMEWORK = {
 }
 
 MIDDLEWARE = [
+    # En premier : mesure le traitement complet de chaque requête (exposé par /api/metrics/)
+    'ges_project_app.middleware.MetriquesMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -154,4 +156,31 @@ CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOW_HEADERS = [
     'content-type',
     'authorization',
-]
\ No newline at end of file
+]
+
+# Taille des lots pour l'enregistrement des affectations (bulk_create / bulk_update)
+ASSIGNMENT_BATCH_SIZE = 500
+
+# Tâches d'affectation en arrière-plan : nombre de threads du pool local, et
+# exécution immédiate dans le thread appelant (utile pour les tests)
+ASSIGNMENT_JOB_WORKERS = 2
+ASSIGNMENT_JOBS_EAGER = False
+
+# Nombre de processus pour l'affectation de tous les niveaux en parallèle
+# (None : un processus par niveau)
+ASSIGNMENT_PROCESS_WORKERS = None
+
+# Listes en flux (?stream=1) : nombre de lignes lues par requête SQL (.iterator(chunk_size=...))
+STREAM_CHUNK_SIZE = 500
+
+# Cache de Django (mémoire locale au processus par défaut ; un cache partagé
+# comme Redis ou Memcached peut être configuré ici sans autre changement)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ges-student-project',
+    }
+}
+
+# Durée de vie (secondes) des paramètres de vœux (Deadline) mis en cache par niveau
+DEADLINE_CACHE_TTL = 300
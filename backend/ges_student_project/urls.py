@@ -6,10 +6,11 @@ from ges_project_app.views.user_view import UserViewSet
 from ges_project_app.views.student_views import StudentViewSet
 from ges_project_app.views.project_views import ProjectViewSet, TeamViewSet, ProjectWithTeamsView
 from ges_project_app.views.voeux_views import VoeuxViewSet
-from ges_project_app.views.attribution_views import ProjectAssignmentView
+from ges_project_app.views.attribution_views import ProjectAssignmentView, AssignmentJobView, AssignmentJobDetailView
 from ges_project_app.views.assignStudentToTeamView import AssignStudentsToTeamsView
 from ges_project_app.views.deadLineView import DeadlineViewSet
 from ges_project_app.views.change_request_views import ChangeRequestViewSet
+from ges_project_app.views.metriques_views import MetriquesView
 from rest_framework.routers import DefaultRouter
 
 router = DefaultRouter()
@@ -29,8 +30,11 @@ urlpatterns = [
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/projects-assign/', ProjectAssignmentView.as_view(), name='projects-assign'),
+    path('api/assignment-jobs/', AssignmentJobView.as_view(), name='assignment-jobs'),
+    path('api/assignment-jobs/<int:pk>/', AssignmentJobDetailView.as_view(), name='assignment-job-detail'),
     path("api/projects-with-teams/", ProjectWithTeamsView.as_view(), name="projects-with-teams"),
     path('api/assign-student-team/', AssignStudentsToTeamsView.as_view(), name="assign-student-team"),
+    path('api/metrics/', MetriquesView.as_view(), name="metrics"),
     # path('create-user/', create_user, name='create_user'),
     path('api/', include(router.urls)),
     
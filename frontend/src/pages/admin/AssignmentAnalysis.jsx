@@ -101,6 +101,8 @@ export default function ProjectList() {
                     >
                         <option value="algo1">Algo 1</option>
                         <option value="algo2">Algo 2</option>
+                        <option value="algo3">Algo 3 (vectorisé)</option>
+                        <option value="algo4">Algo 4 (optimal, flot de coût minimal)</option>
                     </select>
 
                     {/* Bouton d'affectation */}
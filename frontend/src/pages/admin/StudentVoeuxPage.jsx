@@ -9,19 +9,26 @@ const StudentVoeuxPage = () => {
         students_without_choices: [],
         unchoose_projects: []
     });
+    const [pagination, setPagination] = useState({ next: null, previous: null });
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState(null);
     const [activeTab, setActiveTab] = useState('with_choices');
     const [showDeadlineModal, setShowDeadlineModal] = useState(false);
     const [selectedLevel, setSelectedLevel] = useState("");
 
-    // Récupérer les données des voeux
-    const fetchWishesData = async () => {
+    // Récupérer une page de vœux (pagination par curseur : une page à la fois)
+    const fetchWishesData = async (url = '/voeux/admin/') => {
         try {
             setLoading(true);
             setError(null);
-            const response = await api.get('/voeux/');
-            setData(response.data);
+            const { data: page } = await api.get(url);
+            setData(previous => ({
+                students_with_choices: page.results.filter(student => student.choices.length > 0),
+                students_without_choices: page.results.filter(student => student.choices.length === 0),
+                // Les projets non choisis ne sont envoyés qu'avec la première page
+                unchoose_projects: page.unchoose_projects ?? previous.unchoose_projects
+            }));
+            setPagination({ next: page.next, previous: page.previous });
         } catch (err) {
             setError(err.response?.data?.message || 'Erreur lors du chargement des voeux');
         } finally {
@@ -47,7 +54,7 @@ const StudentVoeuxPage = () => {
                 <FiAlertCircle className="h-8 w-8 mb-2" />
                 <p className="mb-4">{error}</p>
                 <button
-                    onClick={fetchWishesData}
+                    onClick={() => fetchWishesData()}
                     className="px-4 py-2 bg-blue-500 dark:bg-blue-600 text-white rounded hover:bg-blue-600 dark:hover:bg-blue-700"
                 >
                     Réessayer
@@ -73,6 +80,11 @@ const StudentVoeuxPage = () => {
                         data={data}
                         onTabChange={setActiveTab}
                     />
+
+                    <PaginationControls
+                        pagination={pagination}
+                        onNavigate={fetchWishesData}
+                    />
                 </div>
             </div>
         </div>
@@ -152,6 +164,25 @@ const MainContent = ({ activeTab, data, onTabChange }) => (
     </div>
 );
 
+const PaginationControls = ({ pagination, onNavigate }) => (
+    <div className="flex justify-between items-center mt-4">
+        <button
+            onClick={() => onNavigate(pagination.previous)}
+            disabled={!pagination.previous}
+            className="px-4 py-2 bg-blue-500 dark:bg-blue-600 text-white rounded hover:bg-blue-600 dark:hover:bg-blue-700 disabled:opacity-50 disabled:cursor-not-allowed"
+        >
+            Page précédente
+        </button>
+        <button
+            onClick={() => onNavigate(pagination.next)}
+            disabled={!pagination.next}
+            className="px-4 py-2 bg-blue-500 dark:bg-blue-600 text-white rounded hover:bg-blue-600 dark:hover:bg-blue-700 disabled:opacity-50 disabled:cursor-not-allowed"
+        >
+            Page suivante
+        </button>
+    </div>
+);
+
 // Composants enfants
 const TabButton = ({ children, active = false, onClick }) => (
     <button
@@ -220,7 +220,7 @@ const VoeuxPage = () => {
                                                             <span>{index + 1}. {voeu.project.title}</span>
                                                             <input
                                                                 type="number"
-                                                                min="0"
+                                                                min="1"
                                                                 max="20"
                                                                 placeholder={preferences_note[voeu.id] || voeu.note_preference || 1}
                                                                 onChange={(e) => handlePreferenceChange(voeu.project.id, e.target.value)}